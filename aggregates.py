@@ -0,0 +1,61 @@
+import collections
+import threading
+
+import archive
+
+max_cached_games = 256
+
+########### Game histories
+#the statistics read the game history by player columns, the x values are left out
+def game_columns(game_history, start = 0):
+    names = [key for key in game_history if key != "x"]
+    return names, [game_history[name][start:] for name in names]
+
+########### Games
+#per game id the statistics built from its history (they have names, rounds and add_rounds(columns)),
+#only the rounds confirmed since the last call are added
+class GameCache:
+    def __init__(self, copy, max_games = max_cached_games):
+        self.copy = copy
+        self.max_games = max_games
+        self.games = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, game_history, game_id, new):
+        #new(names) starts the statistics of a game, callers get a copy they may change
+        names, columns = game_columns(game_history)
+        rounds = len(game_history["x"])
+        with self.lock:
+            built = None
+            if game_id in self.games:
+                built, last = self.games[game_id]
+                #only reused while the game still starts with the rounds it was built from
+                if built.names != names or built.rounds > rounds or (built.rounds and [column[built.rounds - 1] for column in columns] != last):
+                    built = None
+            if built is None:
+                built = new(names)
+            if built.rounds < rounds:
+                built.add_rounds([column[built.rounds:] for column in columns])
+            if game_id:
+                self.games[game_id] = (built, [column[-1] for column in columns] if rounds else None)
+                self.games.move_to_end(game_id)
+                while len(self.games) > self.max_games:
+                    self.games.popitem(last = False)
+            return self.copy(built)
+
+########### Archive
+#the totals of a statistic over the archive (they have recompute(games)): the archive is replayed once per process
+#on first use, confirmed rounds are added incrementally afterwards
+class ArchiveTotals:
+    def __init__(self, totals):
+        self.totals = totals
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    self.totals.recompute(archive.iter_games())
+                    self.loaded = True
+        return self.totals
@@ -0,0 +1,240 @@
+import json
+
+import flask
+
+import archive
+import audit
+import headtohead
+import projection
+import ratings
+import scoring
+import store
+import transitions
+
+api = flask.Blueprint("api", __name__, url_prefix = "/api/v1")
+
+#jsonify would sort the keys, but "Ranks" has to stay the first key of the table dict
+def respond(content, status = 200):
+    return flask.Response(json.dumps(content), status = status, mimetype = "application/json")
+
+def error(message, status = 400):
+    return respond({"error": message}, status = status)
+
+########### Rounds
+@api.route("/rounds", methods = ["POST"])
+def post_round():
+    #applies a whole round to the posted game in one step:
+    #{"game": <save file content>, "ranks": {"<player>": <rank index or rank title>, ...}}
+    body = flask.request.get_json(silent = True)
+    if not isinstance(body, dict) or "game" not in body or "ranks" not in body:
+        return error("Expected a json object with 'game' and 'ranks'")
+    try:
+        scoring.validate_game(body["game"])
+    except ValueError as e:
+        return error(f"Invalid game data: {e}")
+    try:
+        game = scoring.apply_event(body["game"], {"type": "round", "ranks": body["ranks"]})
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return error(str(e))
+    return respond(game)
+
+########### Games
+def conditional(game_id, version, content):
+    #every change bumps the version, so polling clients get a 304 until the game changes
+    etag = f"{game_id}-{version}"
+    if flask.request.if_none_match.contains(etag):
+        response = flask.Response(status = 304)
+    else:
+        response = respond(content)
+    response.set_etag(etag)
+    return response
+
+def load(game_id):
+    try:
+        return store.games.get(game_id)
+    except store.Unknown:
+        flask.abort(error(f"Unknown game '{game_id}'", status = 404))
+
+def expected_version(game_id):
+    #If-Match: "<id>-<version>" makes the change conditional, it fails with 412 once someone else changed the game
+    for etag in flask.request.if_match.as_set():
+        if etag.startswith(f"{game_id}-") and etag[len(game_id) + 1:].isdigit():
+            return int(etag[len(game_id) + 1:])
+    return None
+
+def change(game_id, event):
+    try:
+        game, version = store.games.update(game_id, event, expected = expected_version(game_id))
+    except store.Unknown:
+        return error(f"Unknown game '{game_id}'", status = 404)
+    except store.Conflict as e:
+        return error(str(e), status = 412)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return error(str(e))
+    audit.log("api-event", game = game_id, version = version, remote = flask.request.remote_addr, applied = [event])
+    if event["type"] == "round":
+        ratings.get_ratings().update(ratings.last_ordering(game))
+        headtohead.update_events(game, [event])
+        transitions.update_events(game, [event])
+    response = respond({"id": game_id, "version": version, "game": game})
+    response.set_etag(f"{game_id}-{version}")
+    return response
+
+@api.route("/games", methods = ["POST"])
+def create_game():
+    #either {"players": [...], "handout-mistakes": true, "beer-count": true, "goiß-count": true}
+    #or {"game": <save file content>} to continue a saved game, with "archive": true it is imported into the archive as well
+    body = flask.request.get_json(silent = True)
+    if not isinstance(body, dict):
+        return error("Expected a json object")
+    if "game" in body:
+        game = body["game"]
+        try:
+            scoring.validate_game(game)
+        except ValueError as e:
+            return error(f"Invalid game data: {e}")
+    else:
+        names = body.get("players", list())
+        if not isinstance(names, list) or len(names) < 2 or len(names) != len(set(names)) or not all(isinstance(n, str) and n for n in names):
+            return error("A game needs at least 2 players and no equal names")
+        game = scoring.new_game(
+            names,
+            handout_mistakes = body.get("handout-mistakes", True),
+            beer_count = body.get("beer-count", True),
+            goiß_count = body.get("goiß-count", True)
+        )
+    game_id, version = store.games.create(game)
+    if "game" in body and body.get("archive") is True:
+        archive.store_game(game)
+    response = respond({"id": game_id, "version": version, "game": game}, status = 201)
+    response.set_etag(f"{game_id}-{version}")
+    response.headers["Location"] = flask.url_for("api.get_game", game_id = game_id)
+    return response
+
+@api.route("/games/<game_id>", methods = ["GET"])
+def get_game(game_id):
+    game, version = load(game_id)
+    return conditional(game_id, version, {"id": game_id, "version": version, "game": game})
+
+@api.route("/games/<game_id>/rounds", methods = ["POST"])
+def post_game_round(game_id):
+    body = flask.request.get_json(silent = True)
+    if not isinstance(body, dict) or "ranks" not in body:
+        return error("Expected a json object with 'ranks'")
+    return change(game_id, {"type": "round", "ranks": body["ranks"]})
+
+@api.route("/games/<game_id>/events", methods = ["POST"])
+def post_game_event(game_id):
+    body = flask.request.get_json(silent = True)
+    if not isinstance(body, dict):
+        return error("Expected a json object with 'type' and 'player'")
+    return change(game_id, body)
+
+@api.route("/games/<game_id>/sync", methods = ["POST"])
+def sync_game(game_id):
+    #the queued events of a device: {"events": [{"id": ..., "type": ..., "rounds": ..., ...}, ...]}
+    #every id is applied once, counter events are merged and rounds entered on an outdated game are rejected
+    body = flask.request.get_json(silent = True)
+    if not isinstance(body, dict) or not isinstance(body.get("events"), list):
+        return error("Expected a json object with 'events'")
+    try:
+        game, version, applied, rejected = store.games.commit(game_id, body["events"])
+    except store.Unknown:
+        return error(f"Unknown game '{game_id}'", status = 404)
+    ratings.update_events(game, applied)
+    headtohead.update_events(game, applied)
+    transitions.update_events(game, applied)
+    if applied or rejected:
+        audit.log("api-sync", game = game_id, version = version, remote = flask.request.remote_addr, applied = applied, rejected = rejected)
+    response = respond({"id": game_id, "version": version, "applied": len(applied), "rejected": rejected, "game": game})
+    response.set_etag(f"{game_id}-{version}")
+    return response
+
+def standings(game):
+    table_dict = game["table-dict"]
+    return [
+        {
+            "place": i + 1,
+            "player": name,
+            "points": table_dict[name][-1],
+            "ranks": dict(zip([rank.strip() for rank in table_dict["Ranks"][:-1]], table_dict[name][:-1]))
+        }
+        for i, name in enumerate(scoring.ranking(table_dict))
+    ]
+
+@api.route("/games/<game_id>/standings", methods = ["GET"])
+def get_standings(game_id):
+    game, version = load(game_id)
+    return conditional(game_id, version, {"id": game_id, "version": version, "standings": standings(game)})
+
+@api.route("/games/<game_id>/series", methods = ["GET"])
+def get_series(game_id):
+    game, version = load(game_id)
+    series = {
+        "game-history": game["game-history"],
+        "points-development": game["points-development"]
+    }
+    return conditional(game_id, version, {"id": game_id, "version": version, "series": series})
+
+@api.route("/games/<game_id>/projection", methods = ["GET"])
+def get_projection(game_id):
+    game, version = load(game_id)
+    try:
+        rounds = int(flask.request.args.get("rounds", 10))
+        budget = float(flask.request.args.get("budget", projection.time_budget))
+    except ValueError:
+        return error("'rounds' and 'budget' have to be numbers")
+    if not 0 <= rounds <= projection.max_rounds:
+        return error(f"Between 0 and {projection.max_rounds} rounds can be projected")
+    result = projection.project(game, rounds, budget = budget)
+    return respond({"id": game_id, "version": version, **result})
+
+@api.route("/games/<game_id>/head-to-head", methods = ["GET"])
+def get_game_head_to_head(game_id):
+    game, version = load(game_id)
+    matrix = headtohead.game_matrix(game["game-history"], game_id)
+    return conditional(game_id, version, {"id": game_id, "version": version, **matrix.table()})
+
+@api.route("/games/<game_id>/transitions", methods = ["GET"])
+def get_game_transitions(game_id):
+    game, version = load(game_id)
+    rank_transitions = transitions.game_transitions(game["game-history"], transitions.game_ranks(game), game_id)
+    return conditional(game_id, version, {"id": game_id, "version": version, **rank_transitions.table()})
+
+########### Ratings
+@api.route("/ratings", methods = ["GET"])
+def get_ratings():
+    return respond({"ratings": ratings.get_ratings().table()})
+
+@api.route("/head-to-head", methods = ["GET"])
+def get_head_to_head():
+    #every game of the archive plus the rounds confirmed since the process started, ?players=Anna,Ben picks the players
+    players = flask.request.args.get("players")
+    names = [name.strip() for name in players.split(",") if name.strip()] if players else None
+    return respond(headtohead.get_totals().matrix(names).table())
+
+@api.route("/transitions", methods = ["GET"])
+def get_transitions():
+    #rank transitions of every player over the archive and the rounds confirmed since the process started
+    players = flask.request.args.get("players")
+    names = [name.strip() for name in players.split(",") if name.strip()] if players else None
+    return respond({"players": transitions.get_totals().table(names)})
+
+########### Archive
+@api.route("/archive", methods = ["GET"])
+def search_archive():
+    #?player=Anna&player=Ben&from=2021-01-01&to=2021-12-31&count=4&counter=beer-count&page=1&per-page=20
+    args = flask.request.args
+    try:
+        result = archive.get_index().query(
+            players = args.getlist("player"),
+            date_from = args.get("from"),
+            date_to = args.get("to"),
+            player_count = args.get("count"),
+            counters = args.getlist("counter"),
+            page = args.get("page", 1),
+            per_page = args.get("per-page", archive.results_per_page)
+        )
+    except ValueError:
+        return error("'count', 'page' and 'per-page' have to be numbers, 'from' and 'to' dates like 2021-12-31")
+    return respond(result)
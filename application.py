@@ -3,14 +3,32 @@ import flask
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
+import dash_table
 import plotly.graph_objs as go
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction, ALL
 from dash.exceptions import PreventUpdate
+import plotly.utils
 import json
 import datetime
 import os
-import base64
 import time
+import uuid
+
+import api
+import archive
+import audit
+import figures
+import headtohead
+import pace
+import projection
+import ratings
+import replay
+import report
+import rules
+import scoring
+import store
+import transitions
+import uploads
 
 timestamp_format = "%d-%m-%YT%H-%M-%S-%f"
 
@@ -38,30 +56,59 @@ def upload_button():
         style = {"text-align": "center"}
     )
     
-def points_table(table_dict):
-    table_header = [
-        html.Thead(
-            html.Tr(
-                children = [html.Th(key) for key in table_dict]
-            )
-        )
-    ]
-    
-    table_rows = list()
-    for i, rank in enumerate(table_dict["Ranks"]):
-        row = [html.Th(rank)]
-        for key in list(table_dict.keys())[1:]:
-            if rank == "Points":
-                row.append(html.Th(table_dict[key][i]))
-            else:
-                row.append(html.Td(table_dict[key][i]))
-        table_rows.append(html.Tr(row))
-    
-    table_body = [
-        html.Tbody(table_rows)
+def points_table(table_dict, id = "points-table"):
+    #columns get short index ids, so every row only carries the cell values. column i + 1 is player i
+    keys = ["Ranks", *scoring.table_names(table_dict)]
+    columns = [{"name": key, "id": str(i)} for i, key in enumerate(keys)]
+    data = [
+        {str(i): table_dict[key][row] for i, key in enumerate(keys)}
+        for row in range(len(table_dict["Ranks"]))
     ]
     
-    return dbc.Table(table_header + table_body, bordered=True)
+    return dash_table.DataTable(
+        id = id,
+        columns = columns,
+        data = data,
+        style_cell = {
+            "textAlign": "center",
+            "padding": "12px",
+            "border": "1px solid #dee2e6",
+            "fontFamily": "inherit",
+            "fontSize": "inherit"
+        },
+        style_header = {
+            "fontWeight": "bold",
+            "backgroundColor": "white"
+        },
+        style_data_conditional = [
+            {
+                "if": {"column_id": "0"},
+                "fontWeight": "bold"
+            },
+            {
+                "if": {"row_index": len(data) - 1},
+                "fontWeight": "bold"
+            }
+        ]
+    )
+
+########### Static components
+#subtrees that are the same on every render are serialized once. callbacks and the layout return a marker
+#in their place, insert_static swaps it for the cached json before the response leaves the server
+static_marker = f"static-component-{uuid.uuid4().hex}:"
+static_json = dict()
+
+def static(key, build):
+    if key not in static_json:
+        static_json[key] = json.dumps(build(), cls = plotly.utils.PlotlyJSONEncoder).encode("utf-8")
+    return f"{static_marker}{key}"
+
+def insert_static(body):
+    if static_marker.encode("utf-8") not in body:
+        return body
+    for key, value in static_json.items():
+        body = body.replace(json.dumps(f"{static_marker}{key}").encode("utf-8"), value)
+    return body
 
 def modal(id,header,text):
     return dbc.Modal(
@@ -73,7 +120,223 @@ def modal(id,header,text):
         centered = True
     )
 
-def names_content(name_list = list()):
+def archive_results(result):
+    if not result["total"]:
+        return html.P("No saved games found", style = {"text-align": "center"})
+    first = (result["page"] - 1) * result["per-page"]
+    items = [
+        dbc.ListGroupItem(
+            dbc.Row(
+                children = [
+                    dbc.Col(
+                        children = [
+                            html.H5(", ".join(entry["players"])),
+                            html.P(f"{entry['date']} · {entry['rounds']} rounds", className = "text-muted mb-0")
+                        ]
+                    ),
+                    dbc.Col(
+                        dbc.Button(
+                            "Open",
+                            id = {"type": "open-archived-game", "index": entry["id"]},
+                            color = "primary"
+                        ),
+                        width = "auto"
+                    )
+                ],
+                align = "center"
+            )
+        )
+        for entry in result["games"]
+    ]
+    return [
+        dbc.ListGroup(items),
+        html.P(f"{first + 1}-{first + len(result['games'])} of {result['total']} games", className = "text-muted mt-2", style = {"text-align": "center"})
+    ]
+
+def replay_content(game, figs):
+    html_ranking = [html.H5(f"{i+1}. {name}") for i, name in enumerate(scoring.ranking(game["table-dict"]))]
+    content = [
+        html.H5(f"After round {game['rounds']}", style = {"text-align": "center"}),
+        html.Div(
+            points_table(game["table-dict"], id = "replay-points-table"),
+            style = {"overflow": "scroll"}
+        ),
+        html.Br(),
+        html.Div(
+            children = html_ranking,
+            style = {
+                "text-align": "center"
+            }
+        ),
+        dcc.Graph(figure = figs["points-development"]),
+        dcc.Graph(figure = figs["game-history"]),
+        dcc.Graph(figure = figs["rank-accumulation"])
+    ]
+    for counter in scoring.counters:
+        if game[counter]:
+            content.append(dcc.Graph(figure = figs[counter]))
+    return content
+
+def upload_modal():
+    return dbc.Modal(
+        children = [
+            dbc.ModalHeader(
+                "📤 Continue the game of this file? 📤",
+            ),
+            dbc.ModalBody(
+                id = "file-name"
+            ),
+            dbc.ModalBody(
+                children = [
+                    html.Div(
+                        dbc.Spinner(
+                            dbc.Button(
+                                "Start Game",
+                                id = "confirm-load-game",
+                                color = "primary",
+                                className = "mr-1",
+                                block = True,
+                                size = "lg"
+                            )
+                        ),
+                        style = {"text-align": "center"}
+                    ),
+                    html.Div(
+                        id = "json-content",
+                        style = {"display": "none"}
+                    )
+                ]
+            )
+        ],
+        id = "confirm-upload-modal",
+        centered = True
+    )
+
+def names_placeholders():
+    #components of the game view, so every callback finds its ids on the start page
+    return html.Div(
+        children = [
+            dbc.Button(id = "add-results-button"),
+            dbc.Button(id = "batch-round-button"),
+            dbc.Button(id = "confirm-batch-round"),
+            dbc.Collapse(id = "batch-round-collapse"),
+            html.Div(id = "batch-round-error"),
+            dbc.Button(id = "projection-button"),
+            dbc.Input(id = "projection-rounds"),
+            html.Div(id = "projection-output"),
+            dbc.Button(id = "handout-mistake-button"),
+            dbc.Button(id = "beer-count-button"),
+            dbc.Button(id = "goiß-count-button"),
+            dbc.Button(id = "save-game-button"),
+            dbc.Button(id = "export-report-button"),
+            dcc.Slider(id = "replay-slider"),
+            html.Div(id = "replay-output"),
+            dash_table.DataTable(id = "points-table"),
+            html.Div(
+                "[]",
+                id = "game-players",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "table-dict",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "game-history",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "points-development",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "handout-mistakes",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "beer-count",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "goiß-count",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "",
+                id = "game-id",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "null",
+                id = "game-rules",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "",
+                id = "game-version",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "game-timestamps",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "{}",
+                id = "game-scoring",
+                style = {"display": "none"}
+            ),
+            html.Div(
+                "[]",
+                id = "synced-events",
+                style = {"display": "none"}
+            ),
+        ],
+        style = {"display": "None"}
+    )
+
+def game_placeholders():
+    #components of the start page, so every callback finds its ids in the game view
+    return html.Div(
+        children = [
+            dbc.Button(id = "start-game-button"),
+            dbc.Button(id = "add-player-button"),
+            dbc.Checkbox(id = "handout-mistakes-checkbox"),
+            dbc.Checkbox(id = "beer-count-checkbox"),
+            dbc.Checkbox(id = "goiß-count-checkbox"),
+            dcc.Dropdown(id = "house-rules"),
+            dbc.Button(id = "restore-game-button"),
+            dbc.Input(id = "join-game-id"),
+            dbc.Button(id = "join-game-button"),
+            dbc.Input(id = "archive-search"),
+            html.Div(id = "archive-results"),
+            dbc.Button(id = "archive-previous"),
+            dbc.Button(id = "archive-next")
+        ],  
+        style = {"display": "none"}
+    )
+
+def upload_placeholders():
+    #the upload dialog of the start page
+    return html.Div(
+        children = [
+            dbc.Button(id = "confirm-load-game"),
+            html.Div(id = "json-content"),
+            dcc.Upload(id = "upload-json"),
+            dbc.Modal(id = "confirm-upload-modal"),
+            html.Div(id = "file-name"),
+            dbc.Button(id = "upload-button")
+        ],
+        style = {"display": "none"}
+    )
+
+def names_content(name_list = list(), unknown_game = None):
     content = list()
     content.append(dbc.Alert(html.H3("Create New Game 🎮"), color = "primary")),
     content.append(
@@ -168,6 +431,20 @@ def names_content(name_list = list()):
             style = {"text-align": "center"}
         )
     )
+    content.append(
+        html.Div(
+            children = [
+                html.Br(),
+                dcc.Dropdown(
+                    id = "house-rules",
+                    options = [{"label": f"House Rules: {name}", "value": name} for name in rules.presets],
+                    value = rules.default_rules["name"],
+                    clearable = False
+                )
+            ],
+            style = {} if len(rules.presets) > 1 else {"display": "none"}
+        )
+    )
     content.append(html.Br()),
     content.append(html.Br()),
     content.append(dbc.Alert(html.H3("Load Game 📤"), color = "primary")),
@@ -177,288 +454,216 @@ def names_content(name_list = list()):
             id = "upload-button"
         )
     )
+    #only shown while the browser still holds a game with unsynced events (assets/clientside.js)
     content.append(
-        dbc.Modal(
+        html.Div(
+            dbc.Button(
+                "Continue Last Game 💾",
+                id = "restore-game-button",
+                color = "primary",
+                size = "lg",
+                className = "mr-1 mt-3",
+                style = {"display": "none"}
+            ),
+            style = {"text-align": "center"}
+        )
+    )
+    content.append(html.Br()),
+    content.append(html.Br()),
+    content.append(dbc.Alert(html.H3("Join Game 🤝"), color = "primary")),
+    content.append(
+        dbc.InputGroup(
             children = [
-                dbc.ModalHeader(
-                    "📤 Continue the game of this file? 📤",
-                ),
-                dbc.ModalBody(
-                    id = "file-name"
+                dbc.Input(
+                    id = "join-game-id",
+                    value = unknown_game,
+                    placeholder = "Game ID",
+                    invalid = unknown_game is not None,
+                    bs_size = "lg"
                 ),
-                dbc.ModalBody(
-                    children = [
-                        html.Div(
-                            dbc.Spinner(
-                                dbc.Button(
-                                    "Start Game",
-                                    id = "confirm-load-game",
-                                    color = "primary",
-                                    className = "mr-1",
-                                    block = True,
-                                    size = "lg"
-                                )
-                            ),
-                            style = {"text-align": "center"}
-                        ),
-                        html.Div(
-                            id = "json-content",
-                            style = {"display": "none"}
-                        )
-                    ]
+                dbc.InputGroupAddon(
+                    dbc.Button(
+                        "Join",
+                        id = "join-game-button",
+                        color = "primary"
+                    ),
+                    addon_type = "append"
                 )
-            ],
-            id = "confirm-upload-modal",
-            centered = True
+            ]
+        )
+    )
+    content.append(html.Br()),
+    content.append(html.Br()),
+    content.append(dbc.Alert(html.H3("Archive 🗄️"), color = "primary")),
+    content.append(
+        dbc.Input(
+            id = "archive-search",
+            placeholder = "Players, e.g. Anna, Ben",
+            debounce = True,
+            bs_size = "lg"
+        )
+    )
+    content.append(
+        dbc.Spinner(
+            html.Div(
+                id = "archive-results",
+                className = "mt-3"
+            )
         )
     )
     content.append(
         html.Div(
             children = [
-                dbc.Button(id = "add-results-button"),
-                dbc.Button(id = "handout-mistake-button"),
-                dbc.Button(id = "beer-count-button"),
-                dbc.Button(id = "goiß-count-button"),
-                dbc.Button(id = "save-game-button"),
-                html.Div(
-                    "{}",
-                    id = "table-dict",
-                    style = {"display": "none"}
-                ),
-                html.Div(
-                    "{}",
-                    id = "game-history",
-                    style = {"display": "none"}
-                ),
-                html.Div(
-                    "{}",
-                    id = "points-development",
-                    style = {"display": "none"}
-                ),
-                html.Div(
-                    "{}",
-                    id = "handout-mistakes",
-                    style = {"display": "none"}
-                ),
-                html.Div(
-                    "{}",
-                    id = "beer-count",
-                    style = {"display": "none"}
-                ),
-                html.Div(
-                    "{}",
-                    id = "goiß-count",
-                    style = {"display": "none"}
+                dbc.Button(
+                    "◀",
+                    id = "archive-previous",
+                    color = "primary",
+                    className = "mr-1"
                 ),
+                dbc.Button(
+                    "▶",
+                    id = "archive-next",
+                    color = "primary",
+                    className = "mr-1"
+                )
             ],
-            style = {"display": "None"}
+            style = {"text-align": "center"}
         )
     )
+    content.append(static("upload-modal", upload_modal))
+    content.append(static("names-placeholders", names_placeholders))
     return content
 
-def get_ranks(names):
-    ranks = list()
-    half = int(len(names)/2)
-    for i in range(len(names)):
-        ranks.append("Bauer")
-    for i in range(half):
-        ranks[i] = f"{'Vize'*i} Arschloch"
-        i_reverse = -(i + 1)
-        ranks[i_reverse] = f"{'Vize'*i} König"
-    ranks.reverse()
-    return ranks
+def batch_round_form(table_dict):
+    options = [{"label": rank, "value": i} for i, rank in enumerate(table_dict["Ranks"][:-1])]
+    form = list()
+    for i, name in enumerate(scoring.table_names(table_dict)):
+        form.append(
+            dbc.Row(
+                children = [
+                    dbc.Col(html.H5(name), width = 4),
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id = {"type": "batch-rank", "index": i},
+                            options = options,
+                            placeholder = "Rank",
+                            clearable = False
+                        ),
+                        width = 8
+                    )
+                ],
+                align = "center",
+                className = "mb-3"
+            )
+        )
+    form.append(
+        html.Div(
+            id = "batch-round-error",
+            style = {"text-align": "center", "color": "red"}
+        )
+    )
+    form.append(
+        html.Div(
+            dbc.Button(
+                "Add Round",
+                id = "confirm-batch-round",
+                color = "primary",
+                size = "lg",
+                className = "mr-1"
+            ),
+            style = {"text-align": "center"}
+        )
+    )
+    return dbc.Card(dbc.CardBody(form), className = "mt-3")
 
-def game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count):
-    ranking = list()
-    names = list(table_dict.keys())[1:]
-    names.reverse()
-    for name in names:
-        if not len(ranking):
-            ranking.append(name)
-        else:
-            pos = 0
-            for rank_name in ranking:
-                if table_dict[name][-1] > table_dict[rank_name][-1]:
-                    pos += 1
-            ranking.insert(pos, name)
-    ranking.reverse()
+def game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id = "", house_rules = None, version = 0, synced_events = list(), timestamps = None):
+    names = scoring.table_names(table_dict)
+    divs = state_divs({
+        "table-dict": table_dict,
+        "game-history": game_history,
+        "points-development": points_development,
+        "handout-mistakes": handout_mistakes,
+        "beer-count": beer_count,
+        "goiß-count": goiß_count,
+        "timestamps": timestamps
+    })
+    player_ratings = ratings.get_ratings()
+    html_ratings = [
+        html.H5(f"{name}: {player_ratings.rating(name):.0f}")
+        for name in sorted(names, key = player_ratings.rating, reverse = True)
+    ]
     
     html_headers = [html.H1, html.H2, html.H3, html.H4]
     html_ranking = list()
-    for i, rank in enumerate(ranking):
+    for i, rank in enumerate(scoring.ranking(table_dict)):
         text = f"{i+1}. {rank}"
         try:
             html_ranking.append(html_headers[i](text))
         except IndexError:
             html_ranking.append(html.H5(text))
     
-    game_history_data = list()
-    game_tick_text = table_dict["Ranks"][:-1]
-    game_tick_text.reverse()
-    if len(game_history["x"]) > 6:
-        game_x_range = [len(game_history["x"]) - 6, len(game_history["x"]) + 0.5]
-    else:
-        game_x_range = [0.5,6.5]
-    for i, name in enumerate(list(game_history.keys())[1:]):
-        game_history_data.append(go.Scatter(x = game_history["x"], y = game_history[name], name = name, mode = "lines"))
-    game_history_fig = go.Figure(data = game_history_data)
-    game_history_fig.update_layout(
-        yaxis = dict(
-            tickmode = "array",
-            tickvals = list(range(len(table_dict["Ranks"][:-1]))),
-            ticktext = game_tick_text
-        ),
-        xaxis = dict(
-            title = "Game"
-        ),
-        xaxis_range = game_x_range
-    )
-    
-    points_development_data = list()
-    max_points = 0
-    min_points = 0
-    for i, name in enumerate(list(points_development.keys())[1:]):
-        if max(points_development[name]) > max_points:
-            max_points = max(points_development[name])
-        if min(points_development[name]) < min_points:
-            min_points = min(points_development[name])
-        points_development_data.append(go.Scatter(x = points_development["x"], y = points_development[name], name = name))
-    if len(points_development["x"]) >= 6:    
-        points_x_range = None
-    else:
-        points_x_range = [-0.5,6.5]
-    if max_points >= 6:
-        points_y_range = None
-    else:
-        points_y_range = [min_points-0.5,6.5]
-    points_development_fig = go.Figure(data = points_development_data)
-    points_development_fig.update_layout(
-        yaxis = dict(
-            title = "Points"
-        ),
-        xaxis = dict(
-            title = "Game"
-        ),
-        yaxis_range = points_y_range,
-        xaxis_range = points_x_range
-    )
+    figs = figures.game_figures(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count)
+    game_history_fig = figs["game-history"]
+    points_development_fig = figs["points-development"]
+    rank_accumulation_fig = figs["rank-accumulation"]
+    handout_mistake_fig = figs["handout-mistakes"]
+    beer_count_fig = figs["beer-count"]
+    goiß_count_fig = figs["goiß-count"]
+    head_to_head = headtohead.game_matrix(game_history, game_id)
+    head_to_head_fig = figures.head_to_head_figure(head_to_head.names, head_to_head.wins, head_to_head.margin)
+    rank_transitions = transitions.game_transitions(game_history, scoring.get_ranks(names, house_rules), game_id)
+    transition_fig = figures.transition_figure(rank_transitions.ranks, rank_transitions.total())
+    html_transitions = list()
+    for name in rank_transitions.names:
+        player_metrics = transitions.metrics(rank_transitions.counts[name])
+        if player_metrics["transitions"]:
+            html_transitions.append(html.H5(
+                f"{name}: keeps the rank {player_metrics['stickiness']:.0%} of the time, "
+                f"{rank_transitions.ranks[0]} {player_metrics['stationary'][0]:.0%} in the long run"
+            ))
     
-    x_text = table_dict["Ranks"][:-1]
-    x_vals = list(range(len(x_text)))
-    rank_accumulation_data = list()
-    max_ranks = 0
-    for i, name in enumerate(list(table_dict.keys())[1:]):
-        if max(table_dict[name][:-1]) > max_ranks:
-            max_ranks = max(table_dict[name][:-1])
-        rank_accumulation_data.append(go.Bar(x = x_vals, y = table_dict[name][:-1], name = name))
-    rank_accumulation_fig = go.Figure(data = rank_accumulation_data)
-    if max_ranks >= 5:
-        ranks_y_range = None
+    game_pace = pace.analyze({
+        "game-history": game_history,
+        "handout-mistakes": handout_mistakes,
+        "beer-count": beer_count,
+        "goiß-count": goiß_count,
+        "timestamps": timestamps
+    })
+    html_pace = list()
+    if game_pace and game_pace["round-durations"]:
+        first_round = len(game_history["x"]) - len(game_pace["round-durations"]) + 1
+        pace_fig = figures.pace_figure(list(range(first_round, len(game_history["x"]) + 1)), game_pace["round-durations"], game_pace["rolling-pace"])
+        html_pace.append(html.H5(f"Average round: {game_pace['mean-round'] / 60:.1f} min"))
+        if game_pace["rounds-per-hour"]:
+            html_pace.append(html.H5(f"{game_pace['rounds-per-hour']:.1f} rounds per hour"))
+        for counter, title in [("beer-count", "Beers"), ("goiß-count", "Goiß Moß"), ("handout-mistakes", "Handout mistakes")]:
+            if counter in game_pace["counters"] and game_pace["counters"][counter]["per-hour"]:
+                html_pace.append(html.H5(f"{title} per hour: {game_pace['counters'][counter]['per-hour']:.1f}"))
+        pace_style = {}
     else:
-        ranks_y_range = [-0.5,5]
-    rank_accumulation_fig.update_layout(
-        yaxis = dict(
-            title = "Rank Amount"
-        ),
-        xaxis = dict(
-            tickmode = "array",
-            tickvals = x_vals,
-            ticktext = x_text
-        ),
-        yaxis_range = ranks_y_range
-    )
+        pace_fig = go.Figure()
+        pace_style = {"display": "none"}
     
+    #the browser applies queued events to the points table with the same points as the server
+    table = rules.compile_rules(house_rules, len(table_dict["Ranks"]) - 1)
+    game_scoring = {"points": table.points, "counter-weights": table.counter_weights}
     
     if handout_mistakes:
-        if max(handout_mistakes.values()) >= 5:
-            handout_y_range = None
-        else:
-            handout_y_range = [-0.5,5]
-        bar_widths = [0.35 for val in handout_mistakes.values()]
-        handout_y = list(handout_mistakes.values())
-        handout_mistake_data = [
-            go.Bar(
-                x = list(
-                    handout_mistakes.keys()
-                ), 
-                y = handout_y, 
-                width = bar_widths, 
-                text = handout_y, 
-                textposition="auto", 
-                marker_color = "#007BFF",
-                textfont = dict(color = "rgb(255, 255, 255)")
-            )
-        ]
-        handout_mistake_fig = go.Figure(data = handout_mistake_data)
-        handout_mistake_fig.update_layout(
-            yaxis_range = handout_y_range
-        )
         handout_mistakes_style = {}
     else:
         handout_mistakes_style = {"display": "none"}
-        handout_mistake_fig = go.Figure()
         handout_mistakes = {}
         
     if beer_count:
-        #print(max(beer_count.values()))
-        if max(beer_count.values()) >= 5:
-            beer_y_range = None
-        else:
-            beer_y_range = [-0.5,5]
-        bar_widths = [0.35 for val in beer_count.values()]
-        beer_y = list(beer_count.values())
-        beer_count_data = [
-            go.Bar(
-                x = list(
-                    beer_count.keys()
-                ), 
-                y = beer_y, 
-                width = bar_widths, 
-                text = beer_y, 
-                textposition="auto", 
-                marker_color = "#007BFF", 
-                textfont = dict(color = "rgb(255, 255, 255)")
-            )
-        ]
-        beer_count_fig = go.Figure(data = beer_count_data)
-        beer_count_fig.update_layout(
-            yaxis_range = beer_y_range
-        )
         beer_count_style = {}
     else:
         beer_count_style = {"display": "none"}
-        beer_count_fig = go.Figure()
         beer_count = {}
     
     if goiß_count:
-        #print(max(beer_count.values()))
-        if max(goiß_count.values()) >= 5:
-            goiß_y_range = None
-        else:
-            goiß_y_range = [-0.5,5]
-        bar_widths = [0.35 for val in goiß_count.values()]
-        goiß_y = list(goiß_count.values())
-        goiß_count_data = [
-            go.Bar(
-                x = list(
-                    goiß_count.keys()
-                ), 
-                y = goiß_y, 
-                width = bar_widths, 
-                text = goiß_y, 
-                textposition="auto", 
-                marker_color = "#007BFF", 
-                textfont = dict(color = "rgb(255, 255, 255)")
-            )
-        ]
-        goiß_count_fig = go.Figure(data = goiß_count_data)
-        goiß_count_fig.update_layout(
-            yaxis_range = goiß_y_range
-        )
         goiß_count_style = {}
     else:
         goiß_count_style = {"display": "none"}
-        goiß_count_fig = go.Figure()
         goiß_count = {}
     
     return [
@@ -468,6 +673,11 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             points_table(table_dict),
             style = {"overflow": "scroll"}
         ),
+        html.P(
+            f"Game ID: {game_id} (join from another device to score together)",
+            className = "text-muted mt-2",
+            style = {"text-align": "center"}
+        ),
         html.Br(),
         html.Div(
             dbc.Button(
@@ -480,6 +690,21 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             style = {"text-align": "center"}
         ),
         html.Br(),
+        html.Div(
+            dbc.Button(
+                "Batch Entry",
+                id = "batch-round-button",
+                color = "primary",
+                size = "lg",
+                className = "mr-1"
+            ),
+            style = {"text-align": "center"}
+        ),
+        dbc.Collapse(
+            batch_round_form(table_dict),
+            id = "batch-round-collapse"
+        ),
+        html.Br(),
         html.Div(
             dbc.Button(
                 "Save Game",
@@ -490,20 +715,27 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             ),
             style = {"text-align": "center"}
         ),
+        html.Br(),
+        html.Div(
+            dbc.Button(
+                "Export Report",
+                id = "export-report-button",
+                color = "primary",
+                size = "lg",
+                className = "mr-1"
+            ),
+            style = {"text-align": "center"}
+        ),
         
+        static("game-placeholders", game_placeholders),
+        html.Br(),
         html.Div(
-            children = [
-                dbc.Button(id = "start-game-button"),
-                dbc.Button(id = "add-player-button"),
-                dbc.Checkbox(id = "handout-mistakes-checkbox"),
-                dbc.Checkbox(id = "beer-count-checkbox"),
-                dbc.Checkbox(id = "goiß-count-checkbox")
-            ],  
+            divs["game-players"],
+            id = "game-players",
             style = {"display": "none"}
         ),
-        html.Br(),
         html.Div(
-            str(table_dict),
+            divs["table-dict"],
             id = "table-dict",
             style = {"display": "none"}
         ),
@@ -516,29 +748,125 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             }
         ),
         html.Br(),html.Br(),
+        dbc.Alert(html.H3("Ratings 📐"), color = "primary"),
+        html.Div(
+            children = html_ratings,
+            style = {
+                "text-align": "center"
+            }
+        ),
+        html.Br(),html.Br(),
+        dbc.Alert(html.H3("Projection 🔮"), color = "primary"),
+        dbc.Row(
+            children = [
+                dbc.Col(
+                    dbc.Input(
+                        id = "projection-rounds",
+                        type = "number",
+                        min = 0,
+                        max = projection.max_rounds,
+                        step = 1,
+                        value = 10,
+                        bs_size = "lg"
+                    ),
+                    width = 4
+                ),
+                dbc.Col(
+                    dbc.Button(
+                        "Project Remaining Rounds",
+                        id = "projection-button",
+                        color = "primary",
+                        size = "lg",
+                        className = "mr-1",
+                        block = True
+                    ),
+                    width = 8
+                )
+            ],
+            justify = "center"
+        ),
+        html.Br(),
+        dbc.Spinner(
+            html.Div(
+                id = "projection-output",
+                style = {"text-align": "center"}
+            )
+        ),
+        html.Br(),html.Br(),
         dbc.Alert(html.H3("Points Development 📈"), color = "primary"),
         dbc.Spinner(
-            dcc.Graph(figure = points_development_fig)
+            dcc.Graph(figure = points_development_fig, id = "points-development-graph")
         ),
         html.Div(
-            str(points_development),
+            divs["points-development"],
             id = "points-development",
             style = {"display": "none"}
         ),
         html.Br(),html.Br(),
         dbc.Alert(html.H3("Game History 🕑"), color = "primary"),
         dbc.Spinner(
-            dcc.Graph(figure = game_history_fig)
+            dcc.Graph(figure = game_history_fig, id = "game-history-graph")
+        ),
+        html.Div(
+            divs["game-history"],
+            id = "game-history",
+            style = {"display": "none"}
+        ),
+        html.Br(),html.Br(),
+        dbc.Alert(html.H3("Rank Accumulation 📊"), color = "primary"),
+        dbc.Spinner(
+            dcc.Graph(figure = rank_accumulation_fig)
+        ),
+        html.Br(),html.Br(),
+        dbc.Alert(html.H3("Head to Head ⚔️"), color = "primary"),
+        dbc.Spinner(
+            dcc.Graph(figure = head_to_head_fig)
+        ),
+        html.Br(),html.Br(),
+        dbc.Alert(html.H3("Rank Transitions 🔁"), color = "primary"),
+        dbc.Spinner(
+            dcc.Graph(figure = transition_fig)
+        ),
+        html.Div(
+            children = html_transitions,
+            style = {
+                "text-align": "center"
+            }
         ),
         html.Div(
-            str(game_history),
-            id = "game-history",
-            style = {"display": "none"}
+            children = [
+                html.Br(),html.Br(),
+                dbc.Alert(html.H3("Pace ⏱️"), color = "primary"),
+                dbc.Spinner(
+                    dcc.Graph(figure = pace_fig)
+                ),
+                html.Div(
+                    children = html_pace,
+                    style = {
+                        "text-align": "center"
+                    }
+                )
+            ],
+            style = pace_style
         ),
         html.Br(),html.Br(),
-        dbc.Alert(html.H3("Rank Accumulation 📊"), color = "primary"),
+        dbc.Alert(html.H3("Replay ⏪"), color = "primary"),
+        dcc.Slider(
+            id = "replay-slider",
+            min = 0,
+            max = len(game_history["x"]),
+            step = 1,
+            value = len(game_history["x"]),
+            marks = {k: str(k) for k in range(0, len(game_history["x"]) + 1, max(len(game_history["x"]) // 10, 1))},
+            updatemode = "drag"
+        ),
         dbc.Spinner(
-            dcc.Graph(figure = rank_accumulation_fig)
+            html.Div(
+                "Move the slider to see the game after any round",
+                id = "replay-output",
+                className = "text-muted",
+                style = {"text-align": "center"}
+            )
         ),
         html.Br(),
         html.Div(
@@ -563,7 +891,7 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             style = handout_mistakes_style
         ),
         html.Div(
-            str(handout_mistakes),
+            divs["handout-mistakes"],
             id = "handout-mistakes",
             style = {"display": "none"}
         ),
@@ -590,7 +918,7 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             style = beer_count_style
         ),
         html.Div(
-            str(beer_count),
+            divs["beer-count"],
             id = "beer-count",
             style = {"display": "none"}
         ),
@@ -617,23 +945,148 @@ def game_content(table_dict, game_history, points_development, handout_mistakes,
             style = goiß_count_style
         ),
         html.Div(
-            str(goiß_count),
+            divs["goiß-count"],
             id = "goiß-count",
             style = {"display": "none"}
         ),
         html.Div(
-            children = [
-                dbc.Button(id = "confirm-load-game"),
-                html.Div(id = "json-content"),
-                dcc.Upload(id = "upload-json"),
-                dbc.Modal(id = "confirm-upload-modal"),
-                html.Div(id = "file-name"),
-                dbc.Button(id = "upload-button")
-            ],
+            game_id,
+            id = "game-id",
             style = {"display": "none"}
-        )
+        ),
+        html.Div(
+            json.dumps(house_rules),
+            id = "game-rules",
+            style = {"display": "none"}
+        ),
+        html.Div(
+            str(version),
+            id = "game-version",
+            style = {"display": "none"}
+        ),
+        html.Div(
+            divs["game-timestamps"],
+            id = "game-timestamps",
+            style = {"display": "none"}
+        ),
+        html.Div(
+            json.dumps(game_scoring),
+            id = "game-scoring",
+            style = {"display": "none"}
+        ),
+        html.Div(
+            json.dumps(synced_events),
+            id = "synced-events",
+            style = {"display": "none"}
+        ),
+        static("upload-placeholders", upload_placeholders)
     ]
 
+def zoom_range(relayout_data):
+    #returns the zoomed x range, None for a reset zoom and raises PreventUpdate for every other relayout
+    if not relayout_data:
+        raise PreventUpdate
+    if "xaxis.range[0]" in relayout_data:
+        return [relayout_data["xaxis.range[0]"], relayout_data["xaxis.range[1]"]]
+    if "xaxis.range" in relayout_data:
+        return relayout_data["xaxis.range"]
+    if "xaxis.autorange" in relayout_data:
+        return None
+    raise PreventUpdate
+
+def game_view(game, synced_events = list()):
+    return game_content(
+        game["table-dict"],
+        game["game-history"],
+        game["points-development"],
+        game["handout-mistakes"],
+        game["beer-count"],
+        game["goiß-count"],
+        game.get("game-id", ""),
+        game.get("rules"),
+        game.get("version", 0),
+        synced_events,
+        game.get("timestamps")
+    )
+
+def audit_log(action, game, **fields):
+    #who changed which game, for checking disputed scores afterwards
+    audit.log(action, game = game["game-id"], version = game.get("version", 0), remote = flask.request.remote_addr if flask.has_request_context() else None, **fields)
+
+def sync_view(game, events):
+    #commits the queued events to the shared game, a game the store doesn't know (e.g. after a restart) is added from the page
+    events = [event for event in events or list() if event.get("game") == game["game-id"]]
+    try:
+        game, version, applied, rejected = store.games.commit(game["game-id"], events)
+    except store.Unknown:
+        store.games.create(game)
+        game, version, applied, rejected = store.games.commit(game["game-id"], events)
+    ratings.update_events(game, applied)
+    headtohead.update_events(game, applied)
+    transitions.update_events(game, applied)
+    if applied or rejected:
+        audit_log("sync", game, applied = applied, rejected = rejected)
+    view = game_view(game, [event.get("id") for event in events])
+    if rejected:
+        view.insert(0, dbc.Alert(
+            f"⚠️ {len(rejected)} of your results could not be added, another device entered a round first or they were invalid. Please check the game and enter them again.",
+            color = "warning",
+            dismissable = True
+        ))
+    return view
+
+########### Page state
+#the page keeps its game interned (scoring.intern_game): the names once in game-players and every other
+#state div holds its part of the interned game, so a callback only gets the parts it reads and no names
+state_parts = {
+    "table-dict": ["ranks", "table"],
+    "game-history": ["game-history", "game-history-x"],
+    "points-development": ["points-development", "points-development-x"],
+    "handout-mistakes": ["handout-mistakes"],
+    "beer-count": ["beer-count"],
+    "goiß-count": ["goiß-count"],
+    "game-timestamps": ["timestamps"]
+}
+
+def state_divs(game):
+    interned = scoring.intern_game(game)
+    divs = {div: json.dumps({key: interned[key] for key in keys if key in interned}) for div, keys in state_parts.items()}
+    divs["game-players"] = json.dumps(interned["players"])
+    return divs
+
+def load_state(value):
+    #the hidden state divs hold json, pages and offline snapshots from before hold python dict strings
+    try:
+        return json.loads(value)
+    except ValueError:
+        return json.loads(value.replace("'", "\""))
+
+def load_parts(game_players, *parts):
+    #the interned game of some state divs
+    interned = {"players": load_state(game_players)}
+    for part in parts:
+        interned.update(load_state(part))
+    return interned
+
+def parse_game(game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id = "", game_rules = "null", game_version = "0", game_timestamps = "{}"):
+    parts = [table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count]
+    if "Ranks" in load_state(table_dict):
+        #offline snapshots from before kept the game dict, one name-keyed div per key
+        game = dict(zip(["table-dict", "game-history", "points-development", *scoring.counters], map(load_state, parts)))
+        game["timestamps"] = json.loads(game_timestamps or "null")
+    else:
+        game = scoring.extern_game(load_parts(game_players, *parts, game_timestamps or "{}"))
+    game["game-id"] = game_id or scoring.new_game_id()
+    game["rules"] = json.loads(game_rules or "null")
+    game["version"] = int(game_version or 0)
+    return game
+
+def snapshot_game(offline_game):
+    #snapshots from before had no game-players
+    if len(offline_game) == 10:
+        return parse_game(None, *offline_game)
+    return parse_game(*offline_game)
+
 ########### Initiate the app
 external_stylesheets = [dbc.themes.BOOTSTRAP]
 meta_tags = [{"name": "viewport", "content": "width=device-width, initial-scale=1"}]
@@ -646,11 +1099,35 @@ app = dash.Dash(
 )
 application = app.server
 app.title='Arschloch Stats'
+#requests beyond the upload limit are refused before their body is read
+server.config["MAX_CONTENT_LENGTH"] = uploads.max_request_bytes
+
+@server.before_request
+def limit_request_size():
+    #werkzeug only applies MAX_CONTENT_LENGTH to form data, the dash callbacks post json and uploads come through them
+    if flask.request.path == app.config.routes_pathname_prefix + "_dash-update-component" and (flask.request.content_length or 0) > uploads.max_request_bytes:
+        flask.abort(413)
+
+@server.after_request
+def insert_static_components(response):
+    #dash writes layouts and callback results as json, files and streamed responses are left alone
+    if response.mimetype == "application/json" and not response.direct_passthrough:
+        response.set_data(insert_static(response.get_data()))
+    return response
 
 @server.route("/download/<path:path>")
 def download(path):
     return flask.send_from_directory(".", path, as_attachment=True)
 
+server.register_blueprint(api.api)
+
+@server.route("/report/<job_id>")
+def download_report(job_id):
+    path = report.queue.path(job_id)
+    if path is None:
+        flask.abort(404)
+    return flask.send_file(os.path.abspath(path), as_attachment = True, attachment_filename = "arschloch_stats_report.html")
+
 ########### Set up the layout
 app.layout = html.Div(
     children = [
@@ -733,11 +1210,22 @@ app.layout = html.Div(
         #     color = "primary",
         #     dark = True
         # ),
+        #offline mode: results are queued in the browser storage and synced when the server is reachable
+        html.Div(
+            id = "sync-status",
+            style = {"text-align": "center"}
+        ),
         html.Div(
             children = names_content(),
             id = "content",
             style = {"padding": "5%"}
         ),
+        dcc.Store(id = "sync-queue", storage_type = "local"),
+        dcc.Store(id = "offline-game", storage_type = "local"),
+        dcc.Store(id = "sync-trigger"),
+        dcc.Store(id = "server-version"),
+        dcc.Store(id = "archive-page", data = 1),
+        dcc.Interval(id = "sync-interval", interval = 5000),
         modal(
             "start-game-modal",
             "Please Notice!",
@@ -1078,11 +1566,55 @@ app.layout = html.Div(
             id = "download-modal",
             centered = True
         ),
+        dbc.Modal(
+            children = [
+                dbc.ModalHeader(
+                    "📊 Export Game Report 📊",
+                ),
+                dbc.ModalBody(
+                    "Rendering the report of your current game...",
+                    id = "report-status"
+                ),
+                dbc.ModalBody(
+                    html.Div(
+                        dbc.Spinner(
+                            html.A(
+                                dbc.Button(
+                                    "Download",
+                                    id = "download-report-button",
+                                    color = "primary",
+                                    className = "mr-1",
+                                    block = True,
+                                    size = "lg",
+                                    disabled = True
+                                ),
+                                href = "/report/",
+                                id = "report-href"
+                            )
+                        ),
+                        style = {"text-align": "center"}
+                    )
+                ),
+                html.Div(
+                    "",
+                    id = "report-job",
+                    style = {"display": "none"}
+                ),
+                dcc.Interval(
+                    id = "report-interval",
+                    interval = 1000,
+                    disabled = True
+                )
+            ],
+            id = "report-modal",
+            centered = True
+        ),
         modal(
             "invalid-json-modal",
             "🙁 Invalid Game Data 🙁",
             html.Div(
                 children = [
+                    html.P(id = "invalid-json-message"),
                     dbc.Button(
                         "Ok",
                         id = "confirm-invalid-json",
@@ -1097,129 +1629,91 @@ app.layout = html.Div(
     ]
 )
 
+#the layout with its modals never changes, it is serialized once instead of on every page load
+layout_json = insert_static(json.dumps(app.layout, cls = plotly.utils.PlotlyJSONEncoder).encode("utf-8"))
+
+def serve_layout():
+    return flask.Response(layout_json, mimetype = "application/json")
+
+server.view_functions[app.config.routes_pathname_prefix + "_dash-layout"] = serve_layout
+
 ########### Callbacks
 @app.callback(
     [Output("content", "children"),
     Output("start-game-modal", "is_open"),
-    Output("new-game-modal", "is_open"),
-    Output("handout-mistake-radio-modal", "is_open"),
-    Output("handout-mistake-radio", "options"),
-    Output("beer-count-radio-modal", "is_open"),
-    Output("beer-count-radio", "options"),
-    Output("goiß-count-radio-modal", "is_open"),
-    Output("goiß-count-radio", "options"),
     Output("add-player-button", "n_clicks"),
     Output("start-game-button", "n_clicks"),
-    Output("new-game-button", "n_clicks"),
     Output("confirm-new-game-button", "n_clicks"),
-    Output("delice-new-game-button", "n_clicks"),
-    Output("confirm-selection-button", "n_clicks"),
-    Output("handout-mistake-button", "n_clicks"),
-    Output("cancel-handout-radio", "n_clicks"),
-    Output("ok-handout-radio", "n_clicks"),
-    Output("beer-count-button", "n_clicks"),
-    Output("cancel-beer-radio", "n_clicks"),
-    Output("ok-beer-radio", "n_clicks"),
-    Output("goiß-count-button", "n_clicks"),
-    Output("cancel-goiß-radio", "n_clicks"),
-    Output("ok-goiß-radio", "n_clicks"),
-    Output("confirm-load-game", "n_clicks")],
+    Output("confirm-load-game", "n_clicks"),
+    Output("restore-game-button", "n_clicks"),
+    Output("join-game-button", "n_clicks")],
     [Input("add-player-button", "n_clicks"),
     Input("start-game-button", "n_clicks"),
-    Input("new-game-button", "n_clicks"),
     Input("confirm-new-game-button", "n_clicks"),
-    Input("delice-new-game-button", "n_clicks"),
-    Input("confirm-selection-button", "n_clicks"),
-    Input("handout-mistake-button", "n_clicks"),
-    Input("cancel-handout-radio", "n_clicks"),
-    Input("ok-handout-radio", "n_clicks"),
-    Input("handout-mistakes-checkbox", "checked"),
-    Input("beer-count-button", "n_clicks"),
-    Input("cancel-beer-radio", "n_clicks"),
-    Input("ok-beer-radio", "n_clicks"),
-    Input("beer-count-checkbox", "checked"),
-    Input("goiß-count-button", "n_clicks"),
-    Input("cancel-goiß-radio", "n_clicks"),
-    Input("ok-goiß-radio", "n_clicks"),
-    Input("goiß-count-checkbox", "checked"),
-    Input("confirm-load-game", "n_clicks")],
+    Input("confirm-load-game", "n_clicks"),
+    Input("restore-game-button", "n_clicks"),
+    Input("join-game-button", "n_clicks"),
+    Input("sync-trigger", "data"),
+    Input({"type": "open-archived-game", "index": ALL}, "n_clicks")],
     [State("content", "children"),
-    State("current-selection", "children"),
+    State("game-players", "children"),
     State("table-dict", "children"),
     State("game-history", "children"),
     State("points-development", "children"),
-    State("handout-mistake-radio", "value"),
+    State("handout-mistakes-checkbox", "checked"),
     State("handout-mistakes", "children"),
-    State("beer-count-radio", "value"),
+    State("beer-count-checkbox", "checked"),
     State("beer-count", "children"),
-    State("goiß-count-radio", "value"),
+    State("goiß-count-checkbox", "checked"),
+    State("house-rules", "value"),
     State("goiß-count", "children"),
-    State("json-content", "children")]
+    State("game-id", "children"),
+    State("game-rules", "children"),
+    State("game-version", "children"),
+    State("game-timestamps", "children"),
+    State("json-content", "children"),
+    State("join-game-id", "value"),
+    State("sync-queue", "data"),
+    State("offline-game", "data"),
+    State({"type": "open-archived-game", "index": ALL}, "id")],
+    prevent_initial_call = True
 )
 def update_content(
     n_add_player, 
     n_start_game, 
-    n_new_game, 
     n_confirm_new_game, 
-    n_delice_new_game, 
-    n_confirm_selection, 
-    n_handout_mistake, 
-    n_cancel_handout_mistake, 
-    n_ok_handout_mistake,
-    handout_mistakes_check,
-    n_beer_count, 
-    n_cancel_beer_count,
-    n_ok_beer_count,
-    beer_count_check,
-    n_goiß_count, 
-    n_cancel_goiß_count, 
-    n_ok_goiß_count,
-    goiß_count_check,
     n_load_game,
+    n_restore_game,
+    n_join_game,
+    sync_trigger,
+    n_open_archived,
     content, 
-    selection, 
+    game_players,
     table_dict, 
     game_history, 
     points_development, 
-    handout_mistake_selection, 
+    handout_mistakes_check,
     handout_mistakes,
-    beer_count_selection, 
+    beer_count_check,
     beer_count,
-    goiß_count_selection, 
+    goiß_count_check,
+    house_rules,
     goiß_count,
-    upload_json_content
+    game_id,
+    game_rules,
+    game_version,
+    game_timestamps,
+    upload_json_content,
+    join_game_id,
+    sync_queue,
+    offline_game,
+    archived_ids
 ):
-    def return_list(
-        content, 
-        start_game_modal = False, 
-        new_game_modal = False, 
-        handout_mistake_modal = False, 
-        handout_mistake_options = [], 
-        beer_count_modal = False, 
-        beer_count_options = [],
-        goiß_count_modal = False, 
-        goiß_count_options = []
-    ):
-        return [
-            content, 
-            start_game_modal, 
-            new_game_modal, 
-            handout_mistake_modal, 
-            handout_mistake_options, 
-            beer_count_modal, 
-            beer_count_options,
-            goiß_count_modal, 
-            goiß_count_options,  
-            0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0
-        ]
-    
-    selection = json.loads(selection.replace("'", "\""))
-    table_dict = json.loads(table_dict.replace("'", "\""))
-    game_history = json.loads(game_history.replace("'", "\""))
-    points_development = json.loads(points_development.replace("'", "\""))
-    handout_mistakes = json.loads(handout_mistakes.replace("'", "\""))
-    beer_count = json.loads(beer_count.replace("'", "\""))
-    goiß_count = json.loads(goiß_count.replace("'", "\""))
+    #opening and closing the modals happens in the clientside callbacks (assets/clientside.js)
+    #rounds and counters are queued in the browser and arrive here with the sync trigger,
+    #the shared state of a game lives in the game store, so several devices can score the same game
+    def return_list(content, start_game_modal = False):
+        return [content, start_game_modal, 0, 0, 0, 0, 0, 0]
     
     names = list()
     for element in content:
@@ -1236,219 +1730,73 @@ def update_content(
     if n_start_game:
         names = [n for n in names if n]
         if len(names) >= 2 and len(names) == len(list(set(names))):
-            ranks = get_ranks(names)
-    
-            table_dict = {"Ranks": [*ranks, "Points"]}
-            for name in names:
-                table_dict[name] = [0 for i in range(len(ranks)+1)]
-            
-            game_history = {"x": list()}
-            for name in names:
-                game_history[name] = list()
-                
-            points_development = {"x": [0]}
-            for name in names:
-                points_development[name] = [0]
-            
-            if handout_mistakes_check:
-                handout_mistakes = {}
-                for name in names:
-                    handout_mistakes[name] = 0
-            else:
-                handout_mistakes = None
-
-            if beer_count_check:
-                beer_count = {}
-                for name in names:
-                    beer_count[name] = 0
-            else:
-                beer_count = None
-            
-            if goiß_count_check:
-                goiß_count = {}
-                for name in names:
-                    goiß_count[name] = 0
-            else:
-                goiß_count = None
-            
-            return return_list(game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count))
+            game = scoring.new_game(
+                names,
+                handout_mistakes = handout_mistakes_check,
+                beer_count = beer_count_check,
+                goiß_count = goiß_count_check,
+                house_rules = None if house_rules == rules.default_rules["name"] else rules.presets.get(house_rules)
+            )
+            store.games.create(game)
+            audit_log("start", game, players = names, rules = game["rules"])
+            return return_list(game_view(game))
         else:
             return return_list(content, start_game_modal = True)
     
     if n_load_game:
-        upload_json_content = json.loads(upload_json_content.replace("'", "\""))
-        return return_list(
-            game_content(
-                upload_json_content["table-dict"],
-                upload_json_content["game-history"],
-                upload_json_content["points-development"],
-                upload_json_content["handout-mistakes"],
-                upload_json_content["beer-count"],
-                upload_json_content["goiß-count"]
-            )
-        )
-    
-    if n_new_game:
-        return return_list(content, new_game_modal = True)
+        upload_json_content = json.loads(upload_json_content)
+        upload_json_content.setdefault("game-id", scoring.new_game_id())
+        store.games.create(upload_json_content)
+        archive.store_game(upload_json_content)
+        audit_log("import", upload_json_content, players = scoring.get_names(upload_json_content), rounds = len(upload_json_content["game-history"]["x"]))
+        return return_list(game_view(upload_json_content))
     
     if n_confirm_new_game:
         names = [None, None, None]
         return return_list(names_content(names))
     
-    if n_confirm_selection:
-        for name in selection:
-            table_dict[name][selection[name]] += 1
-            points = 0
-            points_list = table_dict[name][:-1]
-            for i, p in enumerate(points_list):
-                points += p * (len(points_list)-i-1)
-            try:
-                points -= handout_mistakes[name]
-                points += beer_count[name]
-                points += 3*goiß_count[name]
-            except KeyError:
-                pass
-            table_dict[name][-1] = points
-            
-            game_history[name].append(len(points_list) - selection[name] - 1)
-            points_development[name].append(points)
-        game_history["x"].append(len(game_history["x"])+1)
-        points_development["x"].append(len(points_development["x"]))
-        return return_list(game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count))
-    
-    if n_handout_mistake:
-        handout_mistake_options = []
-        for i, name in enumerate(list(table_dict.keys())[1:]):
-            handout_mistake_options.append({"label": name, "value": i})
-        return return_list(content, handout_mistake_modal = True, handout_mistake_options = handout_mistake_options)
-    
-    if n_ok_handout_mistake:
-        for i, name in enumerate(handout_mistakes):
-            if i == handout_mistake_selection:
-                handout_mistakes[name] += 1
-                table_dict[name][-1] -= 1
-                points_development[name][-1] -= 1
-        return return_list(game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count))
-
-    if n_beer_count:
-        beer_count_options = []
-        for i, name in enumerate(list(table_dict.keys())[1:]):
-            beer_count_options.append({"label": name, "value": i})
-        return return_list(content, beer_count_modal = True, beer_count_options = beer_count_options)
-    
-    if n_ok_beer_count:
-        for i, name in enumerate(beer_count):
-            if i == beer_count_selection:
-                beer_count[name] += 1
-                table_dict[name][-1] += 1
-                points_development[name][-1] += 1
-        return return_list(game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count))
-    
-    if n_goiß_count:
-        goiß_count_options = []
-        for i, name in enumerate(list(table_dict.keys())[1:]):
-            goiß_count_options.append({"label": name, "value": i})
-        return return_list(content, goiß_count_modal = True, goiß_count_options = goiß_count_options)
-    
-    if n_ok_goiß_count:
-        for i, name in enumerate(goiß_count):
-            if i == goiß_count_selection:
-                goiß_count[name] += 1
-                table_dict[name][-1] += 3
-                points_development[name][-1] += 3
-        return return_list(game_content(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count))
-        
-    return return_list(content)
-    
-@app.callback(
-    [Output("points-radio-modal", "is_open"),
-    Output("select-points-radio", "options"),
-    Output("points-modal-header", "children"),
-    Output("current-radio", "children"),
-    Output("select-points-radio", "value"),
-    Output("confirm-selection-modal", "is_open"),
-    Output("current-selection", "children"),
-    Output("add-results-button", "n_clicks"),
-    Output("cancel-points-radio", "n_clicks"),
-    Output("next-points-radio", "n_clicks")],
-    [Input("add-results-button", "n_clicks"),
-    Input("cancel-points-radio", "n_clicks"),
-    Input("next-points-radio", "n_clicks")],
-    [State("table-dict", "children"),
-    State("select-points-radio", "value"),
-    State("current-radio", "children"),
-    State("points-modal-header", "children")]
-)
-def add_results(n_add_results, n_cancel_radio, n_next_radio, table_dict, radio_values, current, name):
-    def return_list(points_modal = False, radio_points = [], name = "name", current = "{}", value = 0, confirm_modal = False, selection = "{}"):
-        return [points_modal, radio_points, name, current, value, confirm_modal, selection, 0, 0, 0]
+    if n_restore_game:
+        #the last game the browser saw from the server, plus everything that was queued after it
+        if not offline_game:
+            raise PreventUpdate
+        return return_list(sync_view(snapshot_game(offline_game), sync_queue))
     
-    try:
-        table_dict = json.loads(table_dict.replace("'","\""))
-        options = list()
-        for i, rank in enumerate(table_dict["Ranks"][:-1]):
-            options.append({"label": rank, "value": i})
-            names = list(table_dict.keys())[1:]
-    except (KeyError, AttributeError):
-        table_dict = dict()
-        names = [""]
-    
-    #print(json.dumps(table_dict, indent = 4))
-    #print(radio_values)
-    #print(current)
-    #print(name)
-    
-    current = json.loads(current.replace("'","\""))
-    value = 0
-    all_selected = False
-    
-    try:
-        new_name = names[names.index(name)+1]
-    except ValueError:
-        new_name = names[0]
-    except IndexError:
-        current[name] = radio_values
-        all_selected = True
-    
-        
-    if n_add_results:
-        return return_list(points_modal = True, radio_points = options, name = new_name)
+    if n_join_game:
+        try:
+            game, version = store.games.get((join_game_id or "").strip())
+        except KeyError:
+            return return_list(names_content(names, unknown_game = join_game_id or ""))
+        return return_list(game_view(game))
     
-    if n_cancel_radio:
-        return return_list()
+    for n_open, archived_id in zip(n_open_archived, archived_ids):
+        if n_open:
+            #a game that is still in the game store is opened with its latest state
+            try:
+                game, version = store.games.get(archived_id["index"])
+            except KeyError:
+                try:
+                    game = scoring.validate_game(archive.load_game(archived_id["index"]))
+                except (OSError, ValueError):
+                    raise PreventUpdate
+                game["game-id"] = archived_id["index"]
+                store.games.create(game)
+                audit_log("open", game, rounds = len(game["game-history"]["x"]))
+            return return_list(game_view(game))
     
-    if n_next_radio:
-        if all_selected:
-            return return_list(confirm_modal = True, selection = str(current))
-        else:
-            current[name] = radio_values
-            for val in current.values():
-                options[val]["disabled"] = True
-            while True:
-                if value in current.values():
-                    value += 1
-                else:
-                    break
-            return return_list(points_modal = True, radio_points = options, name = new_name, current = str(current), value = value)
+    if sync_trigger and game_id:
+        #also polls the changes of the other devices
+        events = [event for event in sync_queue or list() if event.get("game") == game_id]
+        try:
+            stored, version = store.games.get(game_id)
+        except KeyError:
+            version = None
+        if not events and version == int(game_version or 0):
+            raise PreventUpdate
+        game = parse_game(game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id, game_rules, game_version, game_timestamps)
+        return return_list(sync_view(game, events))
         
-    return return_list()
-    
-@app.callback(
-    [Output("support-me-modal", "is_open"),
-    Output("support-me-button", "n_clicks"),
-    Output("paypal-button", "n_clicks")],
-    [Input("support-me-button", "n_clicks"),
-    Input("paypal-button", "n_clicks")]
-)
-def open_support_me_modal(n_support_me, n_paypal):
-    def return_list(modal = False):
-        return [modal, 0, 0]
+    raise PreventUpdate
     
-    if n_support_me:
-        return return_list(modal = True)
-     
-    return return_list()
-
 @app.callback(
     [Output("download-modal", "is_open"),
      Output("download-href", "href"),
@@ -1456,31 +1804,27 @@ def open_support_me_modal(n_support_me, n_paypal):
      Output("download-button", "n_clicks")],
     [Input("save-game-button", "n_clicks"),
      Input("download-button", "n_clicks")],
-    [State("table-dict", "children"),
+    [State("game-players", "children"),
+    State("table-dict", "children"),
     State("game-history", "children"),
     State("points-development", "children"),
     State("handout-mistakes", "children"),
     State("beer-count", "children"),
-    State("goiß-count", "children")]
+    State("goiß-count", "children"),
+    State("game-id", "children"),
+    State("game-rules", "children"),
+    State("game-version", "children"),
+    State("game-timestamps", "children")]
 )
-def open_download_modal(n_save_game, n_download, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count):
+def open_download_modal(n_save_game, n_download, game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id, game_rules, game_version, game_timestamps):
     def return_list(modal = False, href = "/download/"):
         return[modal, href, 0, 0]
     
     if n_save_game:
-        download_json = {
-            "table-dict": table_dict,
-            "game-history": game_history,
-            "points-development": points_development,
-            "handout-mistakes": handout_mistakes,
-            "beer-count": beer_count,
-            "goiß-count": goiß_count
-        }
+        download_json = parse_game(game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id, game_rules, game_version, game_timestamps)
         timestamp = datetime.datetime.now().strftime(timestamp_format)
         file = f"{timestamp}_game_data.json"
-
-        for key in download_json:
-            download_json[key] = json.loads(download_json[key].replace("'", "\""))
+        archive.store_game(download_json)
 
         with open(f"./{file}", "w") as wd:
             wd.write(json.dumps(download_json, indent = 4))
@@ -1498,54 +1842,307 @@ def open_download_modal(n_save_game, n_download, table_dict, game_history, point
     
     return return_list()
 
+@app.callback(
+    [Output("report-modal", "is_open"),
+     Output("report-status", "children"),
+     Output("report-href", "href"),
+     Output("download-report-button", "disabled"),
+     Output("report-job", "children"),
+     Output("report-interval", "disabled"),
+     Output("export-report-button", "n_clicks")],
+    [Input("export-report-button", "n_clicks"),
+     Input("report-interval", "n_intervals")],
+    [State("report-job", "children"),
+    State("game-players", "children"),
+    State("table-dict", "children"),
+    State("game-history", "children"),
+    State("points-development", "children"),
+    State("handout-mistakes", "children"),
+    State("beer-count", "children"),
+    State("goiß-count", "children")]
+)
+def export_report(n_export_report, n_intervals, job_id, game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count):
+    def return_list(modal = True, status = "Rendering the report of your current game...", href = "/report/", job_id = "", polling = False):
+        return [modal, status, href, href == "/report/", job_id, not polling, 0]
+    
+    if n_export_report:
+        game = parse_game(game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count)
+        #the report is rendered by the report worker pool, this callback only polls for it
+        job_id = report.queue.submit(game)
+        return return_list(job_id = job_id, polling = True)
+    
+    if n_intervals and job_id:
+        status = report.queue.status(job_id)
+        if status == "done":
+            return return_list(status = "Your report is ready!", href = f"/report/{job_id}", job_id = job_id)
+        if status in ["failed", "unknown"]:
+            return return_list(status = "🙁 Rendering the report failed 🙁")
+        return return_list(job_id = job_id, polling = True)
+    
+    raise PreventUpdate
+
+#charts are sent downsampled, zooming fetches the visible window in more detail
+@app.callback(
+    Output("points-development-graph", "figure"),
+    [Input("points-development-graph", "relayoutData")],
+    [State("game-players", "children"),
+    State("points-development", "children")],
+    prevent_initial_call = True
+)
+def zoom_points_development(relayout_data, game_players, points_development):
+    x_range = zoom_range(relayout_data)
+    interned = load_parts(game_players, points_development)
+    points_development = scoring.extern_series(interned["players"], interned, "points-development")
+    if len(points_development["x"]) <= figures.point_budget:
+        raise PreventUpdate
+    return figures.points_development_figure(points_development, x_range = x_range)
+
+@app.callback(
+    Output("game-history-graph", "figure"),
+    [Input("game-history-graph", "relayoutData")],
+    [State("game-players", "children"),
+    State("table-dict", "children"),
+    State("game-history", "children")],
+    prevent_initial_call = True
+)
+def zoom_game_history(relayout_data, game_players, table_dict, game_history):
+    x_range = zoom_range(relayout_data)
+    interned = load_parts(game_players, table_dict, game_history)
+    table_dict = scoring.extern_table(interned["players"], interned)
+    game_history = scoring.extern_series(interned["players"], interned, "game-history")
+    if len(game_history["x"]) <= figures.point_budget:
+        raise PreventUpdate
+    return figures.game_history_figure(table_dict, game_history, x_range = x_range)
+
+@app.callback(
+    [Output("projection-output", "children"),
+     Output("projection-button", "n_clicks")],
+    [Input("projection-button", "n_clicks")],
+    [State("projection-rounds", "value"),
+    State("game-players", "children"),
+    State("table-dict", "children"),
+    State("game-rules", "children")],
+    prevent_initial_call = True
+)
+def project_standings(n_projection, rounds, game_players, table_dict, game_rules):
+    if not n_projection:
+        raise PreventUpdate
+    
+    game = {
+        "table-dict": scoring.extern_table(load_state(game_players), load_state(table_dict)),
+        "rules": json.loads(game_rules or "null")
+    }
+    result = projection.project(game, int(rounds or 0))
+    projected = [
+        html.H5(f"{row['player']}: {row['win-probability']:.1%} (≈ {row['mean-points']:.0f} points)")
+        for row in result["projection"]
+    ]
+    projected.append(html.P(f"{result['simulations']} simulated evenings"))
+    return [projected, 0]
+
+@app.callback(
+    Output("replay-output", "children"),
+    [Input("replay-slider", "value")],
+    [State("game-id", "children")],
+    prevent_initial_call = True
+)
+def replay_round(k, game_id):
+    #the slider sends every position while it is dragged, the rounds are served from the replay caches
+    if k is None or not game_id:
+        raise PreventUpdate
+    try:
+        game, version = store.games.get(game_id)
+    except KeyError:
+        raise PreventUpdate
+    return replay_content(*replay.round_view(replay.get_replay(game, version), game_id, version, k))
+
+@app.callback(
+    [Output("archive-results", "children"),
+     Output("archive-page", "data"),
+     Output("archive-previous", "n_clicks"),
+     Output("archive-next", "n_clicks")],
+    [Input("archive-search", "value"),
+     Input("archive-previous", "n_clicks"),
+     Input("archive-next", "n_clicks")],
+    [State("archive-page", "data")],
+    prevent_initial_call = True
+)
+def search_archive(search, n_previous, n_next, page):
+    #a new search starts on the first page
+    triggered = [trigger["prop_id"] for trigger in dash.callback_context.triggered]
+    page = page or 1
+    if "archive-previous.n_clicks" in triggered and n_previous:
+        page = max(page - 1, 1)
+    elif "archive-next.n_clicks" in triggered and n_next:
+        page += 1
+    else:
+        page = 1
+    players = [name for name in (search or "").split(",") if name.strip()]
+    result = archive.get_index().query(players = players, page = page)
+    if not result["games"] and page > 1:
+        #past the last page the results stay, only the clicks are reset
+        return [dash.no_update, dash.no_update, 0, 0]
+    return [archive_results(result), page, 0, 0]
+
 @app.callback(
     [Output("confirm-upload-modal", "is_open"),
      Output("invalid-json-modal", "is_open"),
      Output("file-name", "children"),
      Output("json-content", "children"),
      Output("confirm-invalid-json", "n_clicks"),
-     Output("upload-button", "children")],
+     Output("upload-button", "children"),
+     Output("invalid-json-message", "children")],
     [Input("upload-json", "filename"),
      Input("confirm-invalid-json", "n_clicks")],
     [State("upload-json", "contents")]
 )
 def upload_game(filename, n_confirm_invalid, content):
-    def return_list(start_game_modal = False, invalid_json_modal = False, filename = None, json_content = dict()):
-        return [start_game_modal, invalid_json_modal, filename, json_content, 0, upload_button()]
+    def return_list(start_game_modal = False, invalid_json_modal = False, filename = None, json_content = dict(), message = ""):
+        return [start_game_modal, invalid_json_modal, filename, json_content, 0, upload_button(), message]
     
     if n_confirm_invalid:
         return return_list()
     
     if filename:
+        #size limit, parse queue and timeout are handled by the upload queue (uploads.py)
         try:
-            content_type, content_string = content.split(",")
-            content_string = base64.b64decode(content_string).decode("utf-8")
-            content_dict = json.loads(content_string)
-            game_content(
-                content_dict["table-dict"],
-                content_dict["game-history"],
-                content_dict["points-development"],
-                content_dict["handout-mistakes"],
-                content_dict["beer-count"],
-                content_dict["goiß-count"]
-            )
-            return return_list(start_game_modal = True, filename= filename, json_content = content_string)
-        
-        except Exception as e:
-            return return_list(invalid_json_modal = True)
+            content_dict = uploads.queue.parse(content)
+        except uploads.UploadError as e:
+            return return_list(invalid_json_modal = True, message = str(e))
+        return return_list(start_game_modal = True, filename= filename, json_content = json.dumps(content_dict))
     
     raise PreventUpdate
 
-#navbar collapse callback
+########### Clientside callbacks
+app.clientside_callback(
+    ClientsideFunction("clientside", "add_results"),
+    [Output("points-radio-modal", "is_open"),
+    Output("select-points-radio", "options"),
+    Output("points-modal-header", "children"),
+    Output("current-radio", "children"),
+    Output("select-points-radio", "value"),
+    Output("confirm-selection-modal", "is_open"),
+    Output("current-selection", "children"),
+    Output("batch-round-error", "children")],
+    [Input("add-results-button", "n_clicks"),
+    Input("cancel-points-radio", "n_clicks"),
+    Input("next-points-radio", "n_clicks"),
+    Input("confirm-selection-button", "n_clicks"),
+    Input("confirm-batch-round", "n_clicks")],
+    [State("table-dict", "children"),
+    State("game-players", "children"),
+    State("select-points-radio", "value"),
+    State("current-radio", "children"),
+    State("points-modal-header", "children"),
+    State({"type": "batch-rank", "index": ALL}, "value")]
+)
+
+app.clientside_callback(
+    ClientsideFunction("clientside", "toggle"),
+    [Output("batch-round-collapse", "is_open")],
+    [Input("batch-round-button", "n_clicks")],
+    [State("batch-round-collapse", "is_open")]
+)
+
+for counter in ["handout-mistake", "beer-count", "goiß-count"]:
+    short = counter.split("-")[0]
+    app.clientside_callback(
+        ClientsideFunction("clientside", "counter_modal"),
+        [Output(f"{counter}-radio-modal", "is_open"),
+        Output(f"{counter}-radio", "options")],
+        [Input(f"{counter}-button", "n_clicks"),
+        Input(f"cancel-{short}-radio", "n_clicks"),
+        Input(f"ok-{short}-radio", "n_clicks")],
+        [State("game-players", "children")]
+    )
+
+app.clientside_callback(
+    ClientsideFunction("clientside", "confirm_modal"),
+    [Output("new-game-modal", "is_open")],
+    [Input("new-game-button", "n_clicks"),
+    Input("confirm-new-game-button", "n_clicks"),
+    Input("delice-new-game-button", "n_clicks")]
+)
+
+app.clientside_callback(
+    ClientsideFunction("clientside", "confirm_modal"),
+    [Output("support-me-modal", "is_open")],
+    [Input("support-me-button", "n_clicks"),
+    Input("paypal-button", "n_clicks")]
+)
+
+#the interval only asks for the version of the game, the page is synced once another device changed it
 @app.callback(
+    Output("server-version", "data"),
+    [Input("sync-interval", "n_intervals")],
+    [State("game-id", "children"),
+    State("game-version", "children")],
+    prevent_initial_call = True
+)
+def poll_version(n_intervals, game_id, game_version):
+    if not game_id:
+        raise PreventUpdate
+    try:
+        version = store.games.version(game_id)
+    except store.Unknown:
+        #the server lost the game (e.g. a restart without journal), the sync adds it again from the page
+        return None
+    if version == int(game_version or 0):
+        raise PreventUpdate
+    return version
+
+#offline mode: confirmed results go to the local queue first and are synced in batches,
+#syncing also picks up the changes other devices made to the same game
+app.clientside_callback(
+    ClientsideFunction("offline", "track"),
+    [Output("sync-queue", "data"),
+    Output("offline-game", "data"),
+    Output("points-table", "data")],
+    [Input("confirm-selection-button", "n_clicks"),
+    Input("ok-handout-radio", "n_clicks"),
+    Input("ok-beer-radio", "n_clicks"),
+    Input("ok-goiß-radio", "n_clicks"),
+    Input("game-version", "children")],
+    [State("current-selection", "children"),
+    State("handout-mistake-radio", "value"),
+    State("beer-count-radio", "value"),
+    State("goiß-count-radio", "value"),
+    State("sync-queue", "data"),
+    State("offline-game", "data"),
+    State("game-players", "children"),
+    State("table-dict", "children"),
+    State("game-history", "children"),
+    State("points-development", "children"),
+    State("handout-mistakes", "children"),
+    State("beer-count", "children"),
+    State("goiß-count", "children"),
+    State("game-id", "children"),
+    State("game-rules", "children"),
+    State("game-scoring", "children"),
+    State("synced-events", "children"),
+    State("game-timestamps", "children")]
+)
+
+app.clientside_callback(
+    ClientsideFunction("offline", "sync"),
+    [Output("sync-trigger", "data"),
+    Output("sync-status", "children"),
+    Output("restore-game-button", "style")],
+    [Input("sync-queue", "data"),
+    Input("sync-interval", "n_intervals"),
+    Input("server-version", "data"),
+    Input("game-version", "children")],
+    [State("game-id", "children"),
+    State("offline-game", "data")]
+)
+
+#navbar collapse callback
+app.clientside_callback(
+    ClientsideFunction("clientside", "toggle"),
     [Output("nav-collapse", "is_open")],
     [Input("nav-toggler", "n_clicks")],
     [State("nav-collapse", "is_open")]
 )
-def toggle_navbar_collapse(n_clicks, is_open):
-    if n_clicks:
-        return [not is_open]
-    return [is_open]
 
 ########### Run the app
 if __name__ == '__main__':
@@ -0,0 +1,305 @@
+import bisect
+import datetime
+import json
+import os
+import threading
+import unicodedata
+
+import container
+import scoring
+
+archive_dir = os.environ.get("ARCHIVE_DIR", "archive")
+archive_file = os.environ.get("ARCHIVE_FILE", "games.archive")
+index_file = "index.jsonl"
+results_per_page = 20
+max_results_per_page = 200
+counters = ["handout-mistakes", "beer-count", "goiß-count"]
+
+########### Game archive
+#saved games are appended to one container file (see container.py), saving a game again appends its new version.
+#the container holds them interned (scoring.intern_game), every read turns them back into game dicts.
+#loading a game reads it through the offset index of the container without touching the other games.
+#archives from before the container have one <game-id>.json per game, they are still read and pack() moves them over
+def game_path(game_id):
+    return os.path.join(archive_dir, f"{os.path.basename(game_id)}.json")
+
+games_file = container.ArchiveFile(os.path.join(archive_dir, archive_file))
+
+def store_game(game):
+    return store_games([game])
+
+def store_games(games):
+    current = games_file.append([scoring.intern_game(game) for game in games])
+    for game in games:
+        get_index().add(index_entry(game, current.saved(game["game-id"])))
+    return games_file.path
+
+def load_game(game_id):
+    current = games_file.current()
+    if current is not None and game_id in current:
+        return scoring.extern_game(current.get(game_id))
+    with open(game_path(game_id), encoding = "utf-8") as rd:
+        return json.load(rd)
+
+def game_files(directory = archive_dir):
+    #oldest first, so replaying the archive follows the order the games were played
+    try:
+        files = [os.path.join(directory, file) for file in os.listdir(directory) if file.endswith(".json")]
+    except FileNotFoundError:
+        return list()
+    return sorted(files, key = os.path.getmtime)
+
+def iter_games():
+    #the old single files first, then the container in the order the games were saved, every game once
+    current = games_file.current()
+    for path in game_files():
+        if current is not None and os.path.basename(path)[:-5] in current:
+            continue
+        try:
+            with open(path, encoding = "utf-8") as rd:
+                yield json.load(rd)
+        except (OSError, ValueError):
+            continue
+    if current is not None:
+        for game in current:
+            yield scoring.extern_game(game)
+
+def pack():
+    #moves the single game files into the container, in one append
+    games = list()
+    packed = list()
+    for path in game_files():
+        try:
+            with open(path, encoding = "utf-8") as rd:
+                game = json.load(rd)
+            game["game-id"] = os.path.basename(path)[:-5]
+        except (OSError, ValueError, TypeError):
+            continue
+        games.append(game)
+        packed.append(path)
+    if games:
+        store_games(games)
+    for path in packed:
+        os.remove(path)
+    return len(games)
+
+########### Index
+#one line per indexed game in <archive>/index.jsonl, the last line of a game id wins:
+#{"id": ..., "players": [...], "time": <start of the game>, "date": "YYYY-MM-DD", "player-count": n, "counters": [...], "rounds": n, "modified": <file mtime or time saved into the container>}
+#in memory every player name, player count and counter points to the set of its game ids, the times are kept sorted
+def normalize_name(name):
+    return " ".join(unicodedata.normalize("NFKC", str(name)).casefold().split())
+
+def index_entry(game, modified):
+    names = [key for key in game["table-dict"] if key != "Ranks"]
+    start = (game.get("timestamps") or dict()).get("start") or int(modified)
+    return {
+        "id": game["game-id"],
+        "players": names,
+        "time": start,
+        "date": datetime.date.fromtimestamp(start).isoformat(),
+        "player-count": len(names),
+        "counters": [counter for counter in counters if game.get(counter)],
+        "rounds": len(game["game-history"]["x"]),
+        "modified": modified
+    }
+
+def entry_keys(entry):
+    keys = [("player", normalize_name(name)) for name in entry["players"]]
+    keys.append(("player-count", entry["player-count"]))
+    keys.extend(("counter", counter) for counter in entry["counters"])
+    return keys
+
+def day_start(date):
+    return datetime.datetime.combine(datetime.date.fromisoformat(date), datetime.time()).timestamp()
+
+class Index:
+    def __init__(self, directory = archive_dir, games = games_file):
+        self.directory = directory
+        self.games = games
+        self.entries = dict()
+        self.postings = dict()
+        self.times = list()
+        self.lines = 0
+        self.loaded = False
+        self.scanned = None
+        self.lock = threading.RLock()
+
+    def path(self):
+        return os.path.join(self.directory, index_file)
+
+    def insert(self, entry):
+        self.remove(entry["id"])
+        self.entries[entry["id"]] = entry
+        for key in entry_keys(entry):
+            self.postings.setdefault(key, set()).add(entry["id"])
+        bisect.insort(self.times, (entry["time"], entry["id"]))
+
+    def remove(self, game_id):
+        entry = self.entries.pop(game_id, None)
+        if entry is None:
+            return
+        for key in entry_keys(entry):
+            self.postings[key].discard(game_id)
+        i = bisect.bisect_left(self.times, (entry["time"], game_id))
+        del self.times[i]
+
+    def add(self, entry):
+        #a saved game goes into the index file right away, other processes pick it up with their next scan
+        with self.lock:
+            self.insert(entry)
+            os.makedirs(self.directory, exist_ok = True)
+            with open(self.path(), "a", encoding = "utf-8") as wd:
+                wd.write(json.dumps(entry) + "\n")
+            self.lines += 1
+
+    def load(self):
+        try:
+            with open(self.path(), encoding = "utf-8") as rd:
+                for line in rd:
+                    try:
+                        self.insert(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self.lines += 1
+        except FileNotFoundError:
+            pass
+
+    def state(self):
+        #saving a single file changes the mtime of the archive directory, saving into the container its size
+        try:
+            modified = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            modified = None
+        try:
+            size = os.path.getsize(self.games.path)
+        except FileNotFoundError:
+            size = None
+        return modified, size
+
+    def scan(self):
+        #only games that are new or changed since they were indexed are opened, deleted ones are dropped
+        state = self.state()
+        try:
+            files = {entry.name[:-5]: entry.stat().st_mtime for entry in os.scandir(self.directory) if entry.name.endswith(".json")}
+        except FileNotFoundError:
+            files = dict()
+        try:
+            current = self.games.current()
+        except (OSError, ValueError, container.ContainerError):
+            current = None
+        saved = {game_id: current.saved(game_id) for game_id in current.games} if current is not None else dict()
+        new = list()
+        #a game that is in the container and still has its old file is read from the container, like load_game does
+        for game_id, mtime in {**files, **saved}.items():
+            entry = self.entries.get(game_id)
+            if entry is None or entry["modified"] < mtime:
+                try:
+                    if game_id in saved:
+                        game = scoring.extern_game(current.get(game_id))
+                    else:
+                        with open(os.path.join(self.directory, f"{game_id}.json"), encoding = "utf-8") as rd:
+                            game = json.load(rd)
+                    game["game-id"] = game_id
+                    new.append(index_entry(game, mtime))
+                except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                    continue
+        for game_id in [game_id for game_id in self.entries if game_id not in files and game_id not in saved]:
+            self.remove(game_id)
+        replaced = False
+        if new:
+            replaced = not os.path.exists(self.path())
+            for entry in new:
+                self.insert(entry)
+            with open(self.path(), "a", encoding = "utf-8") as wd:
+                wd.write("".join(json.dumps(entry) + "\n" for entry in new))
+            self.lines += len(new)
+        if self.lines > 2 * len(self.entries) + 100:
+            self.compact()
+            replaced = True
+        if replaced:
+            #creating or replacing the index file changed the directory itself
+            state = self.state()
+        self.scanned = state
+
+    def compact(self):
+        with open(f"{self.path()}.tmp", "w", encoding = "utf-8") as wd:
+            wd.write("".join(json.dumps(entry) + "\n" for entry in self.entries.values()))
+        os.replace(f"{self.path()}.tmp", self.path())
+        self.lines = len(self.entries)
+
+    def refresh(self):
+        #an unchanged directory and container need no scan
+        with self.lock:
+            state = self.state()
+            if not self.loaded:
+                self.load()
+                self.loaded = True
+            elif state == self.scanned:
+                return
+            self.scan()
+
+    def query(self, players = list(), date_from = None, date_to = None, player_count = None, counters = list(), page = 1, per_page = results_per_page):
+        #every condition has to match, dates are "YYYY-MM-DD" in local time and both ends are included.
+        #the newest games come first
+        self.refresh()
+        page = max(int(page), 1)
+        per_page = min(max(int(per_page), 1), max_results_per_page)
+        keys = [("player", normalize_name(name)) for name in players]
+        if player_count is not None:
+            keys.append(("player-count", int(player_count)))
+        keys.extend(("counter", counter) for counter in counters)
+        with self.lock:
+            low = day_start(date_from) if date_from else float("-inf")
+            high = day_start(date_to) + 86400 if date_to else float("inf")
+            start = bisect.bisect_left(self.times, (low, ""))
+            end = bisect.bisect_left(self.times, (high, ""))
+            if keys:
+                #the smallest set first, every intersection can only get smaller
+                sets = sorted((self.postings.get(key, set()) for key in keys), key = len)
+                matches = set(sets[0])
+                for ids in sets[1:]:
+                    matches &= ids
+                    if not matches:
+                        break
+                if date_from or date_to:
+                    matches = {game_id for game_id in matches if low <= self.entries[game_id]["time"] < high}
+                total = len(matches)
+                wanted = page * per_page
+                if total * 8 > end - start:
+                    #a common condition: walking the sorted times from the newest game finds a page sooner than sorting the matches
+                    ordered = list()
+                    for time, game_id in reversed(self.times[start:end]):
+                        if game_id in matches:
+                            ordered.append(game_id)
+                            if len(ordered) == wanted:
+                                break
+                else:
+                    ordered = sorted(matches, key = lambda game_id: (self.entries[game_id]["time"], game_id), reverse = True)
+                games = [self.entries[game_id] for game_id in ordered[wanted - per_page:wanted]]
+            else:
+                total = end - start
+                first = max(end - (page - 1) * per_page, start)
+                last = max(end - page * per_page, start)
+                games = [self.entries[game_id] for time, game_id in reversed(self.times[last:first])]
+        return {"total": total, "page": page, "per-page": per_page, "games": games}
+
+index = Index()
+
+def get_index():
+    #the index file is read on first use, the directory is scanned again whenever it changed
+    if not index.loaded:
+        index.refresh()
+    return index
+
+if __name__ == '__main__':
+    import sys
+    if sys.argv[1:] == ["pack"]:
+        print(f"{pack()} games moved into {games_file.path}")
+    elif sys.argv[1:] == ["compact"]:
+        before = os.path.getsize(games_file.path) if os.path.exists(games_file.path) else 0
+        games_file.compact()
+        after = os.path.getsize(games_file.path) if os.path.exists(games_file.path) else 0
+        print(f"{games_file.path} compacted from {before} to {after} bytes")
+    else:
+        print("usage: python archive.py pack|compact")
@@ -0,0 +1,224 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import re
+import urllib.parse
+
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+import api
+import application
+import report
+import store
+
+wsgi_threads = int(os.environ.get("ASGI_WSGI_THREADS", 32))
+cpu_workers = int(os.environ.get("ASGI_CPU_WORKERS", os.cpu_count() or 1))
+poll_timeout = float(os.environ.get("ASGI_POLL_TIMEOUT", 25))
+heartbeat = float(os.environ.get("ASGI_HEARTBEAT", 15))
+recheck = float(os.environ.get("ASGI_RECHECK", 2))
+chunk_size = 64 * 1024
+
+#async serving mode, run with an asgi server:  uvicorn asgi:server --port 8050
+#the dash app, the flask routes and the api are served by uvicorn's wsgi middleware from its thread pool, the endpoints below
+#/async/v1 are coroutines: a spectator or poller waiting for the next round costs a suspended coroutine
+#instead of a whole worker. cpu heavy work (reports) goes to a process pool.
+#games are read from the shared journal, so several processes can serve them. a commit in this process wakes
+#its waiters right away, the commits of other processes are noticed by reading the game again every few seconds.
+
+def flask_app(environ, start_response):
+    #uvicorn 0.13 passes the port as an int, werkzeug needs the string of the wsgi spec for requests without a host header.
+    #the middleware has buffered the whole body, so a chunked request gets its length too
+    environ["SERVER_PORT"] = str(environ["SERVER_PORT"])
+    environ.setdefault("CONTENT_LENGTH", str(len(environ["wsgi.input"].getbuffer())))
+    return application.server(environ, start_response)
+
+threads = concurrent.futures.ThreadPoolExecutor(max_workers = wsgi_threads)
+wsgi = WSGIMiddleware(flask_app, workers = wsgi_threads)
+processes = None
+loop = None
+waiters = dict()
+
+########### Change notifications
+def changed(game_id, version):
+    #called by the game store in whatever thread committed the change
+    if loop is not None:
+        loop.call_soon_threadsafe(wake, game_id)
+
+def wake(game_id):
+    for event in waiters.get(game_id, ()):
+        event.set()
+
+store.games.listeners.append(changed)
+
+def watch(game_id):
+    #one event per waiter, only for games that exist. it is cleared before the game is read, so a change in between is not missed
+    event = asyncio.Event()
+    waiters.setdefault(game_id, set()).add(event)
+    return event
+
+def unwatch(game_id, event):
+    #the game is forgotten with its last waiter
+    events = waiters.get(game_id)
+    if events is not None:
+        events.discard(event)
+        if not events:
+            del waiters[game_id]
+
+async def load(game_id):
+    #the store may have to recover the game from its journal, that happens in a thread
+    return await loop.run_in_executor(threads, store.games.get, game_id)
+
+async def wait(event, disconnect, timeout):
+    #True when the game changed, False on timeout, raises ConnectionError when the client went away
+    waiter = asyncio.ensure_future(event.wait())
+    done, pending = await asyncio.wait({waiter, disconnect}, timeout = timeout, return_when = asyncio.FIRST_COMPLETED)
+    waiter.cancel()
+    if disconnect in done:
+        raise ConnectionError("client disconnected")
+    return waiter in done
+
+########### Http
+async def disconnected(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+async def start(send, status, content_type, headers = list()):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode("latin-1"))] + [(key.encode("latin-1"), value.encode("latin-1")) for key, value in headers]
+    })
+
+async def respond(send, content, status = 200, headers = list()):
+    #plain json.dumps like the api, "Ranks" stays the first key of the table dict
+    await start(send, status, "application/json", headers)
+    await send({"type": "http.response.body", "body": json.dumps(content).encode("utf-8")})
+
+async def error(send, message, status = 400):
+    await respond(send, {"error": message}, status = status)
+
+def query(scope):
+    return dict(urllib.parse.parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+
+########### Async endpoints
+async def poll_game(scope, receive, send, game_id):
+    #long polling: GET /async/v1/games/<id>/poll?version=<known version> answers as soon as the game is newer
+    try:
+        known = int(query(scope).get("version", -1))
+        timeout = min(float(query(scope).get("timeout", poll_timeout)), poll_timeout)
+    except ValueError:
+        return await error(send, "'version' and 'timeout' have to be numbers")
+    try:
+        await load(game_id)
+    except store.Unknown:
+        return await error(send, f"Unknown game '{game_id}'", status = 404)
+    event = watch(game_id)
+    disconnect = asyncio.ensure_future(disconnected(receive))
+    try:
+        deadline = loop.time() + timeout
+        while True:
+            event.clear()
+            try:
+                game, version = await load(game_id)
+            except store.Unknown:
+                return await error(send, f"Unknown game '{game_id}'", status = 404)
+            if version > known:
+                return await respond(send, {"id": game_id, "version": version, "game": game}, headers = [("etag", f'"{game_id}-{version}"')])
+            if deadline <= loop.time():
+                await start(send, 304, "application/json", [("etag", f'"{game_id}-{version}"')])
+                return await send({"type": "http.response.body", "body": b""})
+            await wait(event, disconnect, min(deadline - loop.time(), recheck))
+    except ConnectionError:
+        pass
+    finally:
+        disconnect.cancel()
+        unwatch(game_id, event)
+
+async def stream_game(scope, receive, send, game_id):
+    #server sent events for spectators: the standings after every change, a comment line keeps idle connections open
+    try:
+        await load(game_id)
+    except store.Unknown:
+        return await error(send, f"Unknown game '{game_id}'", status = 404)
+    await start(send, 200, "text/event-stream", [("cache-control", "no-cache")])
+    event = watch(game_id)
+    disconnect = asyncio.ensure_future(disconnected(receive))
+    known = -1
+    sent = loop.time()
+    try:
+        while True:
+            event.clear()
+            game, version = await load(game_id)
+            if version > known:
+                known = version
+                data = json.dumps({"id": game_id, "version": version, "rounds": len(game["game-history"]["x"]), "standings": api.standings(game)})
+                await send({"type": "http.response.body", "body": f"id: {version}\nevent: standings\ndata: {data}\n\n".encode("utf-8"), "more_body": True})
+                sent = loop.time()
+            elif loop.time() - sent >= heartbeat:
+                await send({"type": "http.response.body", "body": b": heartbeat\n\n", "more_body": True})
+                sent = loop.time()
+            await wait(event, disconnect, min(heartbeat - (loop.time() - sent), recheck))
+    except store.Unknown:
+        #the game was pruned from the journal, the stream ends
+        await send({"type": "http.response.body", "body": b""})
+    except ConnectionError:
+        pass
+    finally:
+        disconnect.cancel()
+        unwatch(game_id, event)
+
+async def export_game(scope, receive, send, game_id):
+    #GET /async/v1/games/<id>/report renders the html report in the process pool and streams it
+    global processes
+    try:
+        game, version = await load(game_id)
+    except store.Unknown:
+        return await error(send, f"Unknown game '{game_id}'", status = 404)
+    if processes is None:
+        processes = concurrent.futures.ProcessPoolExecutor(max_workers = cpu_workers)
+    try:
+        page = await loop.run_in_executor(processes, report.render_report, game)
+    except Exception as e:
+        return await error(send, f"Rendering the report failed: {e}", status = 500)
+    page = page.encode("utf-8")
+    await start(send, 200, "text/html; charset=utf-8", [("content-disposition", 'attachment; filename="arschloch_stats_report.html"')])
+    for i in range(0, len(page), chunk_size):
+        await send({"type": "http.response.body", "body": page[i:i + chunk_size], "more_body": i + chunk_size < len(page)})
+
+routes = [
+    (re.compile(r"^/async/v1/games/([^/]+)/poll$"), poll_game),
+    (re.compile(r"^/async/v1/games/([^/]+)/stream$"), stream_game),
+    (re.compile(r"^/async/v1/games/([^/]+)/report$"), export_game)
+]
+
+########### Asgi app
+async def lifespan(receive, send):
+    global loop
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            loop = asyncio.get_running_loop()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            threads.shutdown(wait = False)
+            wsgi.executor.shutdown(wait = False)
+            if processes is not None:
+                processes.shutdown(wait = False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def server(scope, receive, send):
+    global loop
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    if scope["method"] == "GET":
+        for pattern, endpoint in routes:
+            match = pattern.match(scope["path"])
+            if match:
+                return await endpoint(scope, receive, send, match.group(1))
+    await wsgi(scope, receive, send)
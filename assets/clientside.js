@@ -0,0 +1,278 @@
+//clientside callbacks for the pure UI transitions, no server round-trip needed
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    clientside: {
+        //the hidden state divs hold json, offline snapshots from before hold python dict strings
+        parse: function(value) {
+            try {
+                return JSON.parse(value);
+            } catch (e) {
+                try {
+                    return JSON.parse(value.replace(/'/g, "\""));
+                } catch (e) {
+                    return {};
+                }
+            }
+        },
+
+        //the name table of the game (game-players), a player's id is their position in it
+        players: function(game_players) {
+            var names = window.dash_clientside.clientside.parse(game_players);
+            return Array.isArray(names) ? names : [];
+        },
+
+        triggered: function() {
+            var triggered = window.dash_clientside.callback_context.triggered;
+            if (!triggered.length || !triggered[0].value) {
+                return null;
+            }
+            return triggered[0].prop_id.split(".")[0];
+        },
+
+        add_results: function(n_add_results, n_cancel_radio, n_next_radio, n_confirm_selection, n_confirm_batch, table_dict, game_players, radio_value, current, name, batch_values) {
+            var clientside = window.dash_clientside.clientside;
+            var closed = [false, [], "name", "{}", 0, false, "{}", ""];
+            var trigger = clientside.triggered();
+
+            table_dict = clientside.parse(table_dict);
+            if (!table_dict.ranks) {
+                return closed;
+            }
+            var options = table_dict.ranks.slice(0, -1).map(function(rank, i) {
+                return {"label": rank, "value": i};
+            });
+            var names = clientside.players(game_players);
+            current = clientside.parse(current);
+
+            //the server reads current-selection on the same click, so it is left untouched
+            if (trigger === "confirm-selection-button") {
+                return [false, [], "name", "{}", 0, false, window.dash_clientside.no_update, ""];
+            }
+
+            if (trigger === "add-results-button") {
+                return [true, options, names[0], "{}", 0, false, "{}", ""];
+            }
+
+            //the batch form assigns all ranks at once, it has to be a permutation of the ranks
+            if (trigger === "confirm-batch-round") {
+                var assigned = batch_values.filter(function(value) {
+                    return value !== null && value !== undefined;
+                });
+                var unique = assigned.filter(function(value, i) {
+                    return assigned.indexOf(value) === i;
+                });
+                if (assigned.length !== names.length || unique.length !== names.length) {
+                    return [false, [], "name", "{}", 0, false, "{}", "Every rank has to be assigned exactly once!"];
+                }
+                var selection = {};
+                names.forEach(function(player, i) {
+                    selection[player] = batch_values[i];
+                });
+                return [false, [], "name", "{}", 0, true, JSON.stringify(selection), ""];
+            }
+
+            if (trigger === "next-points-radio") {
+                current[name] = radio_value;
+                var index = names.indexOf(name);
+                if (index === names.length - 1) {
+                    return [false, options, name, "{}", 0, true, JSON.stringify(current), ""];
+                }
+                var taken = Object.values(current);
+                taken.forEach(function(value) {
+                    options[value].disabled = true;
+                });
+                var value = 0;
+                while (taken.indexOf(value) !== -1) {
+                    value += 1;
+                }
+                return [true, options, names[index + 1], JSON.stringify(current), value, false, "{}", ""];
+            }
+
+            return closed;
+        },
+
+        //first input opens the modal with the players as options, every other input closes it
+        counter_modal: function(n_open, n_cancel, n_ok, game_players) {
+            var clientside = window.dash_clientside.clientside;
+            var context = window.dash_clientside.callback_context;
+            if (clientside.triggered() !== context.inputs_list[0].id) {
+                return [false, []];
+            }
+            var names = clientside.players(game_players);
+            var options = names.map(function(name, i) {
+                return {"label": name, "value": i};
+            });
+            return [true, options];
+        },
+
+        //first input opens the modal, every other input closes it
+        confirm_modal: function() {
+            var context = window.dash_clientside.callback_context;
+            return [window.dash_clientside.clientside.triggered() === context.inputs_list[0].id];
+        },
+
+        toggle: function(n_clicks, is_open) {
+            if (n_clicks) {
+                return [!is_open];
+            }
+            return [is_open];
+        }
+    },
+
+    //offline mode: results are applied to the local state right away and queued as events,
+    //the server applies every event id exactly once, so a queue can be synced as often as needed.
+    //rounds carry the number of rounds their device had seen, a round entered meanwhile on another device rejects them
+    offline: {
+        counters: {
+            "ok-handout-radio": "handout-mistakes",
+            "ok-beer-radio": "beer-count",
+            "ok-goiß-radio": "goiß-count"
+        },
+
+        //points table rows of the server state plus the queued events, with the points of the game's rules.
+        //table_dict is the interned table ({"ranks": [...], "table": [row of every player id]}), counters hold the counts by player id
+        reduce: function(table_dict, names, counters, scoring, events) {
+            var n_ranks = table_dict.ranks.length - 1;
+            var table = table_dict.table.map(function(row) {
+                return row.slice();
+            });
+            var counts = {};
+            Object.keys(counters).forEach(function(counter) {
+                counts[counter] = counters[counter].slice();
+            });
+
+            events.forEach(function(event) {
+                if (event.type === "round") {
+                    //ranks in player id order, queues from before hold them by name
+                    var ranks = Array.isArray(event.ranks) ? event.ranks : names.map(function(name) {
+                        return event.ranks[name];
+                    });
+                    if (ranks.length !== names.length) {
+                        return;
+                    }
+                    var valid = ranks.every(function(rank, i) {
+                        return rank >= 0 && rank < n_ranks && ranks.indexOf(rank) === i;
+                    });
+                    if (!valid) {
+                        return;
+                    }
+                    table.forEach(function(row, player) {
+                        row[ranks[player]] += 1;
+                        var points = 0;
+                        for (var rank = 0; rank < n_ranks; rank++) {
+                            points += row[rank] * scoring.points[rank];
+                        }
+                        Object.keys(counts).forEach(function(counter) {
+                            points += (scoring["counter-weights"][counter] || 0) * counts[counter][player];
+                        });
+                        row[n_ranks] = points;
+                    });
+                } else {
+                    //a player id, queues from before hold the name
+                    var player = typeof event.player === "number" ? event.player : names.indexOf(event.player);
+                    if (counts[event.type] && player >= 0 && player < names.length) {
+                        counts[event.type][player] += 1;
+                        table[player][n_ranks] += scoring["counter-weights"][event.type] || 0;
+                    }
+                }
+            });
+
+            return table_dict.ranks.map(function(rank, row) {
+                var cells = {"0": rank};
+                table.forEach(function(points, player) {
+                    cells[String(player + 1)] = points[row];
+                });
+                return cells;
+            });
+        },
+
+        track: function(n_confirm, n_handout, n_beer, n_goiß, version, selection, handout_value, beer_value, goiß_value, queue, offline_game, game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id, game_rules, game_scoring, synced_events, game_timestamps) {
+            var clientside = window.dash_clientside.clientside;
+            var offline = window.dash_clientside.offline;
+            var no_update = window.dash_clientside.no_update;
+            var trigger = clientside.triggered();
+
+            //without a game on the page the queue of the last game is kept for "Continue Last Game"
+            if (!game_id) {
+                return [no_update, no_update, no_update];
+            }
+
+            //events the server handled for this page, or that belong to another game, are dropped
+            var synced = clientside.parse(synced_events);
+            synced = Array.isArray(synced) ? synced : [];
+            queue = (queue || []).filter(function(event) {
+                return event.game === game_id && synced.indexOf(event.id) === -1;
+            });
+
+            var event = null;
+            var names = clientside.players(game_players);
+            var radio_values = {
+                "ok-handout-radio": handout_value,
+                "ok-beer-radio": beer_value,
+                "ok-goiß-radio": goiß_value
+            };
+            if (trigger === "confirm-selection-button") {
+                var ranks = clientside.parse(selection);
+                if (Object.keys(ranks).length) {
+                    //events refer to the players by id
+                    event = {"type": "round", "ranks": names.map(function(name) {
+                        return ranks[name];
+                    })};
+                }
+            } else if (trigger in offline.counters && names[radio_values[trigger]] !== undefined) {
+                event = {"type": offline.counters[trigger], "player": radio_values[trigger]};
+            }
+            if (event) {
+                var rounds = ((clientside.parse(game_history)["game-history"] || [])[0] || []).length;
+                event.game = game_id;
+                event.rounds = rounds + queue.filter(function(queued) {
+                    return queued.type === "round";
+                }).length;
+                event.time = Date.now();
+                event.id = game_id + "-" + event.time.toString(36) + "-" + Math.random().toString(36).slice(2, 10);
+                queue.push(event);
+            }
+
+            var counters = {};
+            [["handout-mistakes", handout_mistakes], ["beer-count", beer_count], ["goiß-count", goiß_count]].forEach(function(counter) {
+                var counts = clientside.parse(counter[1])[counter[0]];
+                if (Array.isArray(counts)) {
+                    counters[counter[0]] = counts;
+                }
+            });
+            var table = clientside.parse(table_dict);
+            var data = table.ranks ? offline.reduce(table, names, counters, clientside.parse(game_scoring), queue) : no_update;
+            var snapshot = [game_players, table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, game_id, game_rules, String(parseInt(version) || 0), game_timestamps];
+            return [queue, snapshot, data];
+        },
+
+        sync: function(queue, n_intervals, server_version, version, game_id, offline_game) {
+            var no_update = window.dash_clientside.no_update;
+            var context = window.dash_clientside.callback_context;
+            queue = queue || [];
+
+            if (!game_id) {
+                var status = queue.length ? queue.length + " results of your last game are not synced yet" : "";
+                return [no_update, status, offline_game ? {} : {"display": "none"}];
+            }
+
+            var pending = queue.filter(function(event) {
+                return event.game === game_id;
+            }).length;
+            if (!navigator.onLine) {
+                return [no_update, pending ? "📴 Offline, " + pending + " results waiting for sync" : "📴 Offline", no_update];
+            }
+            var status = pending ? "🔄 " + pending + " results waiting for sync" : "";
+            //a changed queue is sent right away and retried every interval while it isn't empty,
+            //otherwise the page is only synced once the polled server version differs from its own
+            var triggered = context.triggered.map(function(triggered) {
+                return triggered.prop_id;
+            });
+            var queued = pending && (triggered.indexOf("sync-queue.data") !== -1 || triggered.indexOf("sync-interval.n_intervals") !== -1);
+            var changed = triggered.indexOf("server-version.data") !== -1;
+            if (!queued && !changed) {
+                return [no_update, status, no_update];
+            }
+            return [Date.now(), status, no_update];
+        }
+    }
+});
@@ -0,0 +1,146 @@
+import atexit
+import datetime
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+audit_dir = os.environ.get("AUDIT_DIR", "audit")
+max_pending = int(os.environ.get("AUDIT_QUEUE", 10000))
+flush_interval = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1))
+max_bytes = int(os.environ.get("AUDIT_MAX_BYTES", 16 * 1024 * 1024))
+keep_files = int(os.environ.get("AUDIT_KEEP", 30))
+batch_size = 1000
+
+########### Audit log
+#every change of a game as one json line in <audit dir>/audit.log: {"time": ..., "action": ..., "game": ..., ...}.
+#the callbacks only put the record into a bounded queue, a background thread encodes and writes them in batches.
+#a full queue drops records instead of waiting, the next batch notes how many were lost.
+#a log over max_bytes is renamed to audit-<time>.log and gzipped at the following rotation, after every
+#process has moved on to the new file, only the newest keep_files old logs are kept
+class AuditLog:
+    def __init__(self, directory = audit_dir, pending = max_pending, interval = flush_interval, max_size = max_bytes, keep = keep_files):
+        self.directory = directory
+        self.interval = interval
+        self.max_size = max_size
+        self.keep = keep
+        self.records = queue.Queue(maxsize = pending)
+        self.dropped = 0
+        self.fd = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def path(self):
+        return os.path.join(self.directory, "audit.log")
+
+    def log(self, action, **fields):
+        #never blocks, the record is encoded in the writer thread
+        if self.thread is None:
+            self.start()
+        try:
+            self.records.put_nowait({"time": time.time(), "action": action, **fields})
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target = self.run, daemon = True)
+                self.thread.start()
+                atexit.register(self.flush)
+
+    def batch(self, timeout):
+        try:
+            records = [self.records.get(timeout = timeout)]
+        except queue.Empty:
+            return list()
+        while len(records) < batch_size:
+            try:
+                records.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+        return records
+
+    def write(self, records):
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            records.append({"time": time.time(), "action": "audit-dropped", "records": dropped})
+        if not records:
+            return
+        data = "".join(json.dumps(record, ensure_ascii = False) + "\n" for record in records).encode("utf-8")
+        with self.lock:
+            fd = self.open()
+            #one write per batch on an O_APPEND file, so the lines of several processes don't interleave
+            os.write(fd, data)
+            if os.fstat(fd).st_size > self.max_size:
+                self.rotate()
+
+    def open(self):
+        #another process may have rotated the log, then the new file is opened
+        if self.fd is not None:
+            try:
+                if os.stat(self.path()).st_ino == os.fstat(self.fd).st_ino:
+                    return self.fd
+            except FileNotFoundError:
+                pass
+            os.close(self.fd)
+        os.makedirs(self.directory, exist_ok = True)
+        self.fd = os.open(self.path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self.fd
+
+    def rotate(self):
+        rotated = os.path.join(self.directory, f"audit-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.log")
+        try:
+            os.rename(self.path(), rotated)
+        except FileNotFoundError:
+            return
+        os.close(self.fd)
+        self.fd = None
+        old = sorted(file for file in os.listdir(self.directory) if file.startswith("audit-"))
+        for file in old:
+            path = os.path.join(self.directory, file)
+            if file.endswith(".log") and path != rotated:
+                compress(path)
+        old = sorted(file for file in os.listdir(self.directory) if file.startswith("audit-") and file.endswith((".log", ".log.gz")))
+        for file in old[:max(len(old) - self.keep, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, file))
+            except FileNotFoundError:
+                pass
+
+    def flush(self):
+        #writes everything that is queued, used at exit
+        while True:
+            records = self.batch(0)
+            if not records:
+                break
+            self.write(records)
+        self.write(list())
+
+    def run(self):
+        while True:
+            records = self.batch(self.interval)
+            try:
+                self.write(records)
+            except OSError:
+                #a full or missing disk must not stop the writer, the records of this batch are counted as lost
+                self.dropped += len(records)
+                time.sleep(self.interval)
+
+def compress(path):
+    try:
+        with open(path, "rb") as rd, gzip.open(f"{path}.gz.tmp", "wb") as wd:
+            shutil.copyfileobj(rd, wd)
+        os.replace(f"{path}.gz.tmp", f"{path}.gz")
+        os.remove(path)
+    except FileNotFoundError:
+        #compressed by another process
+        pass
+
+audit = AuditLog()
+
+def log(action, **fields):
+    audit.log(action, **fields)
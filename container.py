@@ -0,0 +1,323 @@
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+magic = b"ARSCHAR1"
+footer_magic = b"ARSCHIDX"
+frame_header = struct.Struct(">cI")
+footer = struct.Struct(">Q8s")
+min_checkpoint = 64
+max_chain = 256
+min_compaction = 1024 * 1024
+
+########### Container format
+#an archive file holds many games: magic, then frames of one type byte, a 4 byte length and the payload.
+#"G" frames are the json of a game, every append ends with an "I" frame and the footer (offset of that "I" frame, footer magic).
+#games and index frames are only ever appended. an index frame lists the games of its append:
+#{"previous": <offset of the index frame before>, "full": false, "games": {"<game-id>": [offset, length, saved], ...}}
+#and when the deltas since the last full index frame got as long as half the archive or max_chain frames a full index
+#is written instead, so opening reads a bounded chain of frames.
+#offsets point at the game json itself, loading a game is one slice of the memory map.
+#once the superseded copies of games and full indexes outweigh the live games the file is rewritten with only those
+class ContainerError(Exception):
+    pass
+
+class Container:
+    def __init__(self, buffer, path = None):
+        self.buffer = buffer
+        self.path = path
+        self.games = dict()
+        self.footer = None
+        self.deltas = 0
+        self.chain = 0
+        #bytes of the current copies of the games
+        self.live = 0
+        self.end = len(buffer)
+        if len(buffer):
+            if bytes(buffer[:len(magic)]) != magic:
+                raise ContainerError("Not a game archive")
+            if bytes(buffer[-len(footer_magic):]) != footer_magic:
+                self.end = self.recover()
+            self.load_index()
+
+    ########### Reading
+    def frame(self, offset):
+        if not isinstance(offset, int) or not len(magic) <= offset <= self.end - frame_header.size:
+            raise ContainerError("Frame outside of the archive")
+        kind, length = frame_header.unpack_from(self.buffer, offset)
+        start = offset + frame_header.size
+        if start + length > self.end:
+            raise ContainerError("Truncated frame")
+        return kind, start, length
+
+    def recover(self):
+        #an interrupted append left frames without a footer behind them, the archive ends with the last complete append
+        end = None
+        position = len(magic)
+        while position + frame_header.size <= len(self.buffer):
+            kind, length = frame_header.unpack_from(self.buffer, position)
+            following = position + frame_header.size + length
+            if kind not in (b"G", b"I") or following > len(self.buffer):
+                break
+            if kind == b"I" and following + footer.size <= len(self.buffer) and footer.unpack_from(self.buffer, following) == (position, footer_magic):
+                following += footer.size
+                end = following
+            position = following
+        if end is None:
+            raise ContainerError("The archive has no complete index")
+        return end
+
+    def load_index(self, known = None):
+        #follows the chain of index frames back from the footer until a full index or the footer of an index read before
+        if self.end < len(magic) + footer.size:
+            raise ContainerError("Truncated archive")
+        offset, end_magic = footer.unpack_from(self.buffer, self.end - footer.size)
+        if end_magic != footer_magic:
+            raise ContainerError("The archive has no index")
+        chain = list()
+        position = offset
+        while position is not None and position != known:
+            kind, start, length = self.frame(position)
+            if kind != b"I":
+                raise ContainerError("Broken index chain")
+            index = self.index(start, length)
+            chain.append(index)
+            if index["full"]:
+                break
+            position = index["previous"]
+        if known is None or position != known:
+            #the chain ended in a full index, nothing read before is needed
+            self.games = dict()
+            self.deltas = 0
+            self.chain = 0
+            self.live = 0
+        for index in reversed(chain):
+            if index["full"]:
+                self.games = dict()
+                self.deltas = 0
+                self.chain = 0
+                self.live = 0
+            else:
+                self.deltas += len(index["games"])
+                self.chain += 1
+            for game_id, location in index["games"].items():
+                previous = self.games.pop(game_id, None)
+                if previous is not None:
+                    self.live -= frame_header.size + previous[1]
+                self.games[game_id] = location
+                self.live += frame_header.size + location[1]
+        self.footer = offset
+
+    def index(self, start, length):
+        #an uploaded archive can hold anything, a malformed index frame is a ContainerError like any other damage
+        try:
+            index = json.loads(bytes(self.buffer[start:start + length]))
+        except ValueError:
+            raise ContainerError("Unreadable index frame")
+        if not isinstance(index, dict) or not isinstance(index.get("full"), bool) or not isinstance(index.get("games"), dict):
+            raise ContainerError("Malformed index frame")
+        if not index["full"] and not isinstance(index.get("previous"), int):
+            raise ContainerError("Malformed index frame")
+        for location in index["games"].values():
+            if (
+                not isinstance(location, list) or len(location) != 3
+                or not all(isinstance(value, int) and value >= 0 for value in location[:2])
+                or not isinstance(location[2], (int, float))
+                or location[0] + location[1] > self.end
+            ):
+                raise ContainerError("Malformed index frame")
+        return index
+
+    def grown(self, buffer):
+        #the same archive after more appends, only the index frames written since are read
+        self.buffer = buffer
+        self.end = len(buffer)
+        if bytes(buffer[-len(footer_magic):]) != footer_magic:
+            self.end = self.recover()
+        self.load_index(self.footer)
+
+    def __contains__(self, game_id):
+        return game_id in self.games
+
+    def __len__(self):
+        return len(self.games)
+
+    def saved(self, game_id):
+        return self.games[game_id][2]
+
+    def get(self, game_id):
+        offset, length, saved = self.games[game_id]
+        return json.loads(bytes(self.buffer[offset:offset + length]))
+
+    def __iter__(self):
+        #lazily, in the order the games were last saved
+        for game_id in list(self.games):
+            yield self.get(game_id)
+
+########### Files
+def index_frames(games, end, previous = None):
+    #the index frame and footer of an append whose index frame starts at end
+    data = json.dumps({"previous": previous, "full": previous is None, "games": games}).encode("utf-8")
+    return frame_header.pack(b"I", len(data)) + data + footer.pack(end, footer_magic)
+
+def current_file(fd, path):
+    #a compaction replaces the file, whoever locked the old one has to open the new one
+    try:
+        return os.stat(path).st_ino == os.fstat(fd).st_ino
+    except FileNotFoundError:
+        return False
+
+class ArchiveFile:
+    #a container on disk, shared by several processes: appends and compactions hold an exclusive lock on the file,
+    #readers map it again under a shared lock whenever it changed, so they never see half an append
+    def __init__(self, path):
+        self.path = path
+        self.container = None
+        self.size = None
+        self.inode = None
+        self.lock = threading.Lock()
+
+    def open(self, locked = None):
+        #call with self.lock held, returns the current container or None for a missing or empty file.
+        #locked is the file of an append that already holds the exclusive lock
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self.container = None
+            self.size = None
+            return None
+        if locked is None and (stat.st_size, stat.st_ino) == (self.size, self.inode):
+            return self.container
+        try:
+            rd = locked if locked is not None else open(self.path, "rb")
+        except FileNotFoundError:
+            self.container = None
+            self.size = None
+            return None
+        try:
+            if locked is None:
+                fcntl.flock(rd.fileno(), fcntl.LOCK_SH)
+            stat = os.fstat(rd.fileno())
+            if (stat.st_size, stat.st_ino) != (self.size, self.inode):
+                if not stat.st_size:
+                    self.container = None
+                else:
+                    buffer = mmap.mmap(rd.fileno(), 0, access = mmap.ACCESS_READ)
+                    if self.container is not None and stat.st_ino == self.inode and stat.st_size > self.size:
+                        self.container.grown(buffer)
+                    else:
+                        self.container = Container(buffer, self.path)
+                self.inode = stat.st_ino
+                self.size = stat.st_size
+        finally:
+            if locked is None:
+                fcntl.flock(rd.fileno(), fcntl.LOCK_UN)
+                rd.close()
+        return self.container
+
+    def current(self):
+        with self.lock:
+            return self.open()
+
+    def get(self, game_id):
+        container = self.current()
+        if container is None or game_id not in container:
+            raise KeyError(game_id)
+        return container.get(game_id)
+
+    def append(self, games):
+        #games are written in one append, a game id saved before points to its new copy afterwards
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok = True)
+            while True:
+                with open(self.path, "ab+") as wd:
+                    fcntl.flock(wd.fileno(), fcntl.LOCK_EX)
+                    try:
+                        if not current_file(wd.fileno(), self.path):
+                            continue
+                        container = self.write(wd, games)
+                        if self.size - container.live > max(min_compaction, container.live):
+                            self.rewrite(container)
+                    finally:
+                        fcntl.flock(wd.fileno(), fcntl.LOCK_UN)
+                return self.open()
+
+    def write(self, wd, games):
+        #call with the exclusive lock on wd held
+        try:
+            container = self.open(wd)
+        except ContainerError:
+            wd.seek(0)
+            if wd.read(len(magic)) != magic:
+                raise
+            #the very first append was interrupted, there is nothing to keep
+            wd.truncate(0)
+            container = self.open(wd)
+        if container is not None and container.end < self.size:
+            #cuts off what an interrupted append left, nobody reads past the last footer
+            wd.truncate(container.end)
+        wd.seek(0, os.SEEK_END)
+        end = wd.tell()
+        frames = list()
+        if container is None:
+            frames.append(magic)
+            end = len(magic)
+        saved = time.time()
+        written = dict()
+        for game in games:
+            data = json.dumps(game).encode("utf-8")
+            frames.append(frame_header.pack(b"G", len(data)) + data)
+            written[game["game-id"]] = [end + frame_header.size, len(data), saved]
+            end += frame_header.size + len(data)
+        if container is None or container.chain >= max_chain or container.deltas + len(written) >= max(min_checkpoint, len(container) // 2):
+            live = dict(container.games) if container is not None else dict()
+            live.update(written)
+            frames.append(index_frames(live, end))
+        else:
+            frames.append(index_frames(written, end, container.footer))
+        wd.write(b"".join(frames))
+        wd.flush()
+        return self.open(wd)
+
+    def rewrite(self, container):
+        #compaction: a new file with the live games only replaces the old one, readers still holding the old one keep reading it
+        end = len(magic)
+        live = dict()
+        with open(f"{self.path}.tmp", "wb") as wd:
+            wd.write(magic)
+            for game_id, (offset, length, saved) in container.games.items():
+                wd.write(frame_header.pack(b"G", length))
+                wd.write(container.buffer[offset:offset + length])
+                live[game_id] = [end + frame_header.size, length, saved]
+                end += frame_header.size + length
+            wd.write(index_frames(live, end))
+            wd.flush()
+            os.fsync(wd.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def compact(self):
+        #rewrites the file right away, appends do it by themselves once most of the file is superseded
+        with self.lock:
+            if not os.path.exists(self.path):
+                return None
+            with open(self.path, "rb") as wd:
+                fcntl.flock(wd.fileno(), fcntl.LOCK_EX)
+                try:
+                    if current_file(wd.fileno(), self.path):
+                        container = self.open(wd)
+                        if container is not None:
+                            self.rewrite(container)
+                finally:
+                    fcntl.flock(wd.fileno(), fcntl.LOCK_UN)
+            return self.open()
+
+def open_bytes(data):
+    #a container that was uploaded, read from memory
+    return Container(memoryview(data))
+
+def is_container(data):
+    return bytes(data[:len(magic)]) == magic
@@ -0,0 +1,283 @@
+import os
+
+import plotly.graph_objs as go
+
+import scoring
+
+point_budget = int(os.environ.get("CHART_POINT_BUDGET", 500))
+webgl_threshold = int(os.environ.get("WEBGL_POINT_THRESHOLD", 1000))
+
+########### Downsampling
+def lttb(x, y, threshold):
+    #largest triangle three buckets: keeps the first and last point and from every bucket
+    #the point spanning the largest triangle with the previous pick and the next bucket's mean
+    if threshold >= len(x) or threshold < 3:
+        return list(x), list(y)
+    sampled_x = [x[0]]
+    sampled_y = [y[0]]
+    bucket_size = (len(x) - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_start = end
+        next_end = min(int((i + 2) * bucket_size) + 1, len(x))
+        if next_start >= next_end:
+            next_start, next_end = len(x) - 1, len(x)
+        mean_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        mean_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        best_area = -1
+        best = start
+        for j in range(start, end):
+            area = abs((x[a] - mean_x) * (y[j] - y[a]) - (x[a] - x[j]) * (mean_y - y[a]))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled_x.append(x[best])
+        sampled_y.append(y[best])
+        a = best
+    sampled_x.append(x[-1])
+    sampled_y.append(y[-1])
+    return sampled_x, sampled_y
+
+def downsample(x, y, budget = point_budget, x_range = None):
+    #a zoomed chart only needs the visible window plus one point on each side
+    if x_range is not None:
+        start = 0
+        while start < len(x) - 1 and x[start + 1] < x_range[0]:
+            start += 1
+        end = len(x)
+        while end > start + 1 and x[end - 2] > x_range[1]:
+            end -= 1
+        x = x[start:end]
+        y = y[start:end]
+    if budget and len(x) > budget:
+        return lttb(x, y, budget)
+    return x, y
+
+########### Traces
+def scatter_traces(traces, **kwargs):
+    #above the threshold the browser draws the lines with WebGL instead of SVG, styling and axes stay the same
+    if sum(len(x) for name, x, y in traces) > webgl_threshold:
+        scatter = go.Scattergl
+    else:
+        scatter = go.Scatter
+    return [scatter(x = x, y = y, name = name, **kwargs) for name, x, y in traces]
+
+########### Figures
+def game_history_figure(table_dict, game_history, budget = point_budget, x_range = None):
+    game_history_data = list()
+    game_tick_text = table_dict["Ranks"][:-1]
+    game_tick_text.reverse()
+    if x_range is not None:
+        game_x_range = x_range
+    elif len(game_history["x"]) > 6:
+        game_x_range = [len(game_history["x"]) - 6, len(game_history["x"]) + 0.5]
+    else:
+        game_x_range = [0.5,6.5]
+    for name in scoring.table_names(table_dict):
+        #the first render of a history longer than the budget shows the last rounds, like a zoom it only needs them
+        #at full resolution. shorter histories have no zoom callback (neither have reports), every round is kept
+        window = game_x_range if budget and len(game_history["x"]) > budget else x_range
+        x, y = downsample(game_history["x"], game_history[name], budget, window)
+        game_history_data.append((name, x, y))
+    game_history_fig = go.Figure(data = scatter_traces(game_history_data, mode = "lines"))
+    game_history_fig.update_layout(
+        yaxis = dict(
+            tickmode = "array",
+            tickvals = list(range(len(table_dict["Ranks"][:-1]))),
+            ticktext = game_tick_text
+        ),
+        xaxis = dict(
+            title = "Game"
+        ),
+        xaxis_range = game_x_range
+    )
+    return game_history_fig
+
+def points_development_figure(points_development, budget = point_budget, x_range = None):
+    points_development_data = list()
+    max_points = 0
+    min_points = 0
+    for name in [key for key in points_development if key != "x"]:
+        if max(points_development[name]) > max_points:
+            max_points = max(points_development[name])
+        if min(points_development[name]) < min_points:
+            min_points = min(points_development[name])
+        x, y = downsample(points_development["x"], points_development[name], budget, x_range)
+        points_development_data.append((name, x, y))
+    if x_range is not None:
+        points_x_range = x_range
+    elif len(points_development["x"]) >= 6:
+        points_x_range = None
+    else:
+        points_x_range = [-0.5,6.5]
+    if max_points >= 6:
+        points_y_range = None
+    else:
+        points_y_range = [min_points-0.5,6.5]
+    points_development_fig = go.Figure(data = scatter_traces(points_development_data))
+    points_development_fig.update_layout(
+        yaxis = dict(
+            title = "Points"
+        ),
+        xaxis = dict(
+            title = "Game"
+        ),
+        yaxis_range = points_y_range,
+        xaxis_range = points_x_range
+    )
+    return points_development_fig
+
+def rank_accumulation_figure(table_dict):
+    x_text = table_dict["Ranks"][:-1]
+    x_vals = list(range(len(x_text)))
+    rank_accumulation_data = list()
+    max_ranks = 0
+    for name in scoring.table_names(table_dict):
+        if max(table_dict[name][:-1]) > max_ranks:
+            max_ranks = max(table_dict[name][:-1])
+        rank_accumulation_data.append(go.Bar(x = x_vals, y = table_dict[name][:-1], name = name))
+    rank_accumulation_fig = go.Figure(data = rank_accumulation_data)
+    if max_ranks >= 5:
+        ranks_y_range = None
+    else:
+        ranks_y_range = [-0.5,5]
+    rank_accumulation_fig.update_layout(
+        yaxis = dict(
+            title = "Rank Amount"
+        ),
+        xaxis = dict(
+            tickmode = "array",
+            tickvals = x_vals,
+            ticktext = x_text
+        ),
+        yaxis_range = ranks_y_range
+    )
+    return rank_accumulation_fig
+
+def counter_figure(counter):
+    if not counter:
+        return go.Figure()
+    if max(counter.values()) >= 5:
+        y_range = None
+    else:
+        y_range = [-0.5,5]
+    bar_widths = [0.35 for val in counter.values()]
+    counter_y = list(counter.values())
+    counter_data = [
+        go.Bar(
+            x = list(
+                counter.keys()
+            ),
+            y = counter_y,
+            width = bar_widths,
+            text = counter_y,
+            textposition="auto",
+            marker_color = "#007BFF",
+            textfont = dict(color = "rgb(255, 255, 255)")
+        )
+    ]
+    counter_fig = go.Figure(data = counter_data)
+    counter_fig.update_layout(
+        yaxis_range = y_range
+    )
+    return counter_fig
+
+def head_to_head_figure(names, wins, margin):
+    #cell (row, column) is the share of their rounds the row player finished above the column player
+    share = [
+        [wins[i][j] / (wins[i][j] + wins[j][i]) if i != j and wins[i][j] + wins[j][i] else None for j in range(len(names))]
+        for i in range(len(names))
+    ]
+    text = [
+        [f"{wins[i][j]}:{wins[j][i]} (+{margin[i][j]})" if i != j else "" for j in range(len(names))]
+        for i in range(len(names))
+    ]
+    head_to_head_fig = go.Figure(data = [
+        go.Heatmap(
+            x = names,
+            y = names,
+            z = share,
+            text = text,
+            zmin = 0,
+            zmax = 1,
+            colorscale = "RdBu",
+            hovertemplate = "%{y} above %{x}: %{text}<extra></extra>"
+        )
+    ])
+    head_to_head_fig.update_layout(
+        yaxis = dict(
+            autorange = "reversed"
+        )
+    )
+    return head_to_head_fig
+
+def transition_figure(ranks, counts):
+    #cell (row, column) is the share of the rounds after rank row in which the player got rank column
+    probabilities = [[count / sum(row) if sum(row) else None for count in row] for row in counts]
+    transition_fig = go.Figure(data = [
+        go.Heatmap(
+            x = ranks,
+            y = ranks,
+            z = probabilities,
+            text = counts,
+            zmin = 0,
+            zmax = 1,
+            colorscale = "Blues",
+            hovertemplate = "%{y} → %{x}: %{text} times<extra></extra>"
+        )
+    ])
+    transition_fig.update_layout(
+        xaxis = dict(
+            title = "Next Round"
+        ),
+        yaxis = dict(
+            title = "Round",
+            autorange = "reversed"
+        )
+    )
+    return transition_fig
+
+def pace_figure(rounds, durations, rolling_pace):
+    #minutes per round as bars, the rounds per hour over the last rounds as a line on a second axis
+    pace_fig = go.Figure(data = [
+        go.Bar(
+            x = rounds,
+            y = [duration / 60 for duration in durations],
+            name = "Minutes",
+            marker_color = "#007BFF"
+        ),
+        go.Scatter(
+            x = rounds,
+            y = rolling_pace,
+            name = "Rounds per Hour",
+            mode = "lines",
+            yaxis = "y2"
+        )
+    ])
+    pace_fig.update_layout(
+        xaxis = dict(
+            title = "Round"
+        ),
+        yaxis = dict(
+            title = "Minutes"
+        ),
+        yaxis2 = dict(
+            title = "Rounds per Hour",
+            overlaying = "y",
+            side = "right",
+            rangemode = "tozero"
+        )
+    )
+    return pace_fig
+
+def game_figures(table_dict, game_history, points_development, handout_mistakes, beer_count, goiß_count, budget = point_budget):
+    return {
+        "points-development": points_development_figure(points_development, budget),
+        "game-history": game_history_figure(table_dict, game_history, budget),
+        "rank-accumulation": rank_accumulation_figure(table_dict),
+        "handout-mistakes": counter_figure(handout_mistakes),
+        "beer-count": counter_figure(beer_count),
+        "goiß-count": counter_figure(goiß_count)
+    }
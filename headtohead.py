@@ -0,0 +1,125 @@
+import operator
+import threading
+
+import aggregates
+
+########### Matrices
+#wins[i][j] counts the rounds player i finished above player j, margin[i][j] sums the rank levels
+#between them in those rounds. the game history stores every player's rank level per round with
+#the König as the highest value, so comparisons work on whole player columns at once.
+class HeadToHead:
+    def __init__(self, names):
+        self.names = list(names)
+        n = len(self.names)
+        self.wins = [[0] * n for i in range(n)]
+        self.margin = [[0] * n for i in range(n)]
+        self.rounds = 0
+
+    def add_rounds(self, columns):
+        #columns: the rank levels of every player over the new rounds, one list per player
+        n = len(self.names)
+        for i in range(n):
+            for j in range(i + 1, n):
+                differences = list(map(operator.sub, columns[i], columns[j]))
+                above = sum(map((0).__lt__, differences))
+                below = sum(map((0).__gt__, differences))
+                self.wins[i][j] += above
+                self.wins[j][i] += below
+                self.margin[i][j] += sum(difference for difference in differences if difference > 0)
+                self.margin[j][i] -= sum(difference for difference in differences if difference < 0)
+        self.rounds += len(columns[0]) if columns else 0
+
+    def add_round(self, levels):
+        self.add_rounds([[level] for level in levels])
+
+    def share(self, i, j):
+        #the share of their rounds player i finished above player j
+        played = self.wins[i][j] + self.wins[j][i]
+        return self.wins[i][j] / played if played else None
+
+    def table(self):
+        return {
+            "players": self.names,
+            "rounds": self.rounds,
+            "wins": self.wins,
+            "margin": self.margin
+        }
+
+########### Games
+def game_matrix(game_history, game_id = ""):
+    return cache.get(game_history, game_id, HeadToHead)
+
+def copy_matrix(matrix):
+    copy = HeadToHead(matrix.names)
+    copy.wins = [list(row) for row in matrix.wins]
+    copy.margin = [list(row) for row in matrix.margin]
+    copy.rounds = matrix.rounds
+    return copy
+
+cache = aggregates.GameCache(copy_matrix)
+
+########### Archive
+#players are matched by name across games, a pair only counts the rounds both of them played
+class Totals:
+    def __init__(self):
+        self.wins = dict()
+        self.margin = dict()
+        self.rounds = 0
+        self.lock = threading.Lock()
+
+    def update(self, matrix):
+        with self.lock:
+            add_matrix(self.wins, self.margin, matrix)
+            self.rounds += matrix.rounds
+
+    def recompute(self, games):
+        #built aside and swapped in like the ratings
+        wins = dict()
+        margin = dict()
+        rounds = 0
+        for game in games:
+            try:
+                names, columns = aggregates.game_columns(game["game-history"])
+            except (KeyError, TypeError, AttributeError):
+                continue
+            matrix = HeadToHead(names)
+            matrix.add_rounds(columns)
+            add_matrix(wins, margin, matrix)
+            rounds += matrix.rounds
+        with self.lock:
+            self.wins = wins
+            self.margin = margin
+            self.rounds = rounds
+
+    def matrix(self, names = None):
+        with self.lock:
+            if names is None:
+                names = sorted({a for a, b in self.wins} | {b for a, b in self.wins})
+            matrix = HeadToHead(names)
+            matrix.rounds = self.rounds
+            for i, a in enumerate(names):
+                for j, b in enumerate(names):
+                    matrix.wins[i][j] = self.wins.get((a, b), 0)
+                    matrix.margin[i][j] = self.margin.get((a, b), 0)
+        return matrix
+
+def add_matrix(wins, margin, matrix):
+    for i, a in enumerate(matrix.names):
+        for j, b in enumerate(matrix.names):
+            if i != j:
+                wins[a, b] = wins.get((a, b), 0) + matrix.wins[i][j]
+                margin[a, b] = margin.get((a, b), 0) + matrix.margin[i][j]
+
+totals = aggregates.ArchiveTotals(Totals())
+
+def get_totals():
+    return totals.get()
+
+def update_events(game, events):
+    #the applied rounds are the last ones of the game history, they are added without reading the rest of it
+    rounds = sum(event["type"] == "round" for event in events)
+    if rounds:
+        names, columns = aggregates.game_columns(game["game-history"], len(game["game-history"]["x"]) - rounds)
+        matrix = HeadToHead(names)
+        matrix.add_rounds(columns)
+        get_totals().update(matrix)
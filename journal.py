@@ -0,0 +1,284 @@
+import atexit
+import collections
+import contextlib
+import copy
+import fcntl
+import json
+import os
+import threading
+import time
+
+import scoring
+
+journal_dir = os.environ.get("JOURNAL_DIR", "journal")
+sync_interval = float(os.environ.get("JOURNAL_SYNC_INTERVAL", 0.5))
+compact_every = int(os.environ.get("JOURNAL_COMPACT_EVERY", 500))
+max_age = float(os.environ.get("JOURNAL_MAX_AGE_DAYS", 90)) * 24 * 3600
+prune_interval = 3600
+max_open_logs = 256
+
+########### Files
+#every game has a snapshot <game-id>.json and a journal <game-id>.log with one json line per event after it:
+#{"version": <version after the event>, "event": {...}}
+#a compacted journal starts with the ids of the events before its snapshot, so resent events are still recognized:
+#{"seen": [<event id>, ...]}
+#the journal is the shared state of a game: every process changes a game only while it holds the flock of
+#<game-id>.lock, after reading what the other processes appended since it last looked (see store.py)
+def snapshot_path(game_id, directory = journal_dir):
+    return os.path.join(directory, f"{os.path.basename(game_id)}.json")
+
+def log_path(game_id, directory = journal_dir):
+    return os.path.join(directory, f"{os.path.basename(game_id)}.log")
+
+def lock_path(game_id, directory = journal_dir):
+    return os.path.join(directory, f"{os.path.basename(game_id)}.lock")
+
+def write_snapshot(game, directory = journal_dir):
+    path = snapshot_path(game["game-id"], directory)
+    with open(f"{path}.tmp", "w", encoding = "utf-8") as wd:
+        wd.write(json.dumps(game))
+        wd.flush()
+        os.fsync(wd.fileno())
+    os.replace(f"{path}.tmp", path)
+
+def new_log(game_id, directory = journal_dir, seen = list()):
+    #a compacted journal is a new file, processes still holding the old one notice the changed inode.
+    #returns its inode and size
+    path = log_path(game_id, directory)
+    with open(f"{path}.tmp", "w", encoding = "utf-8") as wd:
+        if seen:
+            wd.write(json.dumps({"seen": list(seen)}) + "\n")
+            wd.flush()
+            os.fsync(wd.fileno())
+        stat = os.fstat(wd.fileno())
+    os.replace(f"{path}.tmp", path)
+    return stat.st_ino, stat.st_size
+
+class Position:
+    #how far a process has read a journal: the file (inode), the bytes read and the version of the snapshot
+    def __init__(self, inode, offset, base):
+        self.inode = inode
+        self.offset = offset
+        self.base = base
+
+def read(game_id, game = None, position = None, directory = journal_dir):
+    #the lines appended since position applied to game, returns (game, position, event ids, reset).
+    #without a game or after the journal was replaced it starts again from the snapshot (reset), None for an unknown game.
+    #only complete lines are read, a line torn by a crash is skipped
+    try:
+        rd = open(log_path(game_id, directory), "rb")
+    except FileNotFoundError:
+        rd = None
+    with rd if rd is not None else contextlib.nullcontext():
+        inode = os.fstat(rd.fileno()).st_ino if rd is not None else None
+        reset = game is None or position is None or position.inode != inode
+        if reset:
+            try:
+                with open(snapshot_path(game_id, directory), encoding = "utf-8") as snapshot:
+                    game = json.load(snapshot)
+            except (OSError, ValueError):
+                return None, None, list(), True
+            position = Position(inode, 0, game.get("version", 0))
+        data = b""
+        if rd is not None:
+            rd.seek(position.offset)
+            data = rd.read()
+    data = data[:data.rfind(b"\n") + 1]
+    ids = list()
+    copied = reset
+    for line in data.splitlines():
+        try:
+            entry = json.loads(line)
+            if isinstance(entry.get("seen"), list):
+                ids.extend(entry["seen"])
+                continue
+            version = entry["version"]
+            event = entry["event"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            continue
+        if isinstance(event, dict) and event.get("id") is not None:
+            ids.append(event["id"])
+        if version <= game.get("version", 0):
+            continue
+        if not copied:
+            #the game of the store is never changed in place
+            game = copy.deepcopy(game)
+            copied = True
+        scoring.apply_event(game, event)
+        game["version"] = version
+    return game, Position(position.inode, position.offset + len(data), position.base), ids, reset
+
+def replay(game_id, directory = journal_dir):
+    #the snapshot plus every journal line after its version
+    return read(game_id, directory = directory)[0]
+
+########### Journal
+#appends are written and flushed to the os right away, the fsync of all changed journals is done in
+#batches by a background thread, so a confirmed round costs one short line instead of a full save file
+class Journal:
+    def __init__(self, directory = journal_dir, interval = sync_interval, compact = compact_every, max_open = max_open_logs):
+        self.directory = directory
+        self.interval = interval
+        self.compact = compact
+        self.max_open = max_open
+        #journals of the recently changed games stay open, the least recently changed one is closed first
+        self.logs = collections.OrderedDict()
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target = self.run, daemon = True)
+                    self.thread.start()
+                    atexit.register(self.sync)
+
+    @contextlib.contextmanager
+    def locked(self, game_id):
+        #the flock of a game, held by every process while it changes the game.
+        #a lock file removed by prune while waiting for it is no lock anymore, it is taken again on the new file
+        os.makedirs(self.directory, exist_ok = True)
+        path = lock_path(game_id, self.directory)
+        while True:
+            with open(path, "a") as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                try:
+                    try:
+                        current = os.stat(path).st_ino == os.fstat(lock.fileno()).st_ino
+                    except FileNotFoundError:
+                        current = False
+                    if current:
+                        yield
+                        return
+                finally:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def create(self, game):
+        #a new game starts with its snapshot and an empty journal, None when the id is taken
+        game_id = game["game-id"]
+        with self.locked(game_id):
+            if os.path.exists(snapshot_path(game_id, self.directory)):
+                return None
+            write_snapshot(game, self.directory)
+            inode, size = new_log(game_id, self.directory)
+        with self.lock:
+            self.close(game_id)
+        return Position(inode, size, game.get("version", 0))
+
+    def read(self, game_id, game = None, position = None):
+        return read(game_id, game, position, self.directory)
+
+    def close(self, game_id):
+        log = self.logs.pop(game_id, None)
+        if log is not None:
+            if game_id in self.dirty:
+                os.fsync(log.fileno())
+                self.dirty.discard(game_id)
+            log.close()
+
+    def open(self, game_id):
+        #call with self.lock held, the open journal is replaced when another process compacted it
+        path = log_path(game_id, self.directory)
+        log = self.logs.get(game_id)
+        try:
+            current = os.stat(path).st_ino
+        except FileNotFoundError:
+            current = None
+        if log is not None and os.fstat(log.fileno()).st_ino != current:
+            self.close(game_id)
+            log = None
+        if log is None:
+            log = self.logs[game_id] = open(path, "ab")
+            while len(self.logs) > self.max_open:
+                self.close(next(iter(self.logs)))
+        self.logs.move_to_end(game_id)
+        return log
+
+    def append(self, game, events, position, seen = list()):
+        #called with the events that turned the game into its current version, in the order they were applied,
+        #while the store holds the game's flock and has read the journal up to position. returns the new position.
+        #seen are the ids of the events so far, kept at the start of the journal when it gets compacted
+        if not events:
+            return position
+        game_id = game["game-id"]
+        version = game["version"] - len(events)
+        lines = list()
+        for event in events:
+            version += 1
+            lines.append(json.dumps({"version": version, "event": event}) + "\n")
+        data = "".join(lines).encode("utf-8")
+        with self.lock:
+            log = self.open(game_id)
+            stat = os.fstat(log.fileno())
+            if stat.st_size and stat.st_ino == position.inode and stat.st_size > position.offset:
+                #a line torn by a crash ends without a newline, the new lines must not continue it
+                data = b"\n" + data
+            log.write(data)
+            log.flush()
+            self.dirty.add(game_id)
+        self.start()
+        position = Position(stat.st_ino, stat.st_size + len(data), position.base)
+        if game["version"] - position.base >= self.compact:
+            #the snapshot is written before the journal is replaced, after a crash in between the replay skips the old lines by their version
+            write_snapshot(game, self.directory)
+            with self.lock:
+                self.close(game_id)
+                inode, size = new_log(game_id, self.directory, seen)
+            position = Position(inode, size, game["version"])
+        return position
+
+    def recover(self, game_id):
+        return replay(game_id, self.directory)
+
+    def sync(self):
+        with self.lock:
+            logs = [self.logs[game_id] for game_id in self.dirty if game_id in self.logs]
+            self.dirty = set()
+        for log in logs:
+            try:
+                os.fsync(log.fileno())
+            except (OSError, ValueError):
+                #closed by a compaction in the meantime, its snapshot is already on disk
+                pass
+
+    def prune(self, age = max_age):
+        #games nobody changed for age seconds are removed with their journal and lock file, saved games stay in the archive
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return list()
+        pruned = list()
+        limit = time.time() - age
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            game_id = name[:-len(".json")]
+            paths = [snapshot_path(game_id, self.directory), log_path(game_id, self.directory)]
+            with self.locked(game_id):
+                try:
+                    if max(os.path.getmtime(path) for path in paths if os.path.exists(path)) > limit:
+                        continue
+                except (OSError, ValueError):
+                    continue
+                with self.lock:
+                    self.close(game_id)
+                for path in paths + [lock_path(game_id, self.directory)]:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            pruned.append(game_id)
+        return pruned
+
+    def run(self):
+        pruned = 0
+        while True:
+            time.sleep(self.interval)
+            self.sync()
+            if time.time() - pruned > prune_interval:
+                pruned = time.time()
+                self.prune()
+
+journal = Journal()
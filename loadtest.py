@@ -0,0 +1,256 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+#load test of the dash callbacks: every session starts a game and plays it through the same
+#/_dash-update-component requests the browser sends, with the state the server returned before.
+#  python loadtest.py --workers 2 --concurrency 1,4,16,64 --rounds 30
+#without --url a gunicorn server is started on a free local port and the memory of its workers is measured.
+
+names = ["Anna", "Ben", "Carl", "Dora", "Emil", "Fritz", "Gabi", "Hans"]
+counters = ["handout-mistakes", "beer-count", "goiß-count"]
+state_ids = ["game-players", "table-dict", "game-history", "points-development", "handout-mistakes", "beer-count", "goiß-count", "game-id", "game-rules", "game-version", "game-timestamps"]
+
+########### Dash requests
+class Client:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.callback = None
+
+    def request(self, path, body = None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(self.url + path, data = data, headers = {"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout = 60) as response:
+            return response.status, response.read()
+
+    def load_callback(self):
+        #the update_content spec as the dash renderer sees it, so the payloads match whatever the app declares
+        status, body = self.request("/_dash-dependencies")
+        for callback in json.loads(body):
+            if callback["output"].startswith("..content.children..."):
+                self.callback = callback
+                return
+        raise RuntimeError("update_content is not among the dash callbacks")
+
+    def update_content(self, values, triggered):
+        callback = self.callback
+        outputs = [dict(zip(["id", "property"], output.split("."))) for output in callback["output"].strip(".").split("...")]
+        def props(dependencies):
+            #pattern matching dependencies (ids in json) match no component of the page
+            return [
+                {"id": dependency["id"], "property": dependency["property"], "value": values.get(f"{dependency['id']}.{dependency['property']}")}
+                if not dependency["id"].startswith("{") else list()
+                for dependency in dependencies
+            ]
+        body = {
+            "output": callback["output"],
+            "outputs": outputs,
+            "inputs": props(callback["inputs"]),
+            "state": props(callback["state"]),
+            "changedPropIds": [triggered]
+        }
+        status, response = self.request("/_dash-update-component", body)
+        if status == 204:
+            return None
+        return json.loads(response)["response"]["content"]["children"]
+
+def find(node, id):
+    if isinstance(node, dict):
+        if node.get("props", {}).get("id") == id:
+            return node
+        node = list(node.get("props", {}).values())
+    if isinstance(node, list):
+        for child in node:
+            found = find(child, id)
+            if found is not None:
+                return found
+    return None
+
+def page_state(content):
+    values = {"content.children": content}
+    for id in state_ids:
+        node = find(content, id)
+        values[f"{id}.children"] = node["props"].get("children") if node else None
+    return values
+
+########### Sessions
+def session(client, players, rounds, counter_rate, latencies, lock):
+    #one evening: start the game, then every round is synced with a few counter events in the same queue
+    rng = random.Random()
+    players = names[:players]
+    def timed(values, triggered):
+        start = time.perf_counter()
+        content = client.update_content(values, triggered)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+        return content
+
+    values = {
+        "content.children": [{"type": "Input", "namespace": "dash_bootstrap_components", "props": {"value": name}} for name in players],
+        "start-game-button.n_clicks": 1,
+        "handout-mistakes-checkbox.checked": True,
+        "beer-count-checkbox.checked": True,
+        "goiß-count-checkbox.checked": True,
+        "house-rules.value": "Default"
+    }
+    for id in state_ids[:7]:
+        values[f"{id}.children"] = "{}"
+    values["game-players.children"] = "[]"
+    content = timed(values, "start-game-button.n_clicks")
+    for i in range(rounds):
+        values = page_state(content)
+        game_id = values["game-id.children"]
+        ranks = rng.sample(range(len(players)), len(players))
+        queue = [{"id": uuid.uuid4().hex, "game": game_id, "type": "round", "rounds": i, "ranks": ranks}]
+        while rng.random() < counter_rate:
+            queue.append({"id": uuid.uuid4().hex, "game": game_id, "type": rng.choice(counters), "player": rng.randrange(len(players))})
+        values.update({"sync-trigger.data": int(time.time() * 1000), "sync-queue.data": queue})
+        version = int(values["game-version.children"] or 0)
+        content = timed(values, "sync-trigger.data")
+        #synced-events also lists rejected events, only the new version shows that every event was applied
+        synced = page_state(content) if content is not None else dict()
+        if int(synced.get("game-version.children") or 0) != version + len(queue) or len(json.loads(synced["game-history.children"])["game-history"][0]) != i + 1:
+            raise RuntimeError(f"round {i + 1} of game {game_id} was not applied")
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float("nan")
+
+########### Server
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers, threads, directory):
+    port = free_port()
+    #the synthetic sessions get their own journal, archive, audit log and reports below directory, the real ones stay untouched
+    env = dict(os.environ)
+    for name in ["JOURNAL_DIR", "ARCHIVE_DIR", "AUDIT_DIR", "REPORT_DIR"]:
+        env[name] = os.path.join(directory, name.split("_")[0].lower())
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "application:server", "-w", str(workers), "--threads", str(threads), "-b", f"127.0.0.1:{port}"],
+        cwd = os.path.dirname(os.path.abspath(__file__)),
+        env = env,
+        stdout = subprocess.DEVNULL,
+        stderr = subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            Client(url).request("/_dash-dependencies")
+            return process, url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not start")
+
+def worker_memory(pid):
+    #resident memory of the gunicorn workers in MB, read from /proc (linux only)
+    memory = list()
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as rd:
+            children = rd.read().split()
+    except OSError:
+        return memory
+    for child in children:
+        try:
+            with open(f"/proc/{child}/status") as rd:
+                for line in rd:
+                    if line.startswith("VmRSS:"):
+                        memory.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    return memory
+
+########### Run
+def run(url, levels, sessions_per_level, players, rounds, counter_rate, pid = None):
+    client = Client(url)
+    client.load_callback()
+    results = list()
+    for concurrency in levels:
+        latencies = list()
+        lock = threading.Lock()
+        errors = 0
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers = concurrency) as executor:
+            futures = [
+                executor.submit(session, client, players, rounds, counter_rate, latencies, lock)
+                for i in range(max(sessions_per_level, concurrency))
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    errors += 1
+        duration = time.perf_counter() - start
+        memory = worker_memory(pid) if pid else list()
+        results.append({
+            "concurrency": concurrency,
+            "requests": len(latencies),
+            "errors": errors,
+            "throughput": len(latencies) / duration,
+            "p50-ms": percentile(latencies, 0.5) * 1000,
+            "p99-ms": percentile(latencies, 0.99) * 1000,
+            "worker-mb": sum(memory) / len(memory) if memory else None
+        })
+        print_result(results[-1])
+    return results
+
+def print_result(result):
+    memory = f"{result['worker-mb']:.0f} MB" if result["worker-mb"] is not None else "-"
+    print(
+        f"{result['concurrency']:>5} sessions  {result['requests']:>6} requests  {result['throughput']:>8.1f} req/s  "
+        f"p50 {result['p50-ms']:>7.1f} ms  p99 {result['p99-ms']:>7.1f} ms  {memory:>7} per worker  {result['errors']} failed sessions",
+        flush = True
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description = "Load test of the Arschloch Stats dash callbacks")
+    parser.add_argument("--url", help = "test a running server instead of starting gunicorn")
+    parser.add_argument("--workers", type = int, default = 2, help = "gunicorn workers")
+    parser.add_argument("--threads", type = int, default = 1, help = "gunicorn threads per worker")
+    parser.add_argument("--concurrency", default = "1,2,4,8,16,32", help = "comma separated numbers of simultaneous sessions")
+    parser.add_argument("--sessions", type = int, default = 0, help = "sessions per level, at least the concurrency")
+    parser.add_argument("--players", type = int, default = 4, choices = range(2, len(names) + 1))
+    parser.add_argument("--rounds", type = int, default = 30, help = "rounds per session")
+    parser.add_argument("--counter-rate", type = float, default = 0.4, help = "chance of another counter event per round")
+    parser.add_argument("--json", help = "also write the results to this file")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    process = None
+    directory = None
+    url = args.url
+    try:
+        if url is None:
+            directory = tempfile.mkdtemp(prefix = "loadtest-")
+            process, url = start_server(args.workers, args.threads, directory)
+            print(f"gunicorn with {args.workers} workers x {args.threads} threads on {url}", flush = True)
+        results = run(url, levels, args.sessions, args.players, args.rounds, args.counter_rate, pid = process.pid if process else None)
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            process.wait()
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors = True)
+    if args.json:
+        with open(args.json, "w") as wd:
+            json.dump(results, wd, indent = 4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import statistics
+
+import scoring
+
+rolling_rounds = 5
+
+########### Pace
+#everything is read from the delta encoded "timestamps" of a game (see scoring.py)
+def round_durations(timestamps, rounds):
+    #seconds per round, a game from before the timestamps has no start for its first timed round
+    deltas = list(timestamps.get("rounds", list()))
+    if len(deltas) < rounds:
+        deltas = deltas[1:]
+    return deltas
+
+def last_time(timestamps):
+    #the kept "last" times where there are any, older games sum up their deltas
+    last = timestamps.get("last") or dict()
+    times = [last.get("rounds", timestamps["start"] + sum(timestamps.get("rounds", list())))]
+    for counter in scoring.counters:
+        for name, deltas in (timestamps.get(counter) or dict()).items():
+            times.append((last.get(counter) or dict()).get(name, timestamps["start"] + sum(deltas)))
+    return max(times)
+
+def rolling_pace(durations, window = rolling_rounds):
+    #rounds per hour over the last few rounds, for every round
+    pace = list()
+    for i in range(len(durations)):
+        seconds = sum(durations[max(i - window + 1, 0):i + 1])
+        pace.append(min(i + 1, window) * 3600 / seconds if seconds else None)
+    return pace
+
+def per_hour(counts, hours):
+    return counts / hours if hours else None
+
+def analyze(game):
+    timestamps = game.get("timestamps")
+    if not timestamps:
+        return None
+    durations = round_durations(timestamps, len(game["game-history"]["x"]))
+    hours = (last_time(timestamps) - timestamps["start"]) / 3600
+    counters = dict()
+    for counter in scoring.counters:
+        events = {name: len(deltas) for name, deltas in (timestamps.get(counter) or dict()).items()}
+        if game.get(counter):
+            counters[counter] = {
+                "per-hour": per_hour(sum(events.values()), hours),
+                "players": {name: per_hour(events.get(name, 0), hours) for name in game[counter]}
+            }
+    return {
+        "start": timestamps["start"],
+        "hours": hours,
+        "round-durations": durations,
+        "mean-round": statistics.mean(durations) if durations else None,
+        "median-round": statistics.median(durations) if durations else None,
+        "rounds-per-hour": per_hour(len(timestamps.get("rounds", list())), hours),
+        "rolling-pace": rolling_pace(durations),
+        "counters": counters
+    }
@@ -0,0 +1,111 @@
+import concurrent.futures
+import itertools
+import os
+import random
+import time
+
+import rules
+
+projection_workers = int(os.environ.get("PROJECTION_WORKERS", os.cpu_count() or 1))
+time_budget = float(os.environ.get("PROJECTION_TIME_BUDGET", 1.0))
+max_budget = time_budget * 5
+batch_size = 200
+max_simulations = 200000
+max_rounds = 300
+
+executor = None
+
+########### Distributions
+def rank_distributions(game):
+    #rank counts from the table dict plus one virtual round on every rank,
+    #so players without history are projected uniformly
+    table_dict = game["table-dict"]
+    names = [key for key in table_dict if key != "Ranks"]
+    return names, [[count + 1 for count in table_dict[name][:-1]] for name in names]
+
+########### Simulation
+def simulate(cum_weights, current_points, rank_points, rounds, deadline, max_sims, seed):
+    #runs batches of whole remaining games until the deadline, returns aggregated counts.
+    #the first batch always runs, a worker that starts after the deadline still contributes it
+    rng = random.Random(seed)
+    n = len(current_points)
+    ranks = range(n)
+    wins = [0.0] * n
+    points_sum = [0.0] * n
+    histograms = [dict() for i in range(n)]
+    sims = 0
+    while sims < max_sims and (not sims or time.time() < deadline):
+        batch = min(batch_size, max_sims - sims)
+        #one call per player draws its ranks for every round of the batch at once
+        draws = [rng.choices(ranks, cum_weights = cum_weights[p], k = batch * rounds) for p in ranks]
+        tiebreaks = [rng.random() for i in range(batch * rounds * n)]
+        for b in range(batch):
+            final = list(current_points)
+            for r in range(b * rounds, (b + 1) * rounds):
+                #the players' draws are turned into a permutation of the ranks
+                order = sorted(ranks, key = lambda p: draws[p][r] + tiebreaks[r * n + p])
+                for rank, p in enumerate(order):
+                    final[p] += rank_points[rank]
+            best = max(final)
+            winners = [p for p in ranks if final[p] == best]
+            for p in winners:
+                wins[p] += 1 / len(winners)
+            for p in ranks:
+                points_sum[p] += final[p]
+                histograms[p][final[p]] = histograms[p].get(final[p], 0) + 1
+        sims += batch
+    return sims, wins, points_sum, histograms
+
+def percentile(histogram, sims, q):
+    count = 0
+    for points in sorted(histogram):
+        count += histogram[points]
+        if count >= q * sims:
+            return points
+    return None
+
+def project(game, rounds, budget = None, workers = None):
+    global executor
+    #rounds and the time budget come from requests, they are clamped so one projection can't hold the workers
+    rounds = min(max(rounds, 0), max_rounds)
+    budget = min(max(time_budget if budget is None else budget, 0), max_budget)
+    workers = projection_workers if workers is None else workers
+
+    names, distributions = rank_distributions(game)
+    cum_weights = [list(itertools.accumulate(weights)) for weights in distributions]
+    current_points = [game["table-dict"][name][-1] for name in names]
+    rank_points = rules.game_table(game).points
+    deadline = time.time() + budget
+    seeds = [random.randrange(2**32) for i in range(max(workers, 1))]
+
+    if rounds <= 0:
+        #nothing left to play, the current standings are final
+        results = [simulate(cum_weights, current_points, rank_points, 0, deadline, 1, seeds[0])]
+    elif workers <= 1:
+        results = [simulate(cum_weights, current_points, rank_points, rounds, deadline, max_simulations, seeds[0])]
+    else:
+        if executor is None:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers = projection_workers)
+        futures = [
+            executor.submit(simulate, cum_weights, current_points, rank_points, rounds, deadline, max_simulations // workers, seed)
+            for seed in seeds
+        ]
+        results = [future.result() for future in futures]
+
+    sims = sum(result[0] for result in results)
+    projection = list()
+    for p, name in enumerate(names):
+        histogram = dict()
+        for result in results:
+            for points, count in result[3][p].items():
+                histogram[points] = histogram.get(points, 0) + count
+        projection.append({
+            "player": name,
+            "win-probability": sum(result[1][p] for result in results) / max(sims, 1),
+            "mean-points": sum(result[2][p] for result in results) / max(sims, 1),
+            "p10-points": percentile(histogram, sims, 0.1),
+            "p50-points": percentile(histogram, sims, 0.5),
+            "p90-points": percentile(histogram, sims, 0.9)
+        })
+    projection.sort(key = lambda row: row["win-probability"], reverse = True)
+    return {"rounds": rounds, "simulations": sims, "projection": projection}
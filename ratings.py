@@ -0,0 +1,95 @@
+import os
+import threading
+
+import aggregates
+import scoring
+
+k_factor = float(os.environ.get("RATING_K_FACTOR", 32))
+initial_rating = 1000.0
+
+########### Rounds
+def ordering(game_history, values):
+    #players from König to Arschloch, the game history stores the König as the highest value
+    names = [key for key in game_history if key != "x"]
+    return [name for value, name in sorted(zip(values, names), reverse = True)]
+
+def round_orderings(game):
+    game_history = game["game-history"]
+    names = [key for key in game_history if key != "x"]
+    for values in zip(*(game_history[name] for name in names)):
+        yield ordering(game_history, values)
+
+def last_ordering(game):
+    game_history = game["game-history"]
+    names = [key for key in game_history if key != "x"]
+    return ordering(game_history, [game_history[name][-1] for name in names])
+
+########### Ratings
+#multiplayer elo: a round with n players counts as n*(n-1)/2 duels, the K factor is split among them
+class Ratings:
+    def __init__(self, k = k_factor, initial = initial_rating):
+        self.k = k
+        self.initial = initial
+        self.ratings = dict()
+        self.rounds = dict()
+        self.lock = threading.Lock()
+
+    def update(self, ordering):
+        with self.lock:
+            update_ratings(self.ratings, self.rounds, ordering, self.k, self.initial)
+
+    def recompute(self, games):
+        #the new table is built aside and swapped in, readers never see half a recompute
+        ratings = dict()
+        rounds = dict()
+        for game in games:
+            try:
+                orderings = list(round_orderings(game))
+            except (KeyError, TypeError, AttributeError):
+                continue
+            for ordering in orderings:
+                update_ratings(ratings, rounds, ordering, self.k, self.initial)
+        with self.lock:
+            self.ratings = ratings
+            self.rounds = rounds
+
+    def rating(self, name):
+        return self.ratings.get(name, self.initial)
+
+    def table(self):
+        return sorted(
+            [{"player": name, "rating": rating, "rounds": self.rounds[name]} for name, rating in self.ratings.items()],
+            key = lambda row: row["rating"],
+            reverse = True
+        )
+
+def update_ratings(ratings, rounds, ordering, k, initial):
+    n = len(ordering)
+    if n < 2:
+        return
+    #10^(rating/400) once per player instead of once per duel
+    strength = [10 ** (ratings.get(name, initial) / 400) for name in ordering]
+    k = k / (n - 1)
+    deltas = [0.0] * n
+    for i in range(n):
+        strength_i = strength[i]
+        for j in range(i + 1, n):
+            #player i finished above player j
+            delta = k * strength[j] / (strength_i + strength[j])
+            deltas[i] += delta
+            deltas[j] -= delta
+    for name, delta in zip(ordering, deltas):
+        ratings[name] = ratings.get(name, initial) + delta
+        rounds[name] = rounds.get(name, 0) + 1
+
+ratings = aggregates.ArchiveTotals(Ratings())
+
+def get_ratings():
+    return ratings.get()
+
+def update_events(game, events):
+    #applied round events of a game go into the ratings without replaying its history
+    for event in events:
+        if event["type"] == "round":
+            selection = scoring.parse_selection(game, event["ranks"])
+            get_ratings().update(sorted(selection, key = selection.get))
@@ -0,0 +1,135 @@
+import bisect
+import collections
+import os
+import threading
+
+import figures
+import scoring
+
+snapshot_every = int(os.environ.get("REPLAY_SNAPSHOT_EVERY", 25))
+max_cached_replays = 32
+max_cached_points = int(os.environ.get("REPLAY_CACHE_POINTS", 2000000))
+
+########### Replay
+#the state of a game after any round: the rank counts and counters are snapshotted every snapshot_every rounds,
+#a round in between starts from the snapshot before it. the points after every round are in the points development.
+class Replay:
+    def __init__(self, game, every = snapshot_every):
+        self.every = max(int(every), 1)
+        self.names = scoring.get_names(game)
+        self.ranks = game["table-dict"]["Ranks"]
+        self.game_history = game["game-history"]
+        self.points_development = game["points-development"]
+        self.rounds = len(self.game_history["x"])
+        self.counters = [counter for counter in scoring.counters if game.get(counter)]
+        self.changes = counter_changes(game, self.counters, self.rounds)
+        self.snapshots = list()
+        counts = {name: [0] * (len(self.ranks) - 1) for name in self.names}
+        counters = {counter: {name: 0 for name in self.names} for counter in self.counters}
+        for k in range(self.rounds + 1):
+            if k:
+                self.add_round(counts, k - 1)
+            for counter, name in self.changes[k]:
+                counters[counter][name] += 1
+            if k % self.every == 0:
+                self.snapshots.append(({name: list(row) for name, row in counts.items()}, {counter: dict(values) for counter, values in counters.items()}))
+
+    def add_round(self, counts, i):
+        top = len(self.ranks) - 2
+        for name in self.names:
+            counts[name][top - self.game_history[name][i]] += 1
+
+    def state(self, k):
+        #the game as it was after k rounds, in the layout of a game dict
+        k = min(max(int(k), 0), self.rounds)
+        base = k // self.every * self.every
+        snapshot_counts, snapshot_counters = self.snapshots[k // self.every]
+        counts = {name: list(row) for name, row in snapshot_counts.items()}
+        counters = {counter: dict(values) for counter, values in snapshot_counters.items()}
+        for i in range(base, k):
+            self.add_round(counts, i)
+        for r in range(base + 1, k + 1):
+            for counter, name in self.changes[r]:
+                counters[counter][name] += 1
+        table_dict = {"Ranks": self.ranks}
+        for name in self.names:
+            table_dict[name] = [*counts[name], self.points_development[name][k]]
+        game = {
+            "table-dict": table_dict,
+            "game-history": {key: values[:k] for key, values in self.game_history.items()},
+            "points-development": {key: values[:k + 1] for key, values in self.points_development.items()},
+            "rounds": k
+        }
+        for counter in scoring.counters:
+            game[counter] = counters.get(counter)
+        return game
+
+def counter_changes(game, counters, rounds):
+    #changes[k] are the counter events that happened after round k. the timestamps place every counter event
+    #after the rounds confirmed before it, events without a time are put where the timed rounds begin
+    changes = [list() for k in range(rounds + 1)]
+    timestamps = game.get("timestamps") or dict()
+    round_times = scoring.decode_times(timestamps, timestamps.get("rounds", list())) if timestamps else list()
+    untimed_rounds = rounds - len(round_times)
+    for counter in counters:
+        timed = (timestamps.get(counter) or dict()) if timestamps else dict()
+        for name, total in game[counter].items():
+            times = scoring.decode_times(timestamps, timed.get(name, list())) if timestamps else list()
+            for time in times:
+                changes[min(untimed_rounds + bisect.bisect_right(round_times, time), rounds)].append((counter, name))
+            for i in range(max(total - len(times), 0)):
+                changes[untimed_rounds].append((counter, name))
+    return changes
+
+########### Cache
+#replays are kept per game version, the figures of a round are kept per game version and round.
+#a long game has much bigger figures than a short one, so the round views are limited by their points, not their number
+replays = collections.OrderedDict()
+replays_lock = threading.Lock()
+views = collections.OrderedDict()
+views_points = 0
+views_lock = threading.Lock()
+
+def get_replay(game, version):
+    key = (game["game-id"], version)
+    with replays_lock:
+        if key in replays:
+            replays.move_to_end(key)
+            return replays[key]
+    replay = Replay(game)
+    with replays_lock:
+        replays[key] = replay
+        while len(replays) > max_cached_replays:
+            replays.popitem(last = False)
+    return replay
+
+def figure_points(figs):
+    return sum(len(trace.get("x") or ()) + len(trace.get("y") or ()) for fig in figs.values() for trace in fig["data"])
+
+def round_view(replay, game_id, version, k):
+    #the state and figures after round k of the replay of that game version
+    global views_points
+    k = min(max(int(k), 0), replay.rounds)
+    key = (game_id, version, k)
+    with views_lock:
+        if key in views:
+            views.move_to_end(key)
+            return views[key][:2]
+    game = replay.state(k)
+    figs = figures.game_figures(
+        game["table-dict"],
+        game["game-history"],
+        game["points-development"],
+        game["handout-mistakes"],
+        game["beer-count"],
+        game["goiß-count"]
+    )
+    figs = {name: fig.to_plotly_json() for name, fig in figs.items()}
+    points = figure_points(figs)
+    with views_lock:
+        if key not in views:
+            views[key] = (game, figs, points)
+            views_points += points
+            while views_points > max_cached_points and len(views) > 1:
+                views_points -= views.popitem(last = False)[1][2]
+    return game, figs
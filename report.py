@@ -0,0 +1,180 @@
+import concurrent.futures
+import html
+import os
+import re
+import threading
+import time
+import uuid
+
+import figures
+import scoring
+
+report_dir = os.environ.get("REPORT_DIR", "reports")
+report_workers = int(os.environ.get("REPORT_WORKERS", 2))
+max_jobs = 200
+#a report still unfinished after that long belongs to a worker that died
+max_render_seconds = 600
+
+figure_titles = {
+    "points-development": "Points Development 📈",
+    "game-history": "Game History 🕑",
+    "rank-accumulation": "Rank Accumulation 📊",
+    "handout-mistakes": "Handout Mistakes 🃏",
+    "beer-count": "Beer Count 🍺",
+    "goiß-count": "Goiß Moß Count 🥴"
+}
+
+page_template = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{font-family: sans-serif; padding: 5%;}}
+h2 {{background: #007BFF; color: white; padding: 10px 20px; border-radius: 4px;}}
+table {{border-collapse: collapse; overflow: scroll;}}
+th, td {{border: 1px solid #dee2e6; padding: 6px 12px; text-align: center;}}
+.ranking {{text-align: center;}}
+img {{max-width: 100%;}}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+########### Rendering
+def table_html(table_dict):
+    names = scoring.table_names(table_dict)
+    rows = list()
+    rows.append("<tr>" + "".join(f"<th>{html.escape(key)}</th>" for key in ["Ranks", *names]) + "</tr>")
+    for i, rank in enumerate(table_dict["Ranks"]):
+        cell = "th" if rank == "Points" else "td"
+        row = f"<th>{html.escape(rank)}</th>"
+        for name in names:
+            row += f"<{cell}>{table_dict[name][i]}</{cell}>"
+        rows.append(f"<tr>{row}</tr>")
+    return "<table>" + "".join(rows) + "</table>"
+
+def figure_html(fig, include_plotlyjs):
+    return fig.to_html(full_html = False, include_plotlyjs = include_plotlyjs)
+
+def render_report(game, title = "Arschloch Stats"):
+    table_dict = game["table-dict"]
+    body = [f"<h1>{html.escape(title)}</h1>"]
+    body.append("<h2>Overview 🔍</h2>")
+    body.append(table_html(table_dict))
+    body.append("<h2>Ranking 🏆</h2>")
+    body.append(
+        '<div class="ranking">'
+        + "".join(f"<h3>{i+1}. {html.escape(name)}</h3>" for i, name in enumerate(scoring.ranking(table_dict)))
+        + "</div>"
+    )
+
+    #reports always get the full resolution charts
+    figs = figures.game_figures(
+        table_dict,
+        game["game-history"],
+        game["points-development"],
+        game["handout-mistakes"],
+        game["beer-count"],
+        game["goiß-count"],
+        budget = None
+    )
+    #plotly.js is inlined once, all following figures reuse it
+    include_plotlyjs = True
+    for key, fig in figs.items():
+        if key in ["handout-mistakes", "beer-count", "goiß-count"] and not game[key]:
+            continue
+        body.append(f"<h2>{figure_titles[key]}</h2>")
+        body.append(figure_html(fig, include_plotlyjs))
+        include_plotlyjs = False
+
+    return page_template.format(title = html.escape(title), body = "\n".join(body))
+
+def report_path(job_id):
+    return os.path.join(report_dir, f"{job_id}_report.html")
+
+def write_report(job_id, game, title):
+    #the files are the state of the job, so every worker can answer for it:
+    #<path>.tmp while it renders, <path> once it is done and <path>.failed with the error otherwise
+    path = report_path(job_id)
+    try:
+        content = render_report(game, title = title)
+        #write to the temporary file first so a half written report is never served
+        with open(f"{path}.tmp", "w", encoding = "utf-8") as wd:
+            wd.write(content)
+        os.replace(f"{path}.tmp", path)
+    except Exception as e:
+        with open(f"{path}.failed", "w", encoding = "utf-8") as wd:
+            wd.write(repr(e))
+        try:
+            os.remove(f"{path}.tmp")
+        except OSError:
+            pass
+        return None
+    return path
+
+########### Job queue
+#jobs are rendered by the worker that took them, their status is read from the report directory
+class ReportQueue:
+    def __init__(self, workers = report_workers):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers = workers,
+            thread_name_prefix = "report"
+        )
+        self.lock = threading.Lock()
+
+    def submit(self, game, title = "Arschloch Stats"):
+        job_id = uuid.uuid4().hex
+        os.makedirs(report_dir, exist_ok = True)
+        open(f"{report_path(job_id)}.tmp", "w").close()
+        self.executor.submit(write_report, job_id, game, title)
+        with self.lock:
+            self.prune()
+        return job_id
+
+    def status(self, job_id):
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+            return "unknown"
+        path = report_path(job_id)
+        if os.path.exists(path):
+            return "done"
+        if os.path.exists(f"{path}.failed"):
+            return "failed"
+        try:
+            started = os.path.getmtime(f"{path}.tmp")
+        except OSError:
+            return "unknown"
+        return "running" if time.time() - started < max_render_seconds else "failed"
+
+    def path(self, job_id):
+        return report_path(job_id) if self.status(job_id) == "done" else None
+
+    def prune(self):
+        #forget the oldest finished jobs and their files, running jobs are kept
+        try:
+            names = os.listdir(report_dir)
+        except OSError:
+            return
+        now = time.time()
+        finished = list()
+        for name in names:
+            if not re.fullmatch(r"[0-9a-f]{32}_report\.html(\.failed|\.tmp)?", name):
+                continue
+            try:
+                modified = os.path.getmtime(os.path.join(report_dir, name))
+            except OSError:
+                continue
+            if not name.endswith(".tmp") or now - modified >= max_render_seconds:
+                finished.append((modified, name))
+        finished.sort()
+        for modified, name in finished[:max(0, len(finished) - max_jobs)]:
+            try:
+                os.remove(os.path.join(report_dir, name))
+            except OSError:
+                pass
+
+queue = ReportQueue()
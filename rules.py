@@ -0,0 +1,77 @@
+import collections
+import functools
+import json
+import os
+
+rules_file = os.environ.get("RULES_FILE")
+
+########### House rules
+#"points" maps a player count to the points per rank (König first), missing counts get n-1-rank points.
+#"rank-bonus" adds extra points to a rank title, "counter-weights" are the points per counter event.
+default_rules = {
+    "name": "Default",
+    "top-title": "König",
+    "bottom-title": "Arschloch",
+    "middle-title": "Bauer",
+    "vice-prefix": "Vize",
+    "points": {},
+    "rank-bonus": {},
+    "counter-weights": {
+        "handout-mistakes": -1,
+        "beer-count": 1,
+        "goiß-count": 3
+    }
+}
+
+RuleTable = collections.namedtuple("RuleTable", ["ranks", "points", "rank_index", "counter_weights"])
+
+def load_presets():
+    presets = {default_rules["name"]: default_rules}
+    if rules_file:
+        with open(rules_file, encoding = "utf-8") as rd:
+            for rules in json.load(rd):
+                rules = {**default_rules, **rules}
+                presets[rules["name"]] = rules
+    return presets
+
+presets = load_presets()
+default_key = json.dumps(default_rules, sort_keys = True)
+
+########### Compiled tables
+def rules_key(rules):
+    #the cache key is the canonical json of the rules, so equal rules share their tables
+    if not rules:
+        return default_key
+    return json.dumps(rules, sort_keys = True)
+
+@functools.lru_cache(maxsize = 256)
+def compile_key(key, n_players):
+    rules = {**default_rules, **json.loads(key)}
+    ranks = [rules["middle-title"] for i in range(n_players)]
+    half = int(n_players/2)
+    for i in range(half):
+        vice = rules["vice-prefix"]*i
+        ranks[i] = f"{vice} {rules['bottom-title']}"
+        ranks[-(i + 1)] = f"{vice} {rules['top-title']}"
+    ranks.reverse()
+
+    points = rules["points"].get(str(n_players)) or [n_players - i - 1 for i in range(n_players)]
+    if len(points) != n_players:
+        raise ValueError(f"House rules '{rules['name']}' need {n_players} points for {n_players} players")
+    points = tuple(
+        p + rules["rank-bonus"].get(rank.strip(), 0)
+        for p, rank in zip(points, ranks)
+    )
+
+    return RuleTable(
+        ranks = tuple(ranks),
+        points = points,
+        rank_index = {rank.strip(): i for i, rank in enumerate(ranks)},
+        counter_weights = {**default_rules["counter-weights"], **rules["counter-weights"]}
+    )
+
+def compile_rules(rules, n_players):
+    return compile_key(rules_key(rules), n_players)
+
+def game_table(game):
+    return compile_rules(game.get("rules"), len(game["table-dict"]["Ranks"]) - 1)
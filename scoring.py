@@ -0,0 +1,341 @@
+import time
+import uuid
+
+import rules
+
+########### Game state
+#a game is the dict that is also written to the save files:
+#{"table-dict": ..., "game-history": ..., "points-development": ..., "handout-mistakes": ..., "beer-count": ..., "goiß-count": ..., "game-id": ..., "rules": ..., "version": ..., "timestamps": ...}
+
+def new_game_id():
+    return uuid.uuid4().hex[:12]
+
+def get_ranks(names, house_rules = None):
+    return list(rules.compile_rules(house_rules, len(names)).ranks)
+
+def table_names(table_dict):
+    return [key for key in table_dict if key != "Ranks"]
+
+def get_names(game):
+    return table_names(game["table-dict"])
+
+def new_game(names, handout_mistakes = True, beer_count = True, goiß_count = True, house_rules = None):
+    ranks = get_ranks(names, house_rules)
+
+    table_dict = {"Ranks": [*ranks, "Points"]}
+    for name in names:
+        table_dict[name] = [0 for i in range(len(ranks)+1)]
+
+    game_history = {"x": list()}
+    for name in names:
+        game_history[name] = list()
+
+    points_development = {"x": [0]}
+    for name in names:
+        points_development[name] = [0]
+
+    return {
+        "table-dict": table_dict,
+        "game-history": game_history,
+        "points-development": points_development,
+        "handout-mistakes": {name: 0 for name in names} if handout_mistakes else None,
+        "beer-count": {name: 0 for name in names} if beer_count else None,
+        "goiß-count": {name: 0 for name in names} if goiß_count else None,
+        "game-id": new_game_id(),
+        "rules": house_rules,
+        "version": 0,
+        "timestamps": new_timestamps(time.time())
+    }
+
+def validate_game(game):
+    #the structure of a save file, checked before a loaded game is used
+    if not isinstance(game, dict):
+        raise ValueError("A game has to be a json object")
+    table_dict = game.get("table-dict")
+    if not isinstance(table_dict, dict) or not isinstance(table_dict.get("Ranks"), list):
+        raise ValueError("The game has no points table")
+    names = get_names(game)
+    if len(names) < 2 or len(table_dict["Ranks"]) != len(names) + 1:
+        raise ValueError("The points table needs a rank for every player")
+    for name in names:
+        row = table_dict[name]
+        if not isinstance(row, list) or len(row) != len(names) + 1 or not all(isinstance(value, (int, float)) for value in row):
+            raise ValueError(f"The points table row of '{name}' is invalid")
+    for key in ["game-history", "points-development"]:
+        series = game.get(key)
+        if not isinstance(series, dict) or set(series) != {"x", *names}:
+            raise ValueError(f"'{key}' doesn't match the players")
+        if not all(isinstance(values, list) for values in series.values()) or len({len(values) for values in series.values()}) != 1:
+            raise ValueError(f"'{key}' has series of different lengths")
+        if not all(is_number(value) for values in series.values() for value in values):
+            raise ValueError(f"'{key}' has values that are no numbers")
+    #the game history holds a rank level per round, the points development also the points before the first round
+    rounds = len(game["game-history"]["x"])
+    if len(game["points-development"]["x"]) != rounds + 1:
+        raise ValueError("'points-development' doesn't match the rounds of 'game-history'")
+    if not all(isinstance(level, int) and 0 <= level < len(names) for name in names for level in game["game-history"][name]):
+        raise ValueError("'game-history' has invalid rank levels")
+    for counter in counters:
+        counts = game.get(counter)
+        if counts and (not isinstance(counts, dict) or set(counts) != set(names) or not all(isinstance(count, int) and count >= 0 for count in counts.values())):
+            raise ValueError(f"'{counter}' doesn't match the players")
+    try:
+        rules.compile_rules(game.get("rules"), len(names))
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"'rules' are invalid: {e}")
+    version = game.get("version", 0)
+    if not isinstance(version, int) or isinstance(version, bool) or version < 0:
+        raise ValueError("'version' has to be a whole number")
+    timestamps = game.get("timestamps")
+    if timestamps is not None and (not isinstance(timestamps, dict) or not isinstance(timestamps.get("start"), int) or not isinstance(timestamps.get("rounds", list()), list)):
+        raise ValueError("'timestamps' are invalid")
+    return game
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def ranking(table_dict):
+    ranking = list()
+    names = [key for key in table_dict if key != "Ranks"]
+    names.reverse()
+    for name in names:
+        if not len(ranking):
+            ranking.append(name)
+        else:
+            pos = 0
+            for rank_name in ranking:
+                if table_dict[name][-1] > table_dict[rank_name][-1]:
+                    pos += 1
+            ranking.insert(pos, name)
+    ranking.reverse()
+    return ranking
+
+########### Players
+#a player's id is their position in the points table, the one name table of a game.
+#events and archived games refer to players by id, a name is also accepted wherever an id is
+def player_name(game, player):
+    if isinstance(player, int) and not isinstance(player, bool):
+        names = get_names(game)
+        if 0 <= player < len(names):
+            return names[player]
+    elif isinstance(player, str) and player != "Ranks" and player in game["table-dict"]:
+        return player
+    raise ValueError(f"Unknown player '{player}'")
+
+#the first x value of the series: the game history starts with round 1, the points development with the 0 before it
+series_first = {"game-history": 1, "points-development": 0}
+
+def intern_game(game):
+    #the game with one name table: the points table rows, the series, the counters and the counter times
+    #are lists in player id order. the x values are left out while they are the default 1, 2, ... and 0, 1, ...
+    names = get_names(game)
+    interned = {key: value for key, value in game.items() if key not in ("table-dict", "game-history", "points-development", *counters)}
+    interned["players"] = names
+    interned["ranks"] = game["table-dict"]["Ranks"]
+    interned["table"] = [game["table-dict"][name] for name in names]
+    for key, first in series_first.items():
+        series = game[key]
+        interned[key] = [series[name] for name in names]
+        if series["x"] != list(range(first, first + len(series["x"]))):
+            interned[f"{key}-x"] = series["x"]
+    for counter in counters:
+        interned[counter] = [game[counter][name] for name in names] if game.get(counter) else None
+    timestamps = game.get("timestamps")
+    if timestamps:
+        interned["timestamps"] = {
+            key: [value.get(name, list()) for name in names] if key in counters else value
+            for key, value in timestamps.items()
+        }
+        if "last" in timestamps:
+            interned["timestamps"]["last"] = {
+                key: [value.get(name) for name in names] if key in counters else value
+                for key, value in timestamps["last"].items()
+            }
+    return interned
+
+def extern_table(names, interned):
+    return {"Ranks": interned["ranks"], **dict(zip(names, interned["table"]))}
+
+def extern_series(names, interned, key):
+    columns = interned[key]
+    first = series_first[key]
+    x = interned.get(f"{key}-x", list(range(first, first + (len(columns[0]) if columns else 0))))
+    return {"x": x, **dict(zip(names, columns))}
+
+def extern_game(interned):
+    #the game dict of an interned game, a game dict is returned as it is
+    if "players" not in interned:
+        return interned
+    names = interned["players"]
+    game = {key: value for key, value in interned.items() if key not in ("players", "ranks", "table", "game-history-x", "points-development-x")}
+    game["table-dict"] = extern_table(names, interned)
+    for key in series_first:
+        game[key] = extern_series(names, interned, key)
+    for counter in counters:
+        game[counter] = dict(zip(names, interned[counter])) if interned.get(counter) else None
+    timestamps = interned.get("timestamps")
+    if timestamps:
+        game["timestamps"] = {
+            key: {name: deltas for name, deltas in zip(names, value) if deltas} if key in counters else value
+            for key, value in timestamps.items()
+        }
+        if "last" in timestamps:
+            game["timestamps"]["last"] = {
+                key: {name: last for name, last in zip(names, value) if last is not None} if key in counters else value
+                for key, value in timestamps["last"].items()
+            }
+    return game
+
+########### Rounds
+def parse_selection(game, selection):
+    #ranks can be given by index (0 is the König) or by their title,
+    #for the players by name or as a list in player id order
+    rank_index = rules.game_table(game).rank_index
+    if isinstance(selection, list):
+        names = get_names(game)
+        if len(selection) != len(names):
+            raise ValueError("Every player needs exactly one rank")
+        selection = dict(zip(names, selection))
+    parsed = dict()
+    for name, rank in selection.items():
+        if isinstance(rank, str):
+            try:
+                rank = rank_index[rank.strip()]
+            except KeyError:
+                raise ValueError(f"Unknown rank '{rank}'")
+        parsed[name] = rank
+    return parsed
+
+def validate_round(game, selection):
+    names = get_names(game)
+    if sorted(selection.keys()) != sorted(names):
+        raise ValueError("Every player needs exactly one rank")
+    if sorted(selection.values()) != list(range(len(names))):
+        raise ValueError("Every rank has to be assigned exactly once")
+
+def apply_round(game, selection):
+    #everything is validated before the first change, so a round is applied completely or not at all
+    selection = parse_selection(game, selection)
+    validate_round(game, selection)
+
+    table = rules.game_table(game)
+    table_dict = game["table-dict"]
+    game_history = game["game-history"]
+    points_development = game["points-development"]
+    for name in get_names(game):
+        table_dict[name][selection[name]] += 1
+        points_list = table_dict[name][:-1]
+        points = sum(count * table.points[i] for i, count in enumerate(points_list))
+        for counter, weight in table.counter_weights.items():
+            if game.get(counter):
+                points += weight * game[counter][name]
+        table_dict[name][-1] = points
+
+        game_history[name].append(len(points_list) - selection[name] - 1)
+        points_development[name].append(points)
+    game_history["x"].append(len(game_history["x"])+1)
+    points_development["x"].append(len(points_development["x"]))
+    return game
+
+########### Counters
+counters = ["handout-mistakes", "beer-count", "goiß-count"]
+
+def add_counter(game, counter, player):
+    if not game[counter]:
+        raise ValueError(f"'{counter}' is not counted in this game")
+    name = player_name(game, player)
+    weight = rules.game_table(game).counter_weights[counter]
+    game[counter][name] += 1
+    game["table-dict"][name][-1] += weight
+    game["points-development"][name][-1] += weight
+    return game
+
+########### Events
+#rounds and counter changes posted to the api are events:
+#{"type": "round", "ranks": [<rank of player 0>, ...]} or {"type": "beer-count", "player": <player id>},
+#with the players also given by name: {"type": "round", "ranks": {"<player>": <rank>, ...}}, {"type": "beer-count", "player": "<player>"}
+def apply_event(game, event):
+    if not isinstance(event, dict) or "type" not in event:
+        raise ValueError("Events need a 'type'")
+    if event["type"] == "round":
+        apply_round(game, event.get("ranks", dict()))
+    elif event["type"] in counters:
+        add_counter(game, event["type"], event.get("player"))
+    else:
+        raise ValueError(f"Unknown event type '{event['type']}'")
+    return add_timestamp(game, event)
+
+def apply_events(game, events):
+    #events of several devices, each one based on what its device had seen:
+    #counter events don't depend on each other and are always merged, a round is only applied
+    #if its device saw every round entered so far ("rounds"), otherwise it is rejected
+    applied = list()
+    rejected = list()
+    for event in events:
+        if not isinstance(event, dict) or event.get("game", game.get("game-id")) != game.get("game-id"):
+            rejected.append(event)
+            continue
+        rounds = len(game["game-history"]["x"])
+        if event.get("type") == "round" and event.get("rounds", rounds) != rounds:
+            rejected.append(event)
+            continue
+        try:
+            apply_event(game, event)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            rejected.append(event)
+            continue
+        game["version"] = game.get("version", 0) + 1
+        applied.append(event)
+    return applied, rejected
+
+########### Timestamps
+#whole seconds, every list holds the differences to the entry before it and its first entry the difference to "start":
+#{"start": <unix time>, "rounds": [...], "<counter>": {"<player>": [...]}, "last": {"rounds": <unix time>, "<counter>": {"<player>": <unix time>}}}
+#"last" is the time of the last entry of every list, so a new entry doesn't have to sum up the ones before it.
+#games from before the timestamps start at their first timed event, their "rounds" only cover the last rounds
+def new_timestamps(start):
+    return {"start": int(start), "rounds": list()}
+
+def event_time(event, start = None):
+    #the unix time in milliseconds the device queued the event at, never later than now and never before the start of the game.
+    #events without one (or with a device clock that is off) are stamped on arrival, the journal keeps the stamp so a replay gives the same times
+    now = int(time.time() * 1000)
+    try:
+        stamp = min(int(event["time"]), now)
+    except (KeyError, TypeError, ValueError):
+        stamp = now
+    if start is not None and stamp < start * 1000:
+        stamp = now
+    event["time"] = stamp
+    return stamp // 1000
+
+def add_timestamp(game, event):
+    seconds = event_time(event, (game.get("timestamps") or dict()).get("start"))
+    if not game.get("timestamps"):
+        game["timestamps"] = new_timestamps(seconds)
+    timestamps = game["timestamps"]
+    if event["type"] == "round":
+        lists = timestamps
+        key = "rounds"
+        last = timestamps.setdefault("last", dict())
+    else:
+        lists = timestamps.setdefault(event["type"], dict())
+        key = player_name(game, event["player"])
+        last = timestamps.setdefault("last", dict()).setdefault(event["type"], dict())
+    deltas = lists.setdefault(key, list())
+    if key not in last:
+        #saved before "last" was kept (or interned without it), summed up once
+        last[key] = timestamps["start"] + sum(deltas)
+    delta = max(seconds - last[key], 0)
+    deltas.append(delta)
+    last[key] += delta
+    return game
+
+def decode_times(timestamps, deltas):
+    #the unix times of a delta encoded list
+    times = list()
+    current = timestamps["start"]
+    for delta in deltas:
+        current += delta
+        times.append(current)
+    return times
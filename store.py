@@ -0,0 +1,202 @@
+import collections
+import contextlib
+import copy
+import os
+import threading
+
+import journal
+import scoring
+
+max_seen_events = 10000
+max_cached_games = int(os.environ.get("STORE_MAX_GAMES", 1000))
+
+########### Game store
+#games driven through the api and the ui live here, every change increases the version of the game.
+#changes are computed on a copy without any lock and only committed if nobody else committed in the
+#meantime (optimistic concurrency), otherwise they are computed again on the newer game.
+#the lock of a game only guards that compare-and-swap, so different games never wait for each other.
+#with a journal the journal is the shared state of all processes: the compare-and-swap also holds the game's flock
+#and first reads what other processes appended, the games in memory are only a cache of the recently used ones
+class Conflict(Exception):
+    pass
+
+class Unknown(KeyError):
+    #no game with that id. a KeyError, but one raised by a broken game or event is not mistaken for it
+    pass
+
+class Entry:
+    def __init__(self, game, position = None):
+        #the stored game is never changed in place, a commit swaps in a new (game, version) tuple
+        self.state = (game, game.get("version", 0)) if game is not None else (None, None)
+        self.seen = collections.OrderedDict()
+        self.position = position
+        self.lock = threading.Lock()
+
+def event_id(event):
+    #events without an id can't be recognized again and are always applied
+    if isinstance(event, dict) and isinstance(event.get("id"), (str, int)):
+        return event["id"]
+    return None
+
+def unseen(entry, events):
+    pending = list()
+    ids = set()
+    for event in events:
+        key = event_id(event)
+        if key is not None and (key in entry.seen or key in ids):
+            continue
+        ids.add(key)
+        pending.append(event)
+    return pending
+
+class GameStore:
+    def __init__(self, journal = None, max_seen = max_seen_events, max_games = max_cached_games):
+        self.games = collections.OrderedDict()
+        self.journal = journal
+        self.max_seen = max_seen
+        self.max_games = max_games
+        self.lock = threading.Lock()
+        #called with (game id, version) after every change, e.g. to wake up waiting spectators
+        self.listeners = list()
+
+    def notify(self, game_id, version):
+        for listener in self.listeners:
+            listener(game_id, version)
+
+    def cache(self, game_id, entry):
+        #the least recently used games are dropped, with a journal they are read again on their next use
+        with self.lock:
+            self.games[game_id] = entry
+            self.games.move_to_end(game_id)
+            if self.journal is not None:
+                while len(self.games) > self.max_games:
+                    self.games.popitem(last = False)
+
+    def entry(self, game_id):
+        with self.lock:
+            entry = self.games.get(game_id)
+            if entry is not None:
+                self.games.move_to_end(game_id)
+        if entry is None and self.journal is not None:
+            entry = Entry(None)
+            with entry.lock:
+                self.refresh(game_id, entry)
+            if entry.state[0] is not None and entry.state[0].get("game-id") == game_id:
+                with self.lock:
+                    entry = self.games.setdefault(game_id, entry)
+                self.cache(game_id, entry)
+            else:
+                entry = None
+        if entry is None:
+            raise Unknown(game_id)
+        return entry
+
+    def refresh(self, game_id, entry):
+        #call with entry.lock held: applies what other processes appended to the journal since this one last read it
+        if self.journal is None:
+            return
+        game, position, ids, reset = self.journal.read(game_id, entry.state[0], entry.position)
+        if game is None:
+            raise Unknown(game_id)
+        if reset:
+            entry.seen = collections.OrderedDict()
+        if game is not entry.state[0]:
+            entry.state = (game, game.get("version", 0))
+        entry.position = position
+        self.remember(entry, ids)
+
+    def remember(self, entry, ids):
+        for key in ids:
+            entry.seen[key] = True
+            entry.seen.move_to_end(key)
+        while len(entry.seen) > self.max_seen:
+            entry.seen.popitem(last = False)
+
+    def locked(self, game_id):
+        return self.journal.locked(game_id) if self.journal is not None else contextlib.nullcontext()
+
+    def create(self, game):
+        #a game created with a taken id gets a new one instead of replacing the other.
+        #with a journal the id is taken when another process or an earlier run created it
+        game.setdefault("version", 0)
+        entry = Entry(game)
+        game_id = game.get("game-id")
+        with entry.lock:
+            while True:
+                if not game_id:
+                    game_id = game["game-id"] = scoring.new_game_id()
+                if self.journal is not None:
+                    entry.position = self.journal.create(game)
+                    if entry.position is not None:
+                        self.cache(game_id, entry)
+                        break
+                else:
+                    #setdefault is atomic, so two threads can't take the same id
+                    with self.lock:
+                        if self.games.setdefault(game_id, entry) is entry:
+                            break
+                game_id = None
+        return game_id, entry.state[1]
+
+    def version(self, game_id):
+        #the current version without copying the game, for polling
+        entry = self.entry(game_id)
+        with entry.lock:
+            self.refresh(game_id, entry)
+            return entry.state[1]
+
+    def get(self, game_id):
+        entry = self.entry(game_id)
+        with entry.lock:
+            self.refresh(game_id, entry)
+            game, version = entry.state
+        return copy.deepcopy(game), version
+
+    def update(self, game_id, event, expected = None):
+        #a failing event leaves the stored game untouched, with an expected version a newer game is a conflict
+        entry = self.entry(game_id)
+        while True:
+            with entry.lock:
+                self.refresh(game_id, entry)
+                state = entry.state
+            game, version = state
+            if expected is not None and version != expected:
+                raise Conflict(f"Game '{game_id}' is at version {version}, not {expected}")
+            game = scoring.apply_event(copy.deepcopy(game), event)
+            game["version"] = version + 1
+            with entry.lock, self.locked(game_id):
+                self.refresh(game_id, entry)
+                if entry.state is not state:
+                    continue
+                entry.state = (game, version + 1)
+                if self.journal is not None:
+                    entry.position = self.journal.append(game, [event], entry.position, list(entry.seen))
+            self.notify(game_id, version + 1)
+            return copy.deepcopy(game), version + 1
+
+    def commit(self, game_id, events):
+        #events from the devices' sync queues, their ids make a replayed queue count only once.
+        #returns the game, its version and the applied and rejected events, events seen before are in neither
+        entry = self.entry(game_id)
+        while True:
+            with entry.lock:
+                self.refresh(game_id, entry)
+                state = entry.state
+                pending = unseen(entry, events)
+            if not pending:
+                return copy.deepcopy(state[0]), state[1], list(), list()
+            game = copy.deepcopy(state[0])
+            applied, rejected = scoring.apply_events(game, pending)
+            with entry.lock, self.locked(game_id):
+                self.refresh(game_id, entry)
+                if entry.state is not state:
+                    continue
+                entry.state = (game, game["version"])
+                self.remember(entry, [event_id(event) for event in pending if event_id(event) is not None])
+                if self.journal is not None:
+                    entry.position = self.journal.append(game, applied, entry.position, list(entry.seen))
+            if applied:
+                self.notify(game_id, game["version"])
+            return copy.deepcopy(game), game["version"], applied, rejected
+
+games = GameStore(journal.journal)
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+#the modules read their directories at import, so the tests point them somewhere temporary first
+test_dir = tempfile.mkdtemp(prefix = "arschloch-stats-tests-")
+for name in ["JOURNAL_DIR", "ARCHIVE_DIR", "AUDIT_DIR", "REPORT_DIR"]:
+    os.environ[name] = os.path.join(test_dir, name.split("_")[0].lower())
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import headtohead
+import scoring
+import transitions
+
+def history(rounds):
+    game = scoring.new_game(["Anna", "Ben", "Carl"])
+    for i in range(rounds):
+        scoring.apply_event(game, {"type": "round", "ranks": [i % 3, (i + 1) % 3, (i + 2) % 3]})
+    return game["game-history"]
+
+def test_cached_game_statistics_match_a_fresh_build():
+    for rounds in [3, 7, 12]:
+        cached = headtohead.game_matrix(history(rounds), "aggregatescached")
+        assert cached.table() == headtohead.game_matrix(history(rounds)).table()
+        ranks = scoring.get_ranks(["Anna", "Ben", "Carl"])
+        cached = transitions.game_transitions(history(rounds), ranks, "aggregatescached")
+        assert cached.table() == transitions.game_transitions(history(rounds), ranks).table()
+
+def test_a_changed_history_is_built_again():
+    game_history = history(6)
+    headtohead.game_matrix(game_history, "aggregateschanged")
+    changed = {key: list(reversed(values)) if key != "x" else values for key, values in game_history.items()}
+    assert headtohead.game_matrix(changed, "aggregateschanged").table() == headtohead.game_matrix(changed).table()
+
+def test_callers_get_a_copy():
+    matrix = headtohead.game_matrix(history(4), "aggregatescopy")
+    matrix.wins[0][1] += 100
+    assert headtohead.game_matrix(history(4), "aggregatescopy").wins[0][1] == matrix.wins[0][1] - 100
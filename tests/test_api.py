@@ -0,0 +1,73 @@
+import pytest
+
+import archive
+import scoring
+import uploads
+
+@pytest.fixture
+def client():
+    import application
+    return application.server.test_client()
+
+def saved_game(game_id):
+    game = scoring.new_game(["Anna", "Ben"])
+    game["game-id"] = game_id
+    return game
+
+def test_posted_games_are_only_archived_when_asked(client):
+    assert client.post("/api/v1/games", json = {"game": saved_game("apiposted")}).status_code == 201
+    with pytest.raises(FileNotFoundError):
+        archive.load_game("apiposted")
+    assert client.post("/api/v1/games", json = {"game": saved_game("apiimported"), "archive": True}).status_code == 201
+    assert archive.load_game("apiimported")["game-id"] == "apiimported"
+
+def test_only_dash_callbacks_have_the_upload_size_limit(client, monkeypatch):
+    monkeypatch.setattr(uploads, "max_request_bytes", 100)
+    body = {"players": ["Anna", "Ben"], "padding": "x" * 200}
+    assert client.post("/api/v1/games", json = body).status_code == 201
+    assert client.post("/_dash-update-component", json = body).status_code == 413
+
+def test_broken_games_are_not_reported_as_unknown(client, monkeypatch):
+    import store
+    store.games.create(saved_game("apibroken"))
+    def broken(game, event):
+        raise KeyError("points-development")
+    monkeypatch.setattr(scoring, "apply_event", broken)
+    event = {"type": "goiß-count", "player": "Anna"}
+    assert client.post("/api/v1/games/apibroken/events", json = event).status_code == 400
+    assert client.post("/api/v1/games/apimissing/events", json = event).status_code == 404
+
+def poll(client, game_id, version):
+    return client.post("/_dash-update-component", json = {
+        "output": "server-version.data",
+        "outputs": {"id": "server-version", "property": "data"},
+        "inputs": [{"id": "sync-interval", "property": "n_intervals", "value": 1}],
+        "changedPropIds": ["sync-interval.n_intervals"],
+        "state": [
+            {"id": "game-id", "property": "children", "value": game_id},
+            {"id": "game-version", "property": "children", "value": version}
+        ]
+    })
+
+def test_the_sync_interval_only_polls_the_version(client):
+    import store
+    store.games.create(saved_game("apipolled"))
+    assert poll(client, "apipolled", "0").status_code == 204
+    store.games.update("apipolled", {"type": "goiß-count", "player": "Anna"})
+    assert poll(client, "apipolled", "0").get_json()["response"]["server-version"]["data"] == 1
+    assert poll(client, "apimissing", "0").get_json()["response"]["server-version"]["data"] is None
+
+def test_posted_rounds_need_a_valid_game(client):
+    game = saved_game("apiround")
+    assert client.post("/api/v1/rounds", json = {"game": game, "ranks": [0, 1]}).status_code == 200
+    game["table-dict"]["Anna"] = [0]
+    response = client.post("/api/v1/rounds", json = {"game": game, "ranks": [0, 1]})
+    assert response.status_code == 400 and response.get_json()["error"].startswith("Invalid game data")
+    assert client.post("/api/v1/rounds", json = {"game": [1], "ranks": [0, 1]}).status_code == 400
+
+def test_projected_rounds_are_checked(client):
+    import store
+    store.games.create(saved_game("apiprojected"))
+    for rounds in [-5, 10 ** 6, "x"]:
+        assert client.get(f"/api/v1/games/apiprojected/projection?rounds={rounds}&budget=0").status_code == 400
+    assert client.get("/api/v1/games/apiprojected/projection?rounds=0&budget=0").get_json()["rounds"] == 0
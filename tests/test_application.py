@@ -0,0 +1,34 @@
+import json
+
+import application
+import scoring
+
+def played_game():
+    game = scoring.new_game(["D'Art", "2", "Anna"], handout_mistakes = False)
+    game["game-id"] = "applicationstate"
+    scoring.apply_event(game, {"type": "round", "ranks": [2, 0, 1]})
+    scoring.apply_event(game, {"type": "beer-count", "player": 1})
+    return game
+
+def page_state(game):
+    divs = application.state_divs(game)
+    state = [divs[div] for div in ["game-players", "table-dict", "game-history", "points-development", *scoring.counters]]
+    return state + [game["game-id"], json.dumps(game["rules"]), str(game["version"]), divs["game-timestamps"]]
+
+def test_the_page_keeps_the_game_interned():
+    game = played_game()
+    divs = application.state_divs(game)
+    assert json.loads(divs["game-players"]) == ["D'Art", "2", "Anna"]
+    assert json.loads(divs["beer-count"]) == {"beer-count": [0, 1, 0]}
+    assert json.loads(divs["handout-mistakes"]) == {"handout-mistakes": None}
+    #the names are only in game-players
+    assert all("Anna" not in divs[div] for div in application.state_parts)
+    assert application.parse_game(*page_state(game)) == game
+
+def test_snapshots_from_before_are_restored():
+    #ten name-keyed divs without game-players
+    game = played_game()
+    legacy = [json.dumps(game[key]) for key in ["table-dict", "game-history", "points-development", *scoring.counters]]
+    legacy += [game["game-id"], json.dumps(game["rules"]), str(game["version"]), json.dumps(game["timestamps"])]
+    assert application.snapshot_game(legacy) == game
+    assert application.snapshot_game(page_state(game)) == game
@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+import asgi
+import scoring
+import store
+
+def scope(path, query = b""):
+    return {"type": "http", "method": "GET", "path": path, "query_string": query, "headers": list()}
+
+async def call(path, query = b""):
+    messages = list()
+    async def receive():
+        await asyncio.sleep(3600)
+    async def send(message):
+        messages.append(message)
+    await asgi.server(scope(path, query), receive, send)
+    return messages
+
+def test_polling_leaves_no_waiters_behind(monkeypatch):
+    #the app keeps the loop it first ran in, every test runs its own
+    monkeypatch.setattr(asgi, "loop", None)
+    game_id, version = store.games.create(scoring.new_game(["Anna", "Ben"]))
+    async def polls():
+        missing = await asyncio.gather(*[call(f"/async/v1/games/missing{i}/poll") for i in range(20)])
+        idle = await call(f"/async/v1/games/{game_id}/poll", b"version=0&timeout=0.05")
+        return missing, idle
+    missing, idle = asyncio.run(polls())
+    assert {messages[0]["status"] for messages in missing} == {404}
+    assert idle[0]["status"] == 304
+    assert asgi.waiters == dict()
+
+def test_a_poll_answers_on_the_next_change(monkeypatch):
+    monkeypatch.setattr(asgi, "loop", None)
+    game_id, version = store.games.create(scoring.new_game(["Anna", "Ben"]))
+    async def poll():
+        async def change():
+            await asyncio.sleep(0.05)
+            await asgi.loop.run_in_executor(None, store.games.update, game_id, {"type": "beer-count", "player": "Anna"})
+        messages, changed = await asyncio.gather(call(f"/async/v1/games/{game_id}/poll", b"version=0&timeout=5"), change())
+        return messages
+    messages = asyncio.run(poll())
+    assert messages[0]["status"] == 200 and json.loads(messages[1]["body"])["version"] == 1
+    assert asgi.waiters == dict()
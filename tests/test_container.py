@@ -0,0 +1,144 @@
+import base64
+import fcntl
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+import container
+import scoring
+import uploads
+
+built = dict()
+
+def game(game_id, rounds = 1):
+    #built once, the timestamps of a second build could differ
+    if (game_id, rounds) not in built:
+        game = scoring.new_game(["Anna", "Ben", "Carl"])
+        game["game-id"] = game_id
+        for i in range(rounds):
+            scoring.apply_event(game, {"type": "round", "ranks": [i % 3, (i + 1) % 3, (i + 2) % 3]})
+        built[game_id, rounds] = json.dumps(game)
+    return json.loads(built[game_id, rounds])
+
+def test_saved_games_are_read_back(tmp_path):
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    archive.append([game("a"), game("b")])
+    archive.append([game("a", rounds = 3)])
+    assert archive.get("a") == game("a", rounds = 3)
+    assert [saved["game-id"] for saved in archive.current()] == ["b", "a"]
+    reopened = container.ArchiveFile(archive.path)
+    assert reopened.get("b") == game("b")
+    with pytest.raises(KeyError):
+        reopened.get("c")
+
+def test_an_interrupted_append_is_cut_off(tmp_path):
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    archive.append([game("a")])
+    size = os.path.getsize(archive.path)
+    with open(archive.path, "ab") as wd:
+        wd.write(container.frame_header.pack(b"G", 1000) + b"{\"game-id\"")
+    reopened = container.ArchiveFile(archive.path)
+    assert reopened.get("a") == game("a")
+    reopened.append([game("b")])
+    assert container.ArchiveFile(archive.path).get("b") == game("b")
+    assert os.path.getsize(archive.path) > size
+
+def append_games(path, worker, count):
+    archive = container.ArchiveFile(path)
+    for i in range(count):
+        archive.append([game(f"{worker}-{i}")])
+
+def test_appends_of_several_processes_are_all_kept(tmp_path):
+    path = str(tmp_path / "games.archive")
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target = append_games, args = (path, worker, 20)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert len(container.ArchiveFile(path).current()) == 80
+
+def index_archive(index):
+    data = json.dumps(index).encode("utf-8")
+    return container.magic + container.frame_header.pack(b"I", len(data)) + data + container.footer.pack(len(container.magic), container.footer_magic)
+
+@pytest.mark.parametrize("index", [
+    {"previous": None, "games": {}},
+    {"previous": None, "full": True, "games": {"a": 5}},
+    {"previous": None, "full": True, "games": {"a": [8, 100000, 0]}},
+    {"previous": "8", "full": False, "games": {}},
+    {"previous": 3, "full": False, "games": {}},
+    [1, 2]
+])
+def test_malformed_indexes_are_container_errors(index):
+    with pytest.raises(container.ContainerError):
+        container.open_bytes(index_archive(index))
+
+def test_malformed_uploaded_archives_are_invalid_game_data():
+    for data in [index_archive({"previous": None, "games": {}}), container.magic + b"\x00" * 20]:
+        with pytest.raises(ValueError):
+            uploads.parse_game(base64.b64encode(data).decode("ascii"))
+    frame = b"[1, 2]"
+    data = container.magic + container.frame_header.pack(b"G", len(frame)) + frame
+    index = json.dumps({"previous": None, "full": True, "games": {"a": [len(container.magic) + container.frame_header.size, len(frame), 0]}}).encode("utf-8")
+    data += container.frame_header.pack(b"I", len(index)) + index + container.footer.pack(len(container.magic) + container.frame_header.size + len(frame), container.footer_magic)
+    with pytest.raises(ValueError):
+        uploads.parse_game(base64.b64encode(data).decode("ascii"))
+
+def test_an_uploaded_archive_opens_its_last_saved_game(tmp_path):
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    archive.append([scoring.intern_game(game("a", rounds = 2)), scoring.intern_game(game("b", rounds = 4))])
+    with open(archive.path, "rb") as rd:
+        content = base64.b64encode(rd.read()).decode("ascii")
+    assert uploads.parse_game(content)["game-id"] == "b"
+
+def test_superseded_copies_are_compacted_away(tmp_path, monkeypatch):
+    monkeypatch.setattr(container, "min_compaction", 0)
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    reader = container.ArchiveFile(archive.path)
+    archive.append([game("b")])
+    assert reader.get("b") == game("b")
+    for rounds in range(1, 30):
+        archive.append([game("a", rounds = rounds)])
+    assert os.path.getsize(archive.path) < 3 * archive.current().live
+    assert reader.get("a") == game("a", rounds = 29) and reader.get("b") == game("b")
+    monkeypatch.setattr(container, "min_compaction", 1024 * 1024)
+    archive.append([game("a", rounds = 30)])
+    archive.append([game("a", rounds = 31)])
+    size = os.path.getsize(archive.path)
+    compacted = archive.compact()
+    assert os.path.getsize(archive.path) < size and compacted.chain == 0
+    assert [saved["game-id"] for saved in container.ArchiveFile(archive.path).current()] == ["b", "a"]
+
+def test_the_index_chain_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(container, "max_chain", 4)
+    monkeypatch.setattr(container, "min_checkpoint", 1000)
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    for i in range(20):
+        assert archive.append([game(str(i))]).chain <= 4
+    assert len(container.ArchiveFile(archive.path).current()) == 20
+
+def test_readers_wait_for_an_append_in_progress(tmp_path, monkeypatch):
+    archive = container.ArchiveFile(str(tmp_path / "games.archive"))
+    archive.append([game("a")])
+    size = os.path.getsize(archive.path)
+    def recover(self):
+        raise AssertionError("a reader saw half an append")
+    monkeypatch.setattr(container.Container, "recover", recover)
+    reader = container.ArchiveFile(archive.path)
+    with open(archive.path, "ab") as wd:
+        fcntl.flock(wd.fileno(), fcntl.LOCK_EX)
+        wd.write(container.frame_header.pack(b"G", 1000) + b"{")
+        wd.flush()
+        thread = threading.Thread(target = reader.current)
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        wd.truncate(size)
+        fcntl.flock(wd.fileno(), fcntl.LOCK_UN)
+    thread.join()
+    assert reader.get("a") == game("a")
@@ -0,0 +1,39 @@
+import figures
+import scoring
+
+def long_game(rounds):
+    game = scoring.new_game(["Anna", "Ben", "Carl"])
+    for i in range(rounds):
+        scoring.apply_event(game, {"type": "round", "ranks": [i % 3, (i + 1) % 3, (i + 2) % 3]})
+    return game
+
+def test_the_first_history_render_holds_the_last_rounds_unchanged():
+    game = long_game(800)
+    figure = figures.game_history_figure(game["table-dict"], game["game-history"])
+    assert list(figure.layout.xaxis.range) == [794, 800.5]
+    for trace in figure.data:
+        x = list(trace.x)
+        assert x == list(range(x[0], 801)) and x[0] <= 794
+        assert list(trace.y) == game["game-history"][trace.name][x[0] - 1:]
+
+def test_a_short_history_is_shown_whole():
+    game = long_game(4)
+    figure = figures.game_history_figure(game["table-dict"], game["game-history"])
+    assert [list(trace.x) for trace in figure.data] == [[1, 2, 3, 4]] * 3
+
+def test_a_zoomed_out_history_is_downsampled():
+    game = long_game(800)
+    figure = figures.game_history_figure(game["table-dict"], game["game-history"], budget = 100, x_range = [0, 800])
+    assert all(len(trace.x) == 100 for trace in figure.data)
+
+def test_reports_keep_every_round():
+    game = long_game(800)
+    figure = figures.game_history_figure(game["table-dict"], game["game-history"], budget = None)
+    assert all(len(trace.x) == 800 for trace in figure.data)
+
+def test_a_history_within_the_budget_keeps_every_round():
+    #there is no zoom callback below the budget, panning back has to find the earlier rounds in the figure
+    game = long_game(30)
+    figure = figures.game_history_figure(game["table-dict"], game["game-history"])
+    assert list(figure.layout.xaxis.range) == [24, 30.5]
+    assert [list(trace.x) for trace in figure.data] == [list(range(1, 31))] * 3
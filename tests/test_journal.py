@@ -0,0 +1,51 @@
+import os
+import time
+
+import pytest
+
+import journal
+import scoring
+import store
+
+def new_store(directory, **kwargs):
+    return store.GameStore(journal.Journal(str(directory), **kwargs))
+
+def beer(event_id, player):
+    return {"id": event_id, "type": "beer-count", "player": player}
+
+def test_a_recovered_game_knows_the_events_it_applied(tmp_path):
+    games = new_store(tmp_path)
+    game_id, version = games.create(scoring.new_game(["Anna", "Ben"]))
+    games.commit(game_id, [beer("first", 0), beer("second", 1)])
+    #a restarted process only has the snapshot and the journal
+    game, version, applied, rejected = new_store(tmp_path).commit(game_id, [beer("second", 1), beer("third", 1)])
+    assert version == 3 and len(applied) == 1
+    assert game["beer-count"] == {"Anna": 1, "Ben": 2}
+
+def test_a_compacted_journal_keeps_the_ids_of_the_events_before(tmp_path):
+    games = new_store(tmp_path, compact = 2)
+    game_id, version = games.create(scoring.new_game(["Anna", "Ben"]))
+    games.commit(game_id, [beer("first", 0)])
+    games.commit(game_id, [beer("second", 1)])
+    game, position, ids, reset = journal.read(game_id, directory = str(tmp_path))
+    assert position.base == 2 and ids == ["first", "second"]
+    game, version, applied, rejected = new_store(tmp_path, compact = 2).commit(game_id, [beer("first", 0), beer("second", 1)])
+    assert version == 2 and not applied
+    assert game["beer-count"] == {"Anna": 1, "Ben": 1}
+
+def test_old_games_are_pruned(tmp_path):
+    log = journal.Journal(str(tmp_path))
+    games = store.GameStore(log)
+    old_id, version = games.create(scoring.new_game(["Anna", "Ben"]))
+    new_id, version = games.create(scoring.new_game(["Carl", "Dora"]))
+    games.commit(old_id, [beer("first", 0)])
+    with log.locked(old_id):
+        pass
+    past = time.time() - 10 * 24 * 3600
+    for path in [journal.snapshot_path(old_id, str(tmp_path)), journal.log_path(old_id, str(tmp_path))]:
+        os.utime(path, (past, past))
+    assert log.prune(age = 24 * 3600) == [old_id]
+    assert not any(name.startswith(old_id) for name in os.listdir(tmp_path))
+    with pytest.raises(KeyError):
+        games.get(old_id)
+    assert games.get(new_id)[1] == 0
@@ -0,0 +1,27 @@
+import projection
+import scoring
+
+def played_game():
+    game = scoring.new_game(["Anna", "Ben", "Carl"])
+    scoring.apply_event(game, {"type": "round", "ranks": [0, 1, 2]})
+    return game
+
+def test_a_projection_without_time_still_simulates():
+    for budget in [0, -5, float("nan")]:
+        result = projection.project(played_game(), 5, budget = budget, workers = 1)
+        assert result["simulations"] >= projection.batch_size
+        assert abs(sum(row["win-probability"] for row in result["projection"]) - 1) < 1e-9
+
+def test_late_workers_still_run_a_batch():
+    result = projection.project(played_game(), 5, budget = 0, workers = 2)
+    assert result["simulations"] >= 2 * projection.batch_size
+
+def test_rounds_are_capped():
+    result = projection.project(played_game(), 10 ** 9, budget = 0, workers = 1)
+    assert result["rounds"] == projection.max_rounds
+    result = projection.project(played_game(), -5, budget = 0, workers = 1)
+    assert result["rounds"] == 0
+
+def test_a_finished_game_is_final():
+    result = projection.project(played_game(), 0, budget = 0, workers = 1)
+    assert result["simulations"] == 1 and result["projection"][0]["win-probability"] == 1
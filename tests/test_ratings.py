@@ -0,0 +1,28 @@
+import pytest
+
+import ratings
+import scoring
+
+def test_the_deltas_of_a_round_sum_to_zero():
+    table = {"Anna": 1100.0, "Ben": 1000.0}
+    rounds = dict()
+    ratings.update_ratings(table, rounds, ["Ben", "Carl", "Anna"], 32, 1000.0)
+    assert sum(table.values()) == pytest.approx(1100 + 1000 + 1000)
+    assert rounds == {"Ben": 1, "Carl": 1, "Anna": 1}
+    assert table["Ben"] > 1000 and table["Anna"] < 1100
+
+def test_the_winner_gains_what_the_loser_loses():
+    table = dict()
+    ratings.update_ratings(table, dict(), ["Anna", "Ben", "Carl"], 32, 1000.0)
+    #equal players: every duel is worth k / (n - 1) / 2
+    assert table == pytest.approx({"Anna": 1016, "Ben": 1000, "Carl": 984})
+
+def test_archive_ratings_replay_every_round():
+    game = scoring.new_game(["Anna", "Ben"])
+    for ranks in [[0, 1], [0, 1], [1, 0]]:
+        scoring.apply_event(game, {"type": "round", "ranks": ranks})
+    totals = ratings.Ratings(k = 32)
+    totals.recompute([game, {"game-history": None}])
+    assert [row["player"] for row in totals.table()] == ["Anna", "Ben"]
+    assert totals.table()[0]["rounds"] == 3
+    assert totals.rating("Anna") + totals.rating("Ben") == pytest.approx(2000)
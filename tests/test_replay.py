@@ -0,0 +1,31 @@
+import replay
+import scoring
+
+def played_game(game_id, rounds):
+    game = scoring.new_game(["Anna", "Ben", "Carl"])
+    game["game-id"] = game_id
+    for i in range(rounds):
+        scoring.apply_event(game, {"type": "round", "ranks": [i % 3, (i + 1) % 3, (i + 2) % 3]})
+    return game
+
+def test_a_round_view_of_an_evicted_replay_is_still_rendered(monkeypatch):
+    monkeypatch.setattr(replay, "max_cached_replays", 1)
+    game = played_game("replayevicted", 10)
+    game_replay = replay.get_replay(game, 10)
+    replay.get_replay(played_game("replayother", 3), 3)
+    assert ("replayevicted", 10) not in replay.replays
+    state, figs = replay.round_view(game_replay, "replayevicted", 10, 4)
+    assert state["rounds"] == 4 and state["game-history"]["x"] == [1, 2, 3, 4]
+    assert replay.round_view(game_replay, "replayevicted", 10, 4)[1] is figs
+
+def test_round_views_are_limited_by_their_points(monkeypatch):
+    monkeypatch.setattr(replay, "views", replay.collections.OrderedDict())
+    monkeypatch.setattr(replay, "views_points", 0)
+    monkeypatch.setattr(replay, "max_cached_points", 2000)
+    game = played_game("replaypoints", 60)
+    game_replay = replay.get_replay(game, 60)
+    for k in range(0, 61, 5):
+        replay.round_view(game_replay, "replaypoints", 60, k)
+    assert replay.views_points <= 2000 or len(replay.views) == 1
+    assert replay.views_points == sum(points for state, figs, points in replay.views.values())
+    assert ("replaypoints", 60, 60) in replay.views
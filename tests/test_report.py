@@ -0,0 +1,51 @@
+import os
+import time
+
+import report
+import scoring
+
+def wait(queue, job_id):
+    for i in range(500):
+        status = queue.status(job_id)
+        if status != "running":
+            return status
+        time.sleep(0.01)
+    return status
+
+def test_another_worker_sees_the_finished_report():
+    #two queues are two gunicorn workers, they only share the report directory
+    game = scoring.new_game(["Anna", "Ben"])
+    scoring.apply_event(game, {"type": "round", "ranks": [0, 1]})
+    job_id = report.ReportQueue().submit(game)
+    other = report.ReportQueue()
+    assert wait(other, job_id) == "done"
+    with open(other.path(job_id), encoding = "utf-8") as rd:
+        assert "Anna" in rd.read()
+
+def test_a_failed_report_is_failed_everywhere():
+    job_id = report.ReportQueue().submit({"table-dict": None})
+    assert wait(report.ReportQueue(), job_id) == "failed"
+    assert report.ReportQueue().path(job_id) is None
+
+def test_unknown_and_abandoned_jobs():
+    queue = report.ReportQueue()
+    assert queue.status("../../etc/passwd") == "unknown"
+    assert queue.status("0" * 32) == "unknown"
+    os.makedirs(report.report_dir, exist_ok = True)
+    path = f"{report.report_path('1' * 32)}.tmp"
+    open(path, "w").close()
+    assert queue.status("1" * 32) == "running"
+    os.utime(path, (0, 0))
+    assert queue.status("1" * 32) == "failed"
+
+def test_only_the_newest_jobs_are_kept(monkeypatch):
+    monkeypatch.setattr(report, "max_jobs", 2)
+    queue = report.ReportQueue()
+    game = scoring.new_game(["Anna", "Ben"])
+    jobs = list()
+    for i in range(4):
+        jobs.append(queue.submit(game))
+        assert wait(queue, jobs[-1]) == "done"
+    queue.prune()
+    assert [queue.status(job_id) for job_id in jobs[-2:]] == ["done", "done"]
+    assert queue.status(jobs[0]) == "unknown"
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+import scoring
+
+def played_game():
+    game = scoring.new_game(["Anna", "2", "D'Art"], beer_count = False)
+    scoring.apply_event(game, {"type": "round", "ranks": [2, 0, 1]})
+    scoring.apply_event(game, {"type": "round", "ranks": {"Anna": 0, "2": 1, "D'Art": 2}})
+    scoring.apply_event(game, {"type": "goiß-count", "player": 2})
+    scoring.apply_event(game, {"type": "handout-mistakes", "player": "2"})
+    return game
+
+def test_events_refer_to_players_by_id_or_name():
+    game = played_game()
+    assert scoring.get_names(game) == ["Anna", "2", "D'Art"]
+    assert game["table-dict"]["Anna"][:3] == [1, 0, 1]
+    assert game["table-dict"]["D'Art"][:3] == [0, 1, 1]
+    assert game["goiß-count"] == {"Anna": 0, "2": 0, "D'Art": 1}
+    assert game["handout-mistakes"]["2"] == 1
+    assert scoring.player_name(game, 1) == "2"
+    for player in [3, -1, True, "Ranks", "Carl"]:
+        with pytest.raises(ValueError):
+            scoring.player_name(game, player)
+
+def test_interned_games_round_trip():
+    game = played_game()
+    interned = scoring.intern_game(game)
+    assert interned["players"] == ["Anna", "2", "D'Art"]
+    assert interned["game-history"] == [game["game-history"][name] for name in ["Anna", "2", "D'Art"]]
+    assert interned["beer-count"] is None
+    assert "game-history-x" not in interned and "points-development-x" not in interned
+    assert scoring.extern_game(interned) == game
+    assert list(scoring.extern_game(interned)["table-dict"]) == ["Ranks", "Anna", "2", "D'Art"]
+
+def test_interned_games_keep_other_x_values():
+    game = played_game()
+    game["game-history"]["x"] = [4, 7]
+    interned = scoring.intern_game(game)
+    assert interned["game-history-x"] == [4, 7]
+    assert scoring.extern_game(interned) == game
+
+def test_game_dicts_are_externed_as_they_are():
+    game = played_game()
+    assert scoring.extern_game(game) is game
+
+@pytest.mark.parametrize("change", [
+    lambda game: game.update({"rules": {"points": {"3": [1, 2]}}}),
+    lambda game: game.update({"rules": "Default"}),
+    lambda game: game.update({"version": "3"}),
+    lambda game: game.update({"version": -1}),
+    lambda game: game["game-history"]["Anna"].__setitem__(0, "König"),
+    lambda game: game["game-history"]["Anna"].__setitem__(0, 7),
+    lambda game: game["points-development"]["Anna"].__setitem__(1, None),
+    lambda game: [game["points-development"][key].pop() for key in game["points-development"]],
+    lambda game: game["goiß-count"].__setitem__("Anna", -1)
+])
+def test_invalid_games_are_rejected(change):
+    game = played_game()
+    scoring.validate_game(game)
+    change(game)
+    with pytest.raises(ValueError):
+        scoring.validate_game(game)
+
+def test_event_times_before_the_start_are_stamped_on_arrival():
+    game = played_game()
+    start = game["timestamps"]["start"]
+    event = {"type": "round", "ranks": [0, 1, 2], "time": (start - 3600) * 1000}
+    scoring.apply_event(game, event)
+    assert event["time"] >= start * 1000
+    assert game["timestamps"]["rounds"][-1] >= 0
+
+def timed_game(start):
+    game = scoring.new_game(["Anna", "2", "D'Art"])
+    game["timestamps"] = scoring.new_timestamps(start)
+    scoring.apply_event(game, {"type": "round", "ranks": [2, 0, 1], "time": start * 1000})
+    scoring.apply_event(game, {"type": "goiß-count", "player": 2, "time": (start + 1) * 1000})
+    return game
+
+def test_timestamps_keep_the_time_of_their_last_entry():
+    start = int(time.time()) - 100
+    game = timed_game(start)
+    for seconds in [5, 2, 30]:
+        scoring.apply_event(game, {"type": "round", "ranks": [0, 1, 2], "time": (start + seconds) * 1000})
+    timestamps = game["timestamps"]
+    assert timestamps["last"]["rounds"] == start + sum(timestamps["rounds"]) == start + 30
+    assert timestamps["rounds"][-3:] == [5, 0, 25]
+    assert timestamps["last"]["goiß-count"]["D'Art"] == start + sum(timestamps["goiß-count"]["D'Art"])
+
+def test_timestamps_without_last_times_are_summed_up_once():
+    start = int(time.time()) - 100
+    game = timed_game(start)
+    del game["timestamps"]["last"]
+    scoring.apply_event(game, {"type": "round", "ranks": [0, 1, 2], "time": (start + 10) * 1000})
+    assert game["timestamps"]["last"]["rounds"] == start + sum(game["timestamps"]["rounds"]) == start + 10
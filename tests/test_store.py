@@ -0,0 +1,120 @@
+import json
+import multiprocessing
+
+import pytest
+
+import journal
+import scoring
+import store
+
+def new_store(directory, **kwargs):
+    return store.GameStore(journal.Journal(str(directory), **kwargs))
+
+def round_event(event_id, rounds, ranks):
+    return {"id": event_id, "type": "round", "rounds": rounds, "ranks": ranks}
+
+def journal_versions(directory, game_id):
+    with open(journal.log_path(game_id, str(directory)), encoding = "utf-8") as rd:
+        return [json.loads(line)["version"] for line in rd]
+
+def test_rounds_from_two_processes_build_on_each_other(tmp_path):
+    #two stores on one journal directory are two gunicorn workers
+    first = new_store(tmp_path)
+    second = new_store(tmp_path)
+    game_id, version = first.create(scoring.new_game(["Anna", "Ben", "Carl"]))
+    game, version, applied, rejected = first.commit(game_id, [round_event("a", 0, [0, 1, 2])])
+    assert version == 1 and not rejected
+    game, version, applied, rejected = second.commit(game_id, [round_event("b", 1, [2, 1, 0])])
+    assert version == 2 and len(applied) == 1 and not rejected
+    game, version = first.get(game_id)
+    assert version == 2 and game["game-history"]["x"] == [1, 2]
+    assert journal_versions(tmp_path, game_id) == [1, 2]
+
+def test_an_event_seen_by_another_process_is_not_applied_again(tmp_path):
+    first = new_store(tmp_path)
+    second = new_store(tmp_path)
+    game_id, version = first.create(scoring.new_game(["Anna", "Ben"]))
+    first.commit(game_id, [{"id": "beer", "type": "beer-count", "player": 0}])
+    game, version, applied, rejected = second.commit(game_id, [{"id": "beer", "type": "beer-count", "player": 0}])
+    assert version == 1 and not applied and game["beer-count"]["Anna"] == 1
+
+def test_an_update_with_an_outdated_version_is_a_conflict(tmp_path):
+    first = new_store(tmp_path)
+    second = new_store(tmp_path)
+    game_id, version = first.create(scoring.new_game(["Anna", "Ben"]))
+    second.get(game_id)
+    first.update(game_id, {"type": "beer-count", "player": "Ben"})
+    with pytest.raises(store.Conflict):
+        second.update(game_id, {"type": "beer-count", "player": "Ben"}, expected = 0)
+
+def sync_counters(directory, game_id, worker, events):
+    games = new_store(directory)
+    for i in range(events):
+        games.commit(game_id, [{"id": f"{worker}-{i}", "type": "beer-count", "player": i % 3}])
+
+def test_concurrent_syncs_of_several_processes_keep_every_event(tmp_path):
+    games = new_store(tmp_path)
+    game_id, version = games.create(scoring.new_game(["Anna", "Ben", "Carl"]))
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target = sync_counters, args = (str(tmp_path), game_id, worker, 25)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    game, version = games.get(game_id)
+    assert version == 100
+    assert sum(game["beer-count"].values()) == 100
+    assert journal_versions(tmp_path, game_id) == list(range(1, 101))
+
+def test_a_journal_compacted_by_another_process_is_read_again(tmp_path):
+    first = new_store(tmp_path, compact = 3)
+    second = new_store(tmp_path, compact = 3)
+    game_id, version = first.create(scoring.new_game(["Anna", "Ben"]))
+    second.get(game_id)
+    for i in range(4):
+        first.commit(game_id, [{"id": i, "type": "goiß-count", "player": 1}])
+    game, version, applied, rejected = second.commit(game_id, [{"id": "late", "type": "goiß-count", "player": 0}])
+    assert version == 5 and game["goiß-count"] == {"Anna": 1, "Ben": 4}
+    assert first.get(game_id)[1] == 5
+
+def test_a_torn_journal_line_is_skipped(tmp_path):
+    games = new_store(tmp_path)
+    game_id, version = games.create(scoring.new_game(["Anna", "Ben"]))
+    games.commit(game_id, [{"id": 1, "type": "beer-count", "player": 0}])
+    with open(journal.log_path(game_id, str(tmp_path)), "a", encoding = "utf-8") as wd:
+        wd.write('{"version": 2, "ev')
+    games.commit(game_id, [{"id": 2, "type": "beer-count", "player": 1}])
+    game, version = new_store(tmp_path).get(game_id)
+    assert version == 2 and game["beer-count"] == {"Anna": 1, "Ben": 1}
+
+def test_least_recently_used_games_are_evicted_and_recovered(tmp_path):
+    games = store.GameStore(journal.Journal(str(tmp_path)), max_games = 2)
+    ids = [games.create(scoring.new_game(["Anna", "Ben"]))[0] for i in range(5)]
+    assert len(games.games) == 2
+    games.commit(ids[0], [{"id": "x", "type": "beer-count", "player": 0}])
+    assert len(games.games) == 2
+    assert games.get(ids[0])[1] == 1
+
+def test_a_taken_id_gets_a_new_one(tmp_path):
+    game = scoring.new_game(["Anna", "Ben"])
+    game_id, version = new_store(tmp_path).create(game)
+    copy = scoring.new_game(["Carl", "Dora"])
+    copy["game-id"] = game_id
+    other_id, version = new_store(tmp_path).create(copy)
+    assert other_id != game_id
+    assert new_store(tmp_path).get(game_id)[0]["table-dict"]["Anna"]
+
+def test_unknown_games_raise_key_error(tmp_path):
+    with pytest.raises(KeyError):
+        new_store(tmp_path).get("missing")
+
+def test_the_version_is_read_from_the_journal(tmp_path):
+    first = new_store(tmp_path)
+    second = new_store(tmp_path)
+    game_id, version = first.create(scoring.new_game(["Anna", "Ben"]))
+    assert second.version(game_id) == 0
+    first.commit(game_id, [{"id": "beer", "type": "beer-count", "player": 0}])
+    assert second.version(game_id) == 1
+    with pytest.raises(store.Unknown):
+        second.version("missing")
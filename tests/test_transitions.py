@@ -0,0 +1,41 @@
+import pytest
+
+import scoring
+import transitions
+
+def played(names, rounds):
+    game = scoring.new_game(names)
+    for ranks in rounds:
+        scoring.apply_event(game, {"type": "round", "ranks": ranks})
+    return game
+
+def test_a_periodic_chain_converges_to_even_shares():
+    #König and Arschloch swap every round, without the averaging the power iteration would oscillate
+    game = played(["Anna", "Ben"], [[0, 1], [1, 0]] * 5)
+    table = transitions.game_transitions(game["game-history"], transitions.game_ranks(game)).table()
+    assert table["counts"]["Anna"] == [[0, 5], [4, 0]]
+    assert table["metrics"]["Anna"]["stationary"] == pytest.approx([0.5, 0.5])
+    assert table["metrics"]["Anna"]["stickiness"] == 0
+    assert transitions.stationary([[0, 2], [1, 1]]) == pytest.approx([1 / 3, 2 / 3])
+
+def test_a_rank_never_left_counts_as_leading_anywhere():
+    counts = [[0, 0], [3, 1]]
+    assert transitions.probabilities(counts) == [[0.5, 0.5], [0.75, 0.25]]
+    #0.5 * p0 = 0.75 * p1
+    assert transitions.stationary(counts) == pytest.approx([0.6, 0.4])
+    assert transitions.stickiness(counts) == (0.25, [None, 0.25])
+    assert transitions.stickiness([[0, 0], [0, 0]]) == (None, [None, None])
+
+def test_archive_totals_join_ladders_of_different_sizes():
+    totals = transitions.Totals()
+    totals.recompute([
+        played(["Anna", "Ben"], [[0, 1], [1, 0]]),
+        played(["Anna", "Ben", "Carl"], [[0, 1, 2], [1, 0, 2]]),
+        {"game-history": None}
+    ])
+    assert totals.player("Anna") == (["König", "Bauer", "Arschloch"], [[0, 1, 1], [0, 0, 0], [0, 0, 0]])
+    ranks, counts = totals.player(None)
+    assert ranks == ["König", "Bauer", "Arschloch"]
+    #Anna König -> Arschloch and König -> Bauer, Ben Arschloch -> König and Bauer -> König, Carl stays Arschloch
+    assert counts == [[0, 1, 1], [1, 0, 0], [1, 0, 1]]
+    assert totals.table(["Carl"])["Carl"]["counts"] == [[1]]
@@ -0,0 +1,36 @@
+import base64
+import json
+import time
+
+import pytest
+
+import scoring
+import uploads
+
+def data_url(content):
+    return "data:application/json;base64," + base64.b64encode(content).decode("ascii")
+
+def test_a_saved_game_is_read():
+    game = scoring.new_game(["Anna", "Ben"])
+    queue = uploads.UploadQueue(workers = 1)
+    assert queue.parse(data_url(json.dumps(game).encode("utf-8"))) == game
+
+def test_invalid_files_are_upload_errors():
+    queue = uploads.UploadQueue(workers = 1)
+    for content in [b"{", b"[1, 2]", json.dumps({"table-dict": {"Ranks": []}}).encode("utf-8")]:
+        with pytest.raises(uploads.UploadError):
+            queue.parse(data_url(content))
+    with pytest.raises(uploads.UploadError):
+        uploads.UploadQueue(max_bytes = 10).parse(data_url(b"{}" * 20))
+
+def slow_parse(content_string):
+    time.sleep(10)
+
+def test_a_parse_past_the_timeout_stops_its_pool(monkeypatch):
+    monkeypatch.setattr(uploads, "parse_game", slow_parse)
+    queue = uploads.UploadQueue(workers = 1, timeout = 0.2)
+    processes = queue.pool()
+    with pytest.raises(uploads.UploadError):
+        queue.parse(data_url(b"{}"))
+    assert queue.processes is None
+    assert queue.pool() is not processes
@@ -0,0 +1,182 @@
+import collections
+import threading
+
+import aggregates
+import scoring
+
+max_iterations = 1000
+tolerance = 1e-10
+
+########### Transitions
+#counts[name][i][j] is how often a player went from rank i in one round to rank j in the next one, with the
+#ranks of the get_ranks ladder (0 is the König). the game history stores the König as the highest level.
+class Transitions:
+    def __init__(self, names, ranks):
+        self.names = list(names)
+        self.ranks = [rank.strip() for rank in ranks]
+        n = len(self.ranks)
+        self.counts = {name: [[0] * n for i in range(n)] for name in self.names}
+        self.last = dict()
+        self.rounds = 0
+
+    def add_rounds(self, columns):
+        #columns: the game history levels of every player over the new rounds, one list per player
+        top = len(self.ranks) - 1
+        for name, column in zip(self.names, columns):
+            counts = self.counts[name]
+            previous = self.last.get(name)
+            for level in column:
+                rank = top - level
+                if previous is not None:
+                    counts[previous][rank] += 1
+                previous = rank
+            self.last[name] = previous
+        self.rounds += len(columns[0]) if columns else 0
+
+    def total(self):
+        #the transitions of all players of the game together
+        n = len(self.ranks)
+        return [[sum(self.counts[name][i][j] for name in self.names) for j in range(n)] for i in range(n)]
+
+    def table(self):
+        return {
+            "players": self.names,
+            "ranks": self.ranks,
+            "rounds": self.rounds,
+            "counts": self.counts,
+            "metrics": {name: metrics(self.counts[name]) for name in self.names},
+            "total": metrics(self.total())
+        }
+
+########### Metrics
+#everything is computed from the counts alone, the history is never read again
+def probabilities(counts):
+    #a rank a player never left gives no information, it is treated as leading to every rank alike
+    n = len(counts)
+    return [[count / sum(row) for count in row] if sum(row) else [1 / n] * n for row in counts]
+
+def stationary(counts):
+    #the long run share of rounds at every rank, by power iteration from the uniform distribution
+    matrix = probabilities(counts)
+    n = len(matrix)
+    if not n:
+        return list()
+    distribution = [1 / n] * n
+    for iteration in range(max_iterations):
+        following = [sum(distribution[i] * matrix[i][j] for i in range(n)) for j in range(n)]
+        if max(abs(a - b) for a, b in zip(following, distribution)) < tolerance:
+            return following
+        #averaging with the previous step keeps periodic chains (König <-> Arschloch) from oscillating
+        distribution = [(a + b) / 2 for a, b in zip(following, distribution)]
+    return distribution
+
+def stickiness(counts):
+    #the share of transitions that kept the rank, overall and per rank
+    transitions = sum(map(sum, counts))
+    stays = [row[i] / sum(row) if sum(row) else None for i, row in enumerate(counts)]
+    overall = sum(counts[i][i] for i in range(len(counts))) / transitions if transitions else None
+    return overall, stays
+
+def metrics(counts):
+    overall, stays = stickiness(counts)
+    return {
+        "transitions": sum(map(sum, counts)),
+        "stickiness": overall,
+        "rank-stickiness": stays,
+        "stationary": stationary(counts)
+    }
+
+########### Games
+def game_transitions(game_history, ranks, game_id = ""):
+    return cache.get(game_history, game_id, lambda names: Transitions(names, ranks))
+
+def copy_transitions(transitions):
+    copy = Transitions(transitions.names, transitions.ranks)
+    copy.counts = {name: [list(row) for row in counts] for name, counts in transitions.counts.items()}
+    copy.last = dict(transitions.last)
+    copy.rounds = transitions.rounds
+    return copy
+
+cache = aggregates.GameCache(copy_transitions)
+
+def game_ranks(game):
+    return scoring.get_ranks(scoring.get_names(game), game.get("rules"))
+
+########### Archive
+#games with different player counts have different ladders, so the archive counts by rank title.
+#the titles are ordered by their position on the ladder, from the König down to the Arschloch.
+class Totals:
+    def __init__(self):
+        self.counts = dict()
+        self.positions = dict()
+        self.lock = threading.Lock()
+
+    def update(self, transitions):
+        with self.lock:
+            add_transitions(self.counts, self.positions, transitions)
+
+    def recompute(self, games):
+        counts = dict()
+        positions = dict()
+        for game in games:
+            try:
+                names, columns = aggregates.game_columns(game["game-history"])
+                transitions = Transitions(names, game_ranks(game))
+                transitions.add_rounds(columns)
+            except (KeyError, TypeError, AttributeError, ValueError, IndexError):
+                continue
+            add_transitions(counts, positions, transitions)
+        with self.lock:
+            self.counts = counts
+            self.positions = positions
+
+    def player(self, name):
+        #the count matrix of one player (of everybody for None) over all titles they went through
+        with self.lock:
+            if name is None:
+                pairs = collections.Counter()
+                for player_pairs in self.counts.values():
+                    pairs.update(player_pairs)
+            else:
+                pairs = dict(self.counts.get(name, dict()))
+            ranks = sorted({rank for pair in pairs for rank in pair}, key = self.positions.get)
+        index = {rank: i for i, rank in enumerate(ranks)}
+        counts = [[0] * len(ranks) for rank in ranks]
+        for (a, b), count in pairs.items():
+            counts[index[a]][index[b]] += count
+        return ranks, counts
+
+    def table(self, names = None):
+        with self.lock:
+            names = sorted(self.counts) if names is None else names
+        players = dict()
+        for name in names:
+            ranks, counts = self.player(name)
+            players[name] = {"ranks": ranks, "counts": counts, **metrics(counts)}
+        return players
+
+def add_transitions(counts, positions, transitions):
+    n = len(transitions.ranks)
+    for i, rank in enumerate(transitions.ranks):
+        positions.setdefault(rank, i / (n - 1) if n > 1 else 0)
+    for name, matrix in transitions.counts.items():
+        pairs = counts.setdefault(name, dict())
+        for i, row in enumerate(matrix):
+            for j, count in enumerate(row):
+                if count:
+                    pair = (transitions.ranks[i], transitions.ranks[j])
+                    pairs[pair] = pairs.get(pair, 0) + count
+
+totals = aggregates.ArchiveTotals(Totals())
+
+def get_totals():
+    return totals.get()
+
+def update_events(game, events):
+    #the applied rounds are the last ones of the game history, the round before them gives their first transition
+    rounds = sum(event["type"] == "round" for event in events)
+    if rounds:
+        names, columns = aggregates.game_columns(game["game-history"], max(len(game["game-history"]["x"]) - rounds - 1, 0))
+        transitions = Transitions(names, game_ranks(game))
+        transitions.add_rounds(columns)
+        get_totals().update(transitions)
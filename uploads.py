@@ -0,0 +1,88 @@
+import base64
+import json
+import multiprocessing
+import os
+import struct
+import threading
+
+import container
+import scoring
+
+max_upload_bytes = int(os.environ.get("UPLOAD_MAX_BYTES", 2 * 1024 * 1024))
+upload_workers = int(os.environ.get("UPLOAD_WORKERS", 2))
+max_pending = int(os.environ.get("UPLOAD_QUEUE", 8))
+parse_timeout = float(os.environ.get("UPLOAD_TIMEOUT", 5))
+
+#whole requests are capped before flask reads them, with room for the base64 overhead and the callback payload
+max_request_bytes = max_upload_bytes * 2 + 1024 * 1024
+
+class UploadError(Exception):
+    pass
+
+########### Parsing
+def parse_game(content_string):
+    #runs in the upload pool: decoding, parsing and validating never block a request worker
+    data = base64.b64decode(content_string, validate = True)
+    if container.is_container(data):
+        #an archive file opens the game that was saved into it last, a damaged one is invalid game data like broken json
+        try:
+            archived = container.open_bytes(data)
+            if not len(archived):
+                raise ValueError("the archive holds no games")
+            game = scoring.extern_game(archived.get(next(reversed(archived.games))))
+        except (container.ContainerError, struct.error, KeyError, TypeError, AttributeError) as e:
+            raise ValueError(f"Broken archive: {e}")
+    else:
+        game = json.loads(data.decode("utf-8"))
+    return scoring.validate_game(game)
+
+########### Admission control
+#at most max_pending uploads are parsed or waiting at the same time, every other one is turned away right away.
+#a parse that runs into the timeout takes its pool down with it, the next upload starts a fresh one.
+#a crashed worker is replaced by the pool, its upload runs into the timeout as well
+class UploadQueue:
+    def __init__(self, workers = upload_workers, pending = max_pending, timeout = parse_timeout, max_bytes = max_upload_bytes):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.slots = threading.BoundedSemaphore(pending)
+        self.processes = None
+        self.lock = threading.Lock()
+
+    def pool(self):
+        with self.lock:
+            if self.processes is None:
+                self.processes = multiprocessing.Pool(processes = self.workers)
+            return self.processes
+
+    def reset(self, processes):
+        with self.lock:
+            if self.processes is not processes:
+                return
+            self.processes = None
+        #a stuck parse can't be cancelled, terminate stops the worker processes of the pool
+        processes.terminate()
+
+    def parse(self, content):
+        #content is the data url of dcc.Upload, its size is checked before anything is decoded
+        if not isinstance(content, str) or "," not in content[:200]:
+            raise UploadError("The file could not be read")
+        content_string = content.split(",", 1)[1]
+        if len(content_string) * 3 // 4 > self.max_bytes:
+            raise UploadError(f"The file is too big, games can have at most {self.max_bytes // 1024} KB")
+        if not self.slots.acquire(blocking = False):
+            raise UploadError("Too many uploads at the moment, please try again in a few seconds")
+        try:
+            processes = self.pool()
+            result = processes.apply_async(parse_game, (content_string,))
+            try:
+                return result.get(timeout = self.timeout)
+            except multiprocessing.TimeoutError:
+                self.reset(processes)
+                raise UploadError("Reading the file took too long")
+            except (ValueError, RecursionError) as e:
+                raise UploadError(f"Invalid game data: {e}")
+        finally:
+            self.slots.release()
+
+queue = UploadQueue()